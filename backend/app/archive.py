@@ -0,0 +1,91 @@
+"""
+Archival for the Church App
+This file moves old data out of the tables every request reads: members
+who have been inactive for a long time, and one-off events long past.
+
+The "archive" background job moves them in batches of ARCHIVE_BATCH_SIZE
+rows, each in its own short transaction, into users_archive /
+events_archive (their RSVPs and check-ins into attendance_archive). So the
+hot tables and their indexes stay the size of the active data, and the job
+never holds locks for long. Archived rows are still readable: the list and
+detail endpoints take include_archived=true to read both tiers.
+
+The job is scheduled at startup, and every run schedules the next one
+ARCHIVE_INTERVAL_HOURS after it finishes, even if it failed (0 turns
+archiving off). Only one archive job is ever queued or running.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from . import db_utils, jobs
+from .changes import events_changed, users_changed
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Inactive members are archived this many days after their last update
+ARCHIVE_USERS_AFTER_DAYS = float(os.getenv("ARCHIVE_USERS_AFTER_DAYS", "365"))
+# One-off events are archived this many days after they took place
+ARCHIVE_EVENTS_AFTER_DAYS = float(os.getenv("ARCHIVE_EVENTS_AFTER_DAYS", "365"))
+# Rows moved per transaction
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Hours between archive runs (0 or less: never archive)
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "24"))
+
+logger = logging.getLogger(__name__)
+
+
+def archive_all(db: Session, archive_batch: Callable[..., List[int]], cutoff: datetime,
+                changed: Callable[..., None]) -> int:
+    """
+    Run batches of an archive function until nothing is left to archive
+    Cached copies are dropped (and /changes told) after every batch.
+    Returns how many rows were archived.
+    """
+    total = 0
+    while True:
+        ids = archive_batch(db, cutoff, ARCHIVE_BATCH_SIZE)
+        if ids:
+            changed("archived", *ids)
+            total += len(ids)
+        if len(ids) < ARCHIVE_BATCH_SIZE:
+            return total
+
+
+def schedule(db: Session, run_at: Optional[datetime] = None):
+    """
+    Queue an archive job (for now, by default) unless one is already
+    queued or running; the jobs table's unique key makes this safe when
+    several server processes start at once
+    """
+    if ARCHIVE_INTERVAL_HOURS <= 0:
+        return
+    db_utils.enqueue_job(db, "archive", run_at=run_at, unique_key="archive")
+
+
+def schedule_next(db: Session):
+    """
+    Queue the next archive run, after the last one has finished, whether
+    it archived everything or failed on its last attempt
+    """
+    schedule(db, datetime.utcnow() + timedelta(hours=ARCHIVE_INTERVAL_HOURS))
+
+
+@jobs.handler("archive", after=schedule_next)
+def archive(db: Session, payload: dict):
+    """
+    Archive inactive members and past events
+    """
+    now = datetime.utcnow()
+    users = archive_all(db, db_utils.archive_users,
+                        now - timedelta(days=ARCHIVE_USERS_AFTER_DAYS), users_changed)
+    events = archive_all(db, db_utils.archive_events,
+                         now - timedelta(days=ARCHIVE_EVENTS_AFTER_DAYS), events_changed)
+    if users or events:
+        logger.info("Archived %d users and %d events", users, events)
@@ -0,0 +1,335 @@
+"""
+Attendance Buffer for the Church App
+This file handles RSVPs and check-ins without a database write per request.
+
+Sunday check-in means thousands of writes within a few minutes. Instead of
+one transaction each, changes are recorded in memory and written behind by
+a background thread: every ATTENDANCE_FLUSH_INTERVAL seconds, or sooner
+once ATTENDANCE_BATCH_SIZE changes are waiting, all of them go to the
+database in one transaction together with their counter updates.
+
+The buffer also keeps the roster (who RSVP'd / checked in) of recently used
+event occurrences, so live headcounts are answered from memory. A write
+that fails is tried again with the next flush; once it runs out of
+attempts, its roster is reloaded from the database, so memory never keeps
+a change the database doesn't have.
+
+Each process keeps its own rosters, which only see that process's
+changes. With several processes (ATTENDANCE_SHARED), headcounts are read
+from the attendance_counts table instead, and the conditions on a change
+(e.g. an RSVP doesn't undo a check-in) are checked against the stored
+status when it's written.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import db_utils
+from .database import SessionLocal
+from .models import AttendanceStatus
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Longest time (seconds) a change waits in memory before it's written
+ATTENDANCE_FLUSH_INTERVAL = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL", "1.0"))
+# Write as soon as this many changes are waiting
+ATTENDANCE_BATCH_SIZE = int(os.getenv("ATTENDANCE_BATCH_SIZE", "500"))
+# Event occurrences whose rosters are kept in memory
+ATTENDANCE_ROSTERS = int(os.getenv("ATTENDANCE_ROSTERS", "256"))
+# Flushes a change is tried in before it's given up
+ATTENDANCE_WRITE_ATTEMPTS = int(os.getenv("ATTENDANCE_WRITE_ATTEMPTS", "5"))
+# Server processes (uvicorn and gunicorn read WEB_CONCURRENCY too)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Several processes share the attendance tables: serve headcounts from the
+# database rather than this process's rosters (on by default with more
+# than one process)
+ATTENDANCE_SHARED = os.getenv(
+    "ATTENDANCE_SHARED", "true" if WEB_CONCURRENCY > 1 else "false"
+).lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+
+# Roster cache key: (event_id, occurrence_date)
+RosterKey = Tuple[int, Optional[datetime]]
+# Statuses a change may be made from (None: not on the roster)
+Condition = Tuple[Optional[AttendanceStatus], ...]
+
+
+class Roster:
+    """
+    Statuses of one event occurrence, by user ID, with running totals
+    """
+
+    def __init__(self, event_id: int, occurrence_date: datetime,
+                 statuses: Dict[int, AttendanceStatus]):
+        self.event_id = event_id
+        self.occurrence_date = occurrence_date
+        self.statuses = statuses
+        self.counts = {status: 0 for status in AttendanceStatus}
+        for status in statuses.values():
+            self.counts[status] += 1
+        # Changes recorded but not committed yet (the roster is kept in
+        # memory until they are, so it's never reloaded without them)
+        self.unsaved = 0
+        # A change to it was given up, so it's reloaded from the database
+        # once nothing is unsaved
+        self.stale = False
+
+
+class AttendanceBuffer:
+    """
+    In-memory rosters plus the write-behind queue of attendance changes
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = ATTENDANCE_FLUSH_INTERVAL,
+        batch_size: int = ATTENDANCE_BATCH_SIZE,
+        max_rosters: int = ATTENDANCE_ROSTERS,
+        write_attempts: int = ATTENDANCE_WRITE_ATTEMPTS,
+        shared: bool = ATTENDANCE_SHARED,
+        session_factory: sessionmaker = SessionLocal
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_rosters = max_rosters
+        self.write_attempts = write_attempts
+        self.shared = shared
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        # Only one flush at a time (the thread, or stop())
+        self._flush_lock = threading.Lock()
+        self._rosters: "OrderedDict[RosterKey, Roster]" = OrderedDict()
+        # Rosters requested without an occurrence date (one-off events),
+        # by the key they were loaded under
+        self._aliases: Dict[RosterKey, RosterKey] = {}
+        # Waiting changes: new status, the condition to check when writing
+        # it (shared mode), the roster it belongs to and failed attempts
+        self._pending: Dict[db_utils.AttendanceKey,
+                            Tuple[Optional[AttendanceStatus], Optional[Condition], Roster, int]] = {}
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.written = 0
+
+    def get_roster(self, event_id: int, occurrence_date: Optional[datetime]) -> Optional[Roster]:
+        """
+        Get a roster from memory, or None if it isn't loaded (or is stale
+        and has to be loaded again)
+        """
+        with self._lock:
+            key = self._aliases.get((event_id, occurrence_date), (event_id, occurrence_date))
+            roster = self._rosters.get(key)
+            if roster is None:
+                return None
+            if roster.stale and roster.unsaved == 0:
+                del self._rosters[key]
+                self._aliases = {alias: target for alias, target in self._aliases.items()
+                                 if target != key}
+                return None
+            self._rosters.move_to_end(key)
+            return roster
+
+    def load_roster(self, db: Session, event_id: int,
+                    occurrence_date: Optional[datetime]) -> Optional[Roster]:
+        """
+        Load a roster from the database and keep it in memory
+        (meant for run_db; returns None if there's no such occurrence)
+        """
+        loaded = db_utils.load_attendance(db, event_id, occurrence_date)
+        if loaded is None:
+            return None
+        roster = Roster(event_id, *loaded)
+        key = (event_id, roster.occurrence_date)
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep that one,
+            # it may already hold changes
+            roster = self._rosters.setdefault(key, roster)
+            self._rosters.move_to_end(key)
+            if occurrence_date != roster.occurrence_date:
+                self._aliases[(event_id, occurrence_date)] = key
+            self._evict()
+        return roster
+
+    def _evict(self):
+        """Drop the least recently used rosters without unsaved changes"""
+        evicted = False
+        for key in list(self._rosters):
+            if len(self._rosters) <= self.max_rosters:
+                break
+            if self._rosters[key].unsaved == 0:
+                del self._rosters[key]
+                evicted = True
+        if evicted:
+            self._aliases = {alias: key for alias, key in self._aliases.items()
+                             if key in self._rosters}
+
+    def set_status(self, roster: Roster, user_id: int, status: Optional[AttendanceStatus],
+                   only_from: Tuple[Optional[AttendanceStatus], ...] = None) -> bool:
+        """
+        Change a member's status in a roster and queue the write
+        - status None removes the member from the roster
+        - only_from limits the change to members whose current status is
+          one of these
+        - Shared: the roster may be missing other processes' changes, so
+          the change is always queued and only_from is checked against
+          the stored status when it's written
+        Returns whether anything changed (always True when shared).
+        """
+        with self._lock:
+            if not self.shared:
+                current = roster.statuses.get(user_id)
+                if current == status or (only_from is not None and current not in only_from):
+                    return False
+                if current is not None:
+                    roster.counts[current] -= 1
+                if status is None:
+                    del roster.statuses[user_id]
+                else:
+                    roster.statuses[user_id] = status
+                    roster.counts[status] += 1
+            key = (roster.event_id, roster.occurrence_date, user_id)
+            if key not in self._pending:
+                roster.unsaved += 1
+            self._pending[key] = (status, only_from if self.shared else None, roster, 0)
+            full = len(self._pending) >= self.batch_size
+        self.start()
+        if full:
+            self._wake.set()
+        return True
+
+    def forget_users(self, user_ids: Iterable[int]):
+        """
+        Take deleted members out of memory: their waiting changes are
+        dropped (they'd bring the records back), and the rosters they were
+        on lose them and are reloaded from the database once saved
+        """
+        user_ids = set(user_ids)
+        with self._lock:
+            for key in [key for key in self._pending if key[2] in user_ids]:
+                _, _, roster, _ = self._pending.pop(key)
+                roster.unsaved -= 1
+            for roster in self._rosters.values():
+                on_roster = user_ids & roster.statuses.keys()
+                for user_id in on_roster:
+                    roster.counts[roster.statuses.pop(user_id)] -= 1
+                if on_roster:
+                    roster.stale = True
+
+    def counts(self, roster: Roster) -> Dict[AttendanceStatus, int]:
+        """Live totals of a roster"""
+        with self._lock:
+            return dict(roster.counts)
+
+    def pending(self) -> int:
+        """Number of changes waiting to be written"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Write every waiting change in one transaction
+        - If the batch fails, the changes are retried one by one so a
+          single bad record (e.g. a deleted event) doesn't hold up the rest
+        - Changes that still fail are queued again for the next flush,
+          unless a newer change to the same record replaced them
+        - After write_attempts failures a change is given up and its
+          roster marked stale, so it's reloaded from the database
+        Returns how many records were written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                waiting, self._pending = self._pending, {}
+            if not waiting:
+                return 0
+            batch = {key: status for key, (status, _, _, _) in waiting.items()}
+            conditions = {key: condition for key, (_, condition, _, _) in waiting.items()
+                          if condition is not None}
+
+            written = 0
+            failed = set()
+            db = self.session_factory()
+            try:
+                try:
+                    written = db_utils.write_attendance(db, batch, conditions)
+                except Exception:
+                    db.rollback()
+                    logger.exception("Attendance batch of %d failed, retrying one by one", len(batch))
+                    for key, status in batch.items():
+                        try:
+                            written += db_utils.write_attendance(db, {key: status}, conditions)
+                        except Exception:
+                            db.rollback()
+                            failed.add(key)
+            finally:
+                db.close()
+
+            with self._lock:
+                retried = dropped = 0
+                for key, (status, condition, roster, attempts) in waiting.items():
+                    if key in failed and key not in self._pending:
+                        if attempts + 1 < self.write_attempts:
+                            self._pending[key] = (status, condition, roster, attempts + 1)
+                            retried += 1
+                            continue
+                        roster.stale = True
+                        dropped += 1
+                    roster.unsaved -= 1
+                self._evict()
+                self.flushes += 1
+                self.written += written
+            if failed:
+                logger.warning("%d attendance changes failed: %d queued again, %d dropped",
+                               len(failed), retried, dropped)
+            return written
+
+    def start(self):
+        """Start the background writer (once)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="attendance-writer", daemon=True)
+            self._thread.start()
+        # Don't lose waiting changes when the process exits
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the background writer and write what's left"""
+        thread = self._thread
+        if thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            thread.join()
+            self._thread = None
+        self.flush()
+        left = self.pending()
+        if left:
+            logger.error("%d attendance changes could not be written before stopping", left)
+
+    def _run(self):
+        """Background writer: flush every interval, or when woken early"""
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Attendance flush failed")
+
+
+# Shared buffer used by the attendance endpoints
+buffer = AttendanceBuffer()
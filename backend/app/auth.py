@@ -0,0 +1,187 @@
+"""
+Authentication Helpers for the Church App
+This file handles password hashing and issuing/verifying JWT access tokens.
+Passwords are stored as bcrypt hashes (through passlib). Rows saved before
+passwords were hashed still verify, and are rehashed at their next login.
+Tokens are signed with python-jose and short-lived. Every request also
+checks the token's user against the database (one primary key lookup), so
+deactivating, demoting or deleting a user takes effect straight away.
+"""
+
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+
+from . import db_utils, models, schemas
+from .database import DbSession, get_session, run_db
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Secret used to sign tokens
+# Always set JWT_SECRET_KEY in production, otherwise tokens stop working
+# whenever the server restarts
+SECRET_KEY = os.getenv("JWT_SECRET_KEY") or secrets.token_urlsafe(32)
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(
+    os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+
+# bcrypt cost factor: every step doubles the time to hash a password (and
+# to guess one)
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+# Threads hashing the passwords of an import batch (bcrypt releases the GIL)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+# "plaintext" only recognizes passwords stored before hashing was added;
+# being deprecated, they're flagged for rehashing when they verify
+pwd_context = CryptContext(
+    schemes=["bcrypt", "plaintext"], deprecated=["plaintext"],
+    bcrypt__rounds=PASSWORD_HASH_ROUNDS)
+
+# Reads the "Authorization: Bearer <token>" header
+# auto_error is off so we can return our own 401 message
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash a password for storing
+    """
+    return pwd_context.hash(password)
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """
+    Hash many passwords (e.g. an import batch) on several threads
+    """
+    if len(passwords) <= 1 or PASSWORD_HASH_WORKERS <= 1:
+        return [hash_password(password) for password in passwords]
+    with ThreadPoolExecutor(PASSWORD_HASH_WORKERS) as pool:
+        return list(pool.map(hash_password, passwords))
+
+
+def verify_password(plain_password: str, stored_password: Optional[str]) -> bool:
+    """
+    Check a login password against the stored hash
+    Without a stored hash (unknown email), a hash is still checked, so the
+    reply takes as long as for a wrong password.
+    """
+    if stored_password is None:
+        pwd_context.dummy_verify()
+        return False
+    try:
+        return pwd_context.verify(plain_password, stored_password)
+    except ValueError:
+        # Malformed hash
+        return False
+
+
+def needs_rehash(stored_password: str) -> bool:
+    """
+    Check if a stored password should be hashed again (it's from before
+    hashing, or was hashed with fewer rounds than PASSWORD_HASH_ROUNDS)
+    """
+    return pwd_context.needs_update(stored_password)
+
+
+def create_access_token(user: models.User) -> str:
+    """
+    Create a signed access token for a user
+    """
+    now = datetime.utcnow()
+    claims = {
+        "sub": str(user.id),
+        "email": user.email,
+        "role": user.role.value if user.role is not None else None,
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def invalid_token() -> HTTPException:
+    """The 401 error for a token that can't be used (anymore)"""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """
+    Verify a token's signature and expiry and return its claims
+    Raises a 401 error if the token is invalid
+    """
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        claims["sub"] = int(claims["sub"])
+        claims["iat"] = int(claims["iat"])
+        return claims
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise invalid_token()
+
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(
+        bearer_scheme),
+    db: DbSession = Depends(get_session)
+) -> schemas.TokenData:
+    """
+    Dependency for protected endpoints.
+    - Verifies the caller's token, then looks its user up by primary key
+      (a fully stateless check couldn't revoke a token before it expires;
+      the lookup is one index seek, far from the old full-list scan)
+    - Rejects tokens of users that were deleted or deactivated, and tokens
+      issued before the user was created (the ID belonged to someone else)
+    - Returns the user's current email and role, so a demotion applies
+      to tokens issued before it
+    """
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    claims = decode_access_token(credentials.credentials)
+    user = await run_db(db, db_utils.get_token_user, claims["sub"])
+    if user is None or not user.is_active:
+        raise invalid_token()
+    # iat is in whole seconds, so compare it with the second of creation
+    if user.created_at is not None and claims["iat"] < int(
+            user.created_at.replace(tzinfo=timezone.utc).timestamp()):
+        raise invalid_token()
+    return schemas.TokenData(user_id=user.id, email=user.email, role=user.role)
+
+
+def ensure_can_manage_user(current_user: schemas.TokenData, user_id: int):
+    """
+    Only let users change their own account, unless they are an admin
+    """
+    if current_user.user_id != user_id and current_user.role != models.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed to modify this user"
+        )
+
+
+def require_admin(
+    current_user: schemas.TokenData = Depends(get_current_user)
+) -> schemas.TokenData:
+    """
+    Dependency for admin-only endpoints
+    """
+    if current_user.role != models.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
@@ -0,0 +1,210 @@
+"""
+Entity Cache for the Church App
+This file caches serialized users and events by ID, so repeated detail
+lookups (like profile screens) don't query the database every time.
+
+The cache backend is pluggable. The default keeps a bounded LRU/TTL cache
+in the process; when running several workers, point ENTITY_CACHE_BACKEND at
+a shared implementation (e.g. "mypackage.redis_cache:RedisCache") so all
+workers see the same entries and invalidations.
+
+A request that misses loads the entity from the database and stores it.
+If a write drops the key while the load is running, storing the loaded
+copy would bring the old version back until the TTL runs out. So a token
+is taken before loading, and set only stores the value if the key hasn't
+been deleted since the token was taken.
+"""
+
+import importlib
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Which backend to use: "memory" (default), "none", or "module:ClassName"
+ENTITY_CACHE_BACKEND = os.getenv("ENTITY_CACHE_BACKEND", "memory")
+# Maximum number of entries in the in-process cache
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "10000"))
+# Seconds before an entry is reloaded from the database
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "300"))
+# Seconds a list total (X-Total-Count) is reused before counting again
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "30"))
+# Maximum number of filter combinations whose totals are kept per table
+COUNT_CACHE_SIZE = 1024
+
+
+class CacheBackend(ABC):
+    """
+    Interface for entity cache backends.
+    Values are serialized JSON strings, so any key/value store can hold them.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached value, or None on a miss"""
+
+    def token(self, key: str) -> Any:
+        """
+        Take a token before loading a value to store (see set)
+        Backends that can't track deletions return None.
+        """
+        return None
+
+    @abstractmethod
+    def set(self, key: str, value: str, token: Any = None):
+        """
+        Store a value
+        With a token, nothing is stored if the key was deleted (or the
+        cache cleared) after the token was taken.
+        """
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a value (used when the entity changes)"""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every value"""
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters"""
+        return {}
+
+
+class NullCache(CacheBackend):
+    """Backend that never caches anything"""
+
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def set(self, key: str, value: str, token: Any = None):
+        pass
+
+    def delete(self, key: str):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process cache with a maximum size (least recently used entries are
+    evicted first) and a time-to-live for each entry.
+    """
+
+    def __init__(self, max_entries: int = ENTITY_CACHE_SIZE, ttl: float = ENTITY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Tokens are the number of deletions so far. The latest deletion
+        # of recently deleted keys is kept (as many as entries); a token
+        # older than _floor may predate a deletion that was forgotten,
+        # or a clear(), so it never stores.
+        self._deletions = 0
+        self._deleted: "OrderedDict[str, int]" = OrderedDict()
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def token(self, key: str) -> int:
+        with self._lock:
+            return self._deletions
+
+    def set(self, key: str, value: str, token: Optional[int] = None):
+        with self._lock:
+            if token is not None and (token < self._floor or self._deleted.get(key, -1) >= token):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._deleted[key] = self._deletions
+            self._deleted.move_to_end(key)
+            self._deletions += 1
+            while len(self._deleted) > self.max_entries:
+                _, deleted_at = self._deleted.popitem(last=False)
+                self._floor = deleted_at + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._deleted.clear()
+            self._deletions += 1
+            self._floor = self._deletions
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+
+def load_backend(name: str = ENTITY_CACHE_BACKEND) -> CacheBackend:
+    """
+    Create the cache backend named by ENTITY_CACHE_BACKEND
+    Custom backends are given as "module:ClassName" and built with no
+    arguments, so they should read their own settings (e.g. a server URL).
+    """
+    if name == "memory":
+        return MemoryCache()
+    if name == "none":
+        return NullCache()
+    module_name, _, class_name = name.partition(":")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class()
+
+
+def user_key(user_id: int) -> str:
+    """Cache key for a user"""
+    return f"user:{user_id}"
+
+
+def event_key(event_id: int) -> str:
+    """Cache key for an event"""
+    return f"event:{event_id}"
+
+
+# Shared cache used by the detail endpoints
+entity_cache = load_backend()
+
+# Short-lived list totals, one cache per table, cleared when the table
+# changes. Totals for filters the counter tables can't answer need a
+# COUNT(*), so this keeps paging through a result from recounting it.
+count_caches = {
+    "users": MemoryCache(COUNT_CACHE_SIZE, COUNT_CACHE_TTL),
+    "events": MemoryCache(COUNT_CACHE_SIZE, COUNT_CACHE_TTL),
+}
@@ -0,0 +1,209 @@
+"""
+Change Stream for the Church App
+This file fans out change notices (a user or event was created, updated or
+deleted) to clients listening on GET /changes, so apps don't have to keep
+re-polling the list endpoints to notice changes.
+
+Writes go through users_changed / events_changed, which drop the cached
+copies and publish a compact notice. Every connected client has its
+own bounded queue, filled without waiting. A client that can't keep up
+never holds up the writer or the other clients: when its queue is full,
+the waiting notices are dropped and replaced by a single "resync" notice,
+telling it to reload its lists instead.
+
+Notices are fanned out within the process. When running several workers,
+each one only sees the writes it handled itself.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional, Sequence, Set
+
+from dotenv import load_dotenv
+
+from .cache import count_caches, entity_cache, event_key, user_key
+from .http_cache import response_cache
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Notices kept waiting for a client before it's told to resync
+CHANGE_STREAM_QUEUE_SIZE = int(os.getenv("CHANGE_STREAM_QUEUE_SIZE", "100"))
+# Seconds between keep-alive comments on an idle stream (proxies drop
+# connections that stay silent for too long)
+CHANGE_STREAM_KEEPALIVE = float(os.getenv("CHANGE_STREAM_KEEPALIVE", "15"))
+
+# The notice sent instead of the ones a slow client missed
+RESYNC = "resync"
+
+
+class Subscriber:
+    """
+    One connected client: a bounded queue on the client's event loop
+    """
+
+    def __init__(self, broker: "ChangeBroker", loop: asyncio.AbstractEventLoop,
+                 entities: Optional[Set[str]]):
+        self.broker = broker
+        self.loop = loop
+        self.entities = entities
+        self.queue: "asyncio.Queue[Dict]" = asyncio.Queue(broker.max_queued)
+
+    def offer(self, notice: Dict):
+        """
+        Queue a notice without waiting (runs on the subscriber's loop)
+        - If the queue is full, what's waiting is replaced by one resync
+        """
+        if self.queue.full():
+            self.broker.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"op": RESYNC, "seq": notice["seq"]})
+        else:
+            self.queue.put_nowait(notice)
+
+
+class ChangeBroker:
+    """
+    In-process publish/subscribe of change notices
+    """
+
+    def __init__(self, max_queued: int = CHANGE_STREAM_QUEUE_SIZE):
+        self.max_queued = max_queued
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+        # Sequence number of the last notice (sent as the SSE event ID)
+        self._seq = itertools.count(1)
+        self.last_seq = 0
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, entities: Optional[Set[str]] = None) -> Subscriber:
+        """
+        Register a client (from a coroutine on its event loop)
+        - entities limits the notices to "user" and/or "event"
+        """
+        subscriber = Subscriber(self, asyncio.get_running_loop(), entities)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Remove a client"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, entity: str, op: str, entity_id: Optional[int] = None,
+                updated_at: Optional[datetime] = None):
+        """
+        Send a notice to every subscribed client
+        - Safe to call from the event loop or from threadpool endpoints
+        - Never waits on a client; delivery happens on each client's loop
+        - entity_id None means many rows changed at once (e.g. an import)
+        """
+        with self._lock:
+            seq = next(self._seq)
+            self.last_seq = seq
+            self.published += 1
+            subscribers = [subscriber for subscriber in self._subscribers
+                           if subscriber.entities is None or entity in subscriber.entities]
+        if not subscribers:
+            return
+        notice = {
+            "seq": seq,
+            "entity": entity,
+            "id": entity_id,
+            "op": op,
+            "updated_at": (updated_at or datetime.utcnow()).isoformat(),
+        }
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, notice)
+            except RuntimeError:
+                # The client's loop is closed (server shutting down)
+                self.unsubscribe(subscriber)
+
+    def publish_many(self, entity: str, op: str, entity_ids: Sequence[int],
+                     updated_at: Optional[datetime] = None):
+        """
+        Send one notice per ID, or a single notice without an ID when there
+        are more than a client's queue could hold anyway (or no IDs)
+        """
+        if not entity_ids or len(entity_ids) > self.max_queued:
+            self.publish(entity, op, None, updated_at)
+            return
+        for entity_id in entity_ids:
+            self.publish(entity, op, entity_id, updated_at)
+
+    def stats(self) -> Dict[str, int]:
+        """Connected clients and notices published / dropped"""
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "dropped": self.dropped,
+            }
+
+
+def format_event(notice: Dict) -> str:
+    """Encode a notice as a Server-Sent Events message"""
+    data = {name: value for name, value in notice.items() if name != "seq"}
+    return f"id: {notice['seq']}\nevent: {notice['op']}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream(broker: "ChangeBroker", entities: Optional[Set[str]] = None,
+                 last_event_id: Optional[str] = None,
+                 keepalive: float = CHANGE_STREAM_KEEPALIVE) -> AsyncIterator[str]:
+    """
+    Server-Sent Events body for one client
+    - A client reconnecting with a Last-Event-ID from before the latest
+      notice first gets a resync, as notices aren't kept for replay
+    """
+    subscriber = broker.subscribe(entities)
+    try:
+        # Ask EventSource clients to wait 3 seconds before reconnecting
+        yield "retry: 3000\n\n"
+        if last_event_id is not None and last_event_id != str(broker.last_seq):
+            yield format_event({"op": RESYNC, "seq": broker.last_seq})
+        while True:
+            try:
+                notice = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(notice)
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+# Shared broker used by the write endpoints and GET /changes
+broker = ChangeBroker()
+
+
+def users_changed(op: str, *user_ids: int, updated_at: Optional[datetime] = None):
+    """
+    Drop cached copies of users after a write and tell /changes listeners
+    - op is "created", "updated", "deleted", "imported" or "archived"
+    - Without user_ids, the notice has no id (many users changed)
+    """
+    response_cache.invalidate("users")
+    count_caches["users"].clear()
+    for user_id in user_ids:
+        entity_cache.delete(user_key(user_id))
+    broker.publish_many("user", op, user_ids, updated_at)
+
+
+def events_changed(op: str, *event_ids: int, updated_at: Optional[datetime] = None):
+    """
+    Drop cached copies of events after a write and tell /changes listeners
+    - op is "created", "updated", "deleted" or "archived"
+    """
+    response_cache.invalidate("events")
+    count_caches["events"].clear()
+    for event_id in event_ids:
+        entity_cache.delete(event_key(event_id))
+    broker.publish_many("event", op, event_ids, updated_at)
@@ -3,12 +3,19 @@ Database Configuration for the Church App
 This file handles database connection and session management.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Callable, TypeVar, Union
 import os
 from dotenv import load_dotenv
 
+from .metrics import instrument_engine
+
 # Load environment variables from .env file
 # This allows us to keep sensitive information like database URLs out of the code
 load_dotenv()
@@ -18,21 +25,159 @@ load_dotenv()
 SQLALCHEMY_DATABASE_URL = os.getenv(
     "DATABASE_URL", "sqlite:///./church_app.db")
 
+# How endpoints talk to the database: "sync" (default) or "async"
+# In async mode requests don't hold a threadpool slot while waiting on the
+# database, which helps with large bursts of traffic
+DATABASE_MODE = os.getenv("DATABASE_MODE", "sync").lower()
+ASYNC_MODE = DATABASE_MODE == "async"
+
+# SQLite tuning profile: "default" or "production"
+# The production profile turns on WAL journaling (readers no longer wait for
+# writers) and applies the connection settings in SQLITE_PRODUCTION_PRAGMAS
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default").lower()
+
+# Settings applied to every new SQLite connection in the production profile
+SQLITE_PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    # Safe with WAL, and avoids an fsync on every commit
+    "synchronous": "NORMAL",
+    # Wait this many milliseconds for a lock instead of failing right away
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    # Read the database file through memory mapping (256 MB)
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Page cache per connection, negative means KiB (64 MB)
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "temp_store": "MEMORY",
+}
+
+# Connection pool sizing (ignored for in-memory SQLite databases)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Async drivers used for each database backend in async mode
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def get_connect_args(url: str) -> dict:
+    """
+    Driver-specific connection arguments for a database URL
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        # This argument is needed for SQLite to allow multiple threads
+        return {"check_same_thread": False}
+    return {}
+
+
+def get_async_database_url(url: str) -> str:
+    """
+    Turn a database URL into one that uses an async driver
+    e.g. sqlite:///./church_app.db -> sqlite+aiosqlite:///./church_app.db
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or parsed.drivername.startswith(driver):
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def get_pool_args(url: str, is_async: bool = False) -> dict:
+    """
+    Connection pool arguments for a database URL
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        if parsed.database in (None, "", ":memory:"):
+            # In-memory databases use a single shared connection
+            return {}
+        if is_async:
+            # aiosqlite keeps SQLAlchemy's default of one connection per
+            # session: every aiosqlite connection runs its own thread, and
+            # idle pooled ones would keep the process from exiting
+            return {}
+    return {
+        "poolclass": AsyncAdaptedQueuePool if is_async else QueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: dict):
+    """
+    Run PRAGMA statements on every new connection an engine opens
+    """
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    event.listen(engine, "connect", set_pragmas)
+
+
+def configure_engine(engine: Engine, profile: str = SQLITE_PROFILE) -> Engine:
+    """
+    Apply the SQLite tuning profile to an engine (sync or the sync side
+    of an async engine). Other databases are left as they are.
+    """
+    if engine.dialect.name == "sqlite" and profile == "production":
+        apply_sqlite_pragmas(engine, SQLITE_PRODUCTION_PRAGMAS)
+    return engine
+
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL, profile: str = SQLITE_PROFILE) -> Engine:
+    """
+    Create a sync engine with the configured pool and SQLite profile
+    """
+    engine = create_engine(
+        url, connect_args=get_connect_args(url), **get_pool_args(url))
+    return configure_engine(engine, profile)
+
+
 # Create SQLAlchemy engine
-# connect_args is needed for SQLite
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    # This argument is needed for SQLite to allow multiple threads
-    connect_args={"check_same_thread": False}
-)
+# The sync engine is always available (migrations, scripts and the
+# endpoints that do heavy batch work use it)
+engine = create_db_engine()
+# Count and time SQL statements per request (see metrics.py)
+instrument_engine(engine)
 
 # Create a session factory
 # This will be used to create database sessions
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit is off so objects returned by a write (via RETURNING)
+# can be read after the commit without another SELECT
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Async engine and session factory, only created in async mode so the
+# async drivers (aiosqlite / asyncpg) are only needed when used
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_MODE:
+    ASYNC_DATABASE_URL = get_async_database_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args=get_connect_args(SQLALCHEMY_DATABASE_URL),
+        **get_pool_args(SQLALCHEMY_DATABASE_URL, is_async=True)
+    )
+    configure_engine(async_engine.sync_engine)
+    instrument_engine(async_engine.sync_engine)
+    # expire_on_commit is off so returned objects can still be read after
+    # the commit without lazy-loading outside of the database call
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False)
 
 # Create a base class for declarative models
 Base = declarative_base()
 
+# Either kind of session, depending on DATABASE_MODE
+DbSession = Union[Session, AsyncSession]
+
+T = TypeVar("T")
+
 # Dependency function for FastAPI
 # This function will be used to get database sessions in route handlers
 
@@ -47,3 +192,28 @@ def get_db():
         yield db  # Provide the database session to the route handler
     finally:
         db.close()  # Always close the session, even if an error occurs
+
+
+async def get_async_db():
+    """
+    Async database dependency for FastAPI endpoints.
+    Yields an async database session and ensures it's closed after use.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Session dependency for the endpoints, picked by DATABASE_MODE
+get_session = get_async_db if ASYNC_MODE else get_db
+
+
+async def run_db(db: DbSession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a database function (like the ones in db_utils) from an async endpoint.
+    - With an async session it runs on the async driver via run_sync,
+      so no thread is used while waiting on the database
+    - With a regular session it runs in the threadpool, like a sync endpoint
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -3,10 +3,19 @@ Database Utility Functions for the Church App
 This file contains helper functions for common database operations.
 """
 
+from pydantic import ValidationError
+from sqlalchemy import DateTime, and_, bindparam, delete, func, insert, literal, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import datetime
-from typing import List, Optional
-from . import models, schemas
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import calendar
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import heapq
+from . import auth, models, recurrence, schemas
+from .imports import ImportRow
+from .search import user_search_filters
 
 
 def get_user_by_email(db: Session, email: str):
@@ -23,6 +32,73 @@ def get_user_by_id(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
 
+def get_token_user(db: Session, user_id: int):
+    """
+    Get the columns that authorize a request for a user by their ID
+    (None if there's no such user)
+    - Ends its transaction, so the connection goes back to the pool while
+      the request runs (e.g. during a long streamed export)
+    """
+    user = db.execute(
+        select(models.User.id, models.User.email, models.User.role,
+               models.User.is_active, models.User.created_at)
+        .where(models.User.id == user_id)
+    ).first()
+    db.commit()
+    return user
+
+
+def get_archived_user(db: Session, user_id: int):
+    """
+    Get an archived user by their (original) ID
+    The latest copy wins if the ID was archived more than once.
+    """
+    return db.query(models.ArchivedUser).filter(models.ArchivedUser.id == user_id).order_by(
+        models.ArchivedUser.archive_id.desc()).first()
+
+
+def filter_users(
+    db: Session,
+    role: Optional[models.UserRole] = None,
+    is_active: Optional[bool] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    q: Optional[str] = None,
+    model=models.User
+):
+    """
+    Build a query for the users matching the given filters, ordered by ID
+    city, state and q (free-text name/city/state search) use the search
+    index when it is available.
+    Pass model=models.ArchivedUser to query the archive instead.
+    """
+    query = db.query(model).filter(*user_filters(
+        db, role=role, is_active=is_active, city=city, state=state, q=q, model=model))
+    return query.order_by(model.id)
+
+
+def user_filters(
+    db: Session,
+    role: Optional[models.UserRole] = None,
+    is_active: Optional[bool] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    q: Optional[str] = None,
+    model=models.User
+) -> list:
+    """
+    WHERE conditions for the given user filters
+    Shared by the list query and the bulk update/delete statements.
+    """
+    conditions = []
+    if role is not None:
+        conditions.append(model.role == role)
+    if is_active is not None:
+        conditions.append(model.is_active == is_active)
+    conditions.extend(user_search_filters(db, q=q, city=city, state=state, model=model))
+    return conditions
+
+
 def get_users(
     db: Session,
     skip: int = 0,
@@ -30,31 +106,143 @@ def get_users(
     role: Optional[models.UserRole] = None,
     is_active: Optional[bool] = None,
     city: Optional[str] = None,
-    state: Optional[str] = None
+    state: Optional[str] = None,
+    after_id: Optional[int] = None,
+    q: Optional[str] = None,
+    columns: Optional[list] = None,
+    include_archived: bool = False
 ) -> List[models.User]:
     """
     Get a list of users with optional filtering
+    Users are ordered by ID. Pass after_id (keyset pagination) to start
+    right after a known user instead of skipping rows with an offset.
+    Pass columns to get plain rows with just those columns instead of
+    User objects.
+    With include_archived, archived users are merged in by ID.
     """
-    query = db.query(models.User)
+    filters = dict(role=role, is_active=is_active, city=city, state=state, q=q)
+    models_to_read = [models.User, models.ArchivedUser] if include_archived else [models.User]
+    queries = []
+    for model in models_to_read:
+        query = filter_users(db, model=model, **filters)
+        if columns is not None:
+            query = query.with_entities(*archive_columns(model, columns))
+        if after_id is not None:
+            query = query.filter(model.id > after_id)
+        queries.append(query)
+    if after_id is not None:
+        skip = 0
+    if not include_archived:
+        return queries[0].offset(skip).limit(limit).all()
+
+    # Enough of each tier to fill the page, merged in ID order
+    merged = heapq.merge(*(query.limit(skip + limit).all() for query in queries),
+                         key=lambda item: item.id)
+    return list(islice(merged, skip, skip + limit))
 
-    if role is not None:
-        query = query.filter(models.User.role == role)
-    if is_active is not None:
-        query = query.filter(models.User.is_active == is_active)
-    if city is not None:
-        query = query.filter(models.User.city.ilike(f"%{city}%"))
-    if state is not None:
-        query = query.filter(models.User.state.ilike(f"%{state}%"))
 
-    return query.offset(skip).limit(limit).all()
+def archive_columns(model, columns: list) -> list:
+    """
+    The columns of an archive model matching a hot table's columns
+    (the same list if model isn't an archive), so rows from both tiers
+    have the same fields
+    """
+    return [getattr(model, column.key, column) for column in columns]
 
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
+# Table -> the entity its tombstones are recorded as
+TOMBSTONE_ENTITIES = {"users": "user", "events": "event"}
+
+
+def get_table_version(db: Session, model) -> Tuple[Optional[datetime], int]:
     """
-    Create a new user
+    Get the time a table last changed and its row count
+    - The time is the latest updated_at or tombstone deleted_at, so it
+      moves when a row is deleted too
+    - Together they work as a cheap version number for list responses
+    """
+    # Separate subqueries so each max() reads the end of an index; the row
+    # count comes from the trigger-maintained counter table
+    latest = select(func.max(model.updated_at)).scalar_subquery()
+    deleted = select(func.max(models.Tombstone.deleted_at)).where(
+        models.Tombstone.entity == TOMBSTONE_ENTITIES[model.__tablename__]).scalar_subquery()
+    count = _table_count(model.__tablename__)
+    updated_at, deleted_at, count = db.execute(select(latest, deleted, count)).one()
+    changes = [time for time in (updated_at, deleted_at) if time is not None]
+    return (max(changes) if changes else None), count
+
+
+def _table_count(table_name: str):
+    """Row count of a table from the table_counts counter row"""
+    return select(func.coalesce(func.sum(models.TableCount.n), 0)).where(
+        models.TableCount.table_name == table_name).scalar_subquery()
+
+
+def count_users(
+    db: Session,
+    role: Optional[models.UserRole] = None,
+    is_active: Optional[bool] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    q: Optional[str] = None,
+    include_archived: bool = False
+) -> int:
+    """
+    Count the users matching the given filters
+    - No filters, or only role / is_active: read from the counter tables
+      (a few rows, no matter how many users there are)
+    - Any other filter: COUNT(*) over the matching users
+    - include_archived adds a COUNT(*) over the matching archived users
     """
-    # TODO: Add password hashing
-    db_user = models.User(
+    filters = dict(role=role, is_active=is_active, city=city, state=state, q=q)
+    archived = 0
+    if include_archived:
+        archived = db.execute(
+            select(func.count()).select_from(models.ArchivedUser).where(
+                *user_filters(db, model=models.ArchivedUser, **filters))
+        ).scalar_one()
+
+    if city is None and state is None and q is None:
+        if role is None and is_active is None:
+            return db.execute(select(_table_count("users"))).scalar_one() + archived
+        query = select(func.coalesce(func.sum(models.UserCount.n), 0))
+        if role is not None:
+            query = query.where(models.UserCount.role == role)
+        if is_active is not None:
+            query = query.where(models.UserCount.is_active == is_active)
+        return db.execute(query).scalar_one() + archived
+
+    return db.execute(
+        select(func.count()).select_from(models.User).where(*user_filters(db, **filters))
+    ).scalar_one() + archived
+
+
+def month_day(value: Optional[datetime]) -> Optional[int]:
+    """
+    A date's month and day as month * 100 + day (e.g. 1231)
+    """
+    return value.month * 100 + value.day if value is not None else None
+
+
+def with_month_days(values: dict) -> dict:
+    """
+    Add the derived birthday / anniversary columns to a user update
+    """
+    if "date_of_birth" in values:
+        values = {**values, "birthday_md": month_day(values["date_of_birth"])}
+    if "join_date" in values:
+        values = {**values, "anniversary_md": month_day(values["join_date"])}
+    return values
+
+
+def user_values(user: schemas.UserCreate, hashed_password: Optional[str] = None) -> dict:
+    """
+    Column values for a new user row
+    The password is hashed unless its hash is passed in.
+    """
+    if hashed_password is None:
+        hashed_password = auth.hash_password(user.password)
+    return with_month_days(dict(
         email=user.email,
         first_name=user.first_name,
         last_name=user.last_name,
@@ -65,16 +253,151 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
         state=user.state,
         role=user.role,
         date_of_birth=user.date_of_birth,
-        hashed_password=user.password,  # This should be hashed in production
+        hashed_password=hashed_password,
         is_active=True,
         join_date=datetime.utcnow()
-    )
-    db.add(db_user)
+    ))
+
+
+def create_user(db: Session, user: schemas.UserCreate,
+                hashed_password: Optional[str] = None) -> models.User:
+    """
+    Create a new user
+    - One INSERT ... RETURNING statement, no extra SELECT afterwards
+    - Raises IntegrityError if the email is already registered
+      (the unique index on email does the check)
+    """
+    db_user = db.scalars(
+        insert(models.User).values(**user_values(user, hashed_password))
+        .returning(models.User)
+    ).one()
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
+def set_password_hash(db: Session, user_id: int, hashed_password: str):
+    """
+    Store a new hash of a user's unchanged password (e.g. after a login
+    found it stored in an outdated format)
+    - updated_at is kept: the profile itself hasn't changed
+    """
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(hashed_password=hashed_password, updated_at=models.User.updated_at)
+    )
+    db.commit()
+
+
+# Number of rows inserted per transaction by import_users
+IMPORT_BATCH_SIZE = 1000
+
+
+def _validation_message(error: ValidationError) -> str:
+    """Turn a validation error into a short, readable message"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+def _insert_user_batch(
+    db: Session,
+    batch: List[Tuple[int, schemas.UserCreate]],
+    report: schemas.ImportReport
+):
+    """
+    Insert a batch of validated users in one executemany transaction
+    Emails that are already registered are rejected with one query, before
+    the (slow) password hashing, which runs on several threads.
+    """
+    emails = [user.email for _, user in batch]
+    existing = set(db.scalars(
+        select(models.User.email).where(models.User.email.in_(emails))))
+
+    new_users = []
+    for line, user in batch:
+        if user.email in existing:
+            report.errors.append(schemas.ImportRowError(
+                line=line, email=user.email,
+                error="Email already registered"))
+        else:
+            new_users.append((line, user))
+    if not new_users:
+        return
+
+    hashes = auth.hash_passwords([user.password for _, user in new_users])
+    rows = [(line, user_values(user, hashed))
+            for (line, user), hashed in zip(new_users, hashes)]
+
+    try:
+        db.execute(insert(models.User), [values for _, values in rows])
+        db.commit()
+        report.imported += len(rows)
+    except IntegrityError:
+        # Someone registered one of these emails in the meantime,
+        # so fall back to inserting the rows one at a time
+        db.rollback()
+        for line, values in rows:
+            try:
+                db.execute(insert(models.User), [values])
+                db.commit()
+                report.imported += 1
+            except IntegrityError:
+                db.rollback()
+                report.errors.append(schemas.ImportRowError(
+                    line=line, email=values["email"],
+                    error="Email already registered"))
+
+
+def import_users(
+    db: Session,
+    rows: Iterable[ImportRow],
+    batch_size: int = IMPORT_BATCH_SIZE
+) -> schemas.ImportReport:
+    """
+    Create users in bulk from parsed upload rows
+    - Validates each row with schemas.UserCreate
+    - Inserts valid rows in batches, one transaction per batch
+    - Returns how many users were created plus an error for every rejected row
+    """
+    report = schemas.ImportReport()
+    batch: List[Tuple[int, schemas.UserCreate]] = []
+    emails_in_batch = set()
+
+    for row in rows:
+        email = row.data.get("email") if row.data else None
+        email = str(email) if email is not None else None
+        if row.error is not None:
+            report.errors.append(schemas.ImportRowError(
+                line=row.line, error=row.error))
+            continue
+        try:
+            user = schemas.UserCreate.model_validate(row.data)
+        except ValidationError as e:
+            report.errors.append(schemas.ImportRowError(
+                line=row.line, email=email, error=_validation_message(e)))
+            continue
+        if user.email in emails_in_batch:
+            report.errors.append(schemas.ImportRowError(
+                line=row.line, email=user.email,
+                error="Duplicate email in upload"))
+            continue
+
+        batch.append((row.line, user))
+        emails_in_batch.add(user.email)
+        if len(batch) >= batch_size:
+            _insert_user_batch(db, batch, report)
+            batch = []
+            emails_in_batch = set()
+
+    if batch:
+        _insert_user_batch(db, batch, report)
+
+    report.failed = len(report.errors)
+    return report
+
+
 def update_user(
     db: Session,
     user_id: int,
@@ -82,21 +405,64 @@ def update_user(
 ) -> Optional[models.User]:
     """
     Update a user's information
+    - One UPDATE ... RETURNING statement, no lookup before or after
+    - Returns None if the user doesn't exist
+    - Raises IntegrityError if the new email is already registered
     """
-    db_user = get_user_by_id(db, user_id)
-    if db_user is None:
-        return None
-
     # Update only provided fields
     update_data = user_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_user, field, value)
+    if not update_data:
+        return get_user_by_id(db, user_id)
 
+    db_user = db.scalars(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(**with_month_days(update_data))
+        .returning(models.User)
+    ).first()
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
+def get_active_user_ids(db: Session, after_id: int = 0, limit: int = 1000) -> List[int]:
+    """
+    IDs of active members in ID order, a page at a time (keyset on the
+    (is_active, id) index), e.g. to split a mailing into batches
+    """
+    return db.scalars(
+        select(models.User.id)
+        .where(models.User.is_active.is_(True), models.User.id > after_id)
+        .order_by(models.User.id)
+        .limit(limit)
+    ).all()
+
+
+def get_recipients(db: Session, user_ids: List[int]) -> list:
+    """
+    Contact details (id, email, first_name) of those users who are still
+    active and have an email address
+    """
+    return db.execute(
+        select(models.User.id, models.User.email, models.User.first_name)
+        .where(models.User.id.in_(user_ids), models.User.is_active.is_(True),
+               models.User.email.isnot(None))
+        .order_by(models.User.id)
+    ).all()
+
+
+def record_deletions(db: Session, entity: str, entity_ids: List[int]):
+    """
+    Add tombstones for deleted users or events (entity "user" / "event"),
+    in the same transaction as the delete, so /sync can report them
+    """
+    if entity_ids:
+        now = datetime.utcnow()
+        db.execute(insert(models.Tombstone), [
+            {"entity": entity, "entity_id": entity_id, "deleted_at": now}
+            for entity_id in entity_ids
+        ])
+
+
 def delete_user(db: Session, user_id: int) -> bool:
     """
     Delete a user
@@ -106,28 +472,1003 @@ def delete_user(db: Session, user_id: int) -> bool:
     if db_user is None:
         return False
 
+    delete_attendance(db, models.Attendance.user_id == user_id)
     db.delete(db_user)
+    record_deletions(db, "user", [user_id])
     db.commit()
     return True
 
 
-def create_event(db: Session, event: schemas.EventCreate) -> models.Event:
+def selection_filters(db: Session, selection: schemas.UserSelection) -> list:
+    """
+    WHERE conditions for the users picked by a bulk request
+    """
+    if selection.ids is not None:
+        return [models.User.id.in_(selection.ids)]
+    return user_filters(db, **selection.filter.model_dump())
+
+
+def bulk_update_users(
+    db: Session,
+    selection: schemas.UserSelection,
+    changes: schemas.UserUpdate
+) -> List[int]:
+    """
+    Update every selected user with one UPDATE ... WHERE statement
+    - updated_at is set by the column's onupdate, like a single update
+    - Returns the IDs of the updated users (RETURNING), so their cache
+      entries can be dropped; the count is the length of the list
+    """
+    user_ids = db.scalars(
+        update(models.User)
+        .where(*selection_filters(db, selection))
+        .values(**with_month_days(changes.model_dump(exclude_unset=True)))
+        .returning(models.User.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return user_ids
+
+
+def bulk_delete_users(db: Session, selection: schemas.UserSelection) -> List[int]:
+    """
+    Delete every selected user with one DELETE ... WHERE statement
+    (their RSVPs and check-ins go first, in the same transaction)
+    Returns the IDs of the deleted users (RETURNING).
+    """
+    filters = selection_filters(db, selection)
+    delete_attendance(db, models.Attendance.user_id.in_(
+        select(models.User.id).where(*filters)))
+    user_ids = db.scalars(
+        delete(models.User)
+        .where(*filters)
+        .returning(models.User.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    record_deletions(db, "user", user_ids)
+    db.commit()
+    return user_ids
+
+
+def month_day_window(column, first: int, last: int):
+    """
+    WHERE condition for month-days from first to last, wrapping around
+    the end of the year if last comes before first (e.g. 1228 to 103)
+    """
+    if first <= last:
+        return column.between(first, last)
+    return or_(column >= first, column <= last)
+
+
+def celebration_date(value: datetime, start: date) -> date:
+    """
+    The next time a date's month and day come around, on or after start
+    February 29th falls on March 1st in other years.
+    """
+    for year in (start.year, start.year + 1):
+        try:
+            day = value.replace(year=year).date()
+        except ValueError:
+            day = date(year, 3, 1)
+        if day >= start:
+            return day
+
+
+def get_celebrations(db: Session, start: date, days: int) -> List[schemas.Celebration]:
+    """
+    Get the birthdays and membership anniversaries of active members in
+    the days from start (at most a year), soonest first
+    - Each kind is one range lookup on its (is_active, month-day) index;
+      the range is split in two when it wraps around the end of the year
+    - February 29th dates are celebrated on March 1st in other years (see
+      celebration_date), so a window starting then also looks up 229
+    """
+    days = min(days, 366)
+    last = start + timedelta(days=days - 1)
+    first = month_day(start)
+    if first == 301 and not calendar.isleap(start.year):
+        first = 229
+    celebrations = []
+    for kind, date_column, md_column in (
+            ("birthday", models.User.date_of_birth, models.User.birthday_md),
+            ("anniversary", models.User.join_date, models.User.anniversary_md)):
+        window = (md_column.isnot(None) if days >= 366
+                  else month_day_window(md_column, first, month_day(last)))
+        rows = db.execute(
+            select(models.User.id, models.User.first_name, models.User.last_name, date_column)
+            .where(models.User.is_active.is_(True), window)
+        ).all()
+        for user_id, first_name, last_name, value in rows:
+            day = celebration_date(value, start)
+            years = day.year - value.year
+            # Members who joined this year have no anniversary yet
+            if day > last or years < 1:
+                continue
+            celebrations.append(schemas.Celebration(
+                user_id=user_id, first_name=first_name, last_name=last_name,
+                kind=kind, date=day, years=years))
+    celebrations.sort(key=lambda celebration: (celebration.date, celebration.kind,
+                                               celebration.user_id))
+    return celebrations
+
+
+def event_values(event: schemas.EventCreate) -> dict:
+    """
+    Column values for a new event
+    - Recurring events also store the date of their last occurrence
+    """
+    values = event.model_dump()
+    if event.recurrence_rule is not None:
+        values["recurrence_until"] = recurrence.last_occurrence(
+            event.event_date, recurrence.parse_rule(event.recurrence_rule),
+            recurrence.zone(event.timezone))
+    return values
+
+
+def create_event(db: Session, event: schemas.EventCreate, notify: bool = False) -> models.Event:
     """
     Create a new event
+    - One INSERT ... RETURNING statement, no extra SELECT afterwards
+    - A recurring event is a single row, however many times it repeats
+    - notify queues the announcement job in the same transaction, so
+      there's never an event without its announcement (or the reverse)
     """
-    db_event = models.Event(**event.model_dump())
-    db.add(db_event)
+    db_event = db.scalars(
+        insert(models.Event).values(**event_values(event)).returning(models.Event)
+    ).one()
+    if notify:
+        enqueue_jobs(db, "announce_event", [{"event_id": db_event.id}])
     db.commit()
-    db.refresh(db_event)
     return db_event
 
 
+def get_event_by_id(db: Session, event_id: int):
+    """
+    Get an event by its ID
+    """
+    return db.query(models.Event).filter(models.Event.id == event_id).first()
+
+
+def get_archived_event(db: Session, event_id: int):
+    """
+    Get an archived event by its (original) ID (the latest copy, like
+    get_archived_user)
+    """
+    return db.query(models.ArchivedEvent).filter(models.ArchivedEvent.id == event_id).order_by(
+        models.ArchivedEvent.archive_id.desc()).first()
+
+
+def filter_events(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    descending: bool = False,
+    model=models.Event
+):
+    """
+    Build a query for events, ordered by date, then ID
+    - start / end limit the events to start <= event_date < end
+    - descending puts the latest events first
+    - model: models.ArchivedEvent to query the archive instead
+    Both the range filter and the ordering are served by the
+    (event_date, id) index.
+    """
+    query = db.query(model).filter(*event_filters(start, end, model))
+    if descending:
+        return query.order_by(model.event_date.desc(), model.id.desc())
+    return query.order_by(model.event_date, model.id)
+
+
+def event_filters(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  model=models.Event) -> list:
+    """
+    WHERE conditions for a date window (start <= event_date < end)
+    Recurring events are matched by their first occurrence only; use
+    get_series / expand_series for their other occurrences.
+    """
+    conditions = []
+    if start is not None:
+        conditions.append(model.event_date >= start)
+    if end is not None:
+        conditions.append(model.event_date < end)
+    return conditions
+
+
+def count_events(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_archived: bool = False
+) -> int:
+    """
+    Count the events in a date window
+    - One-off events without a window: the counter table, minus the
+      recurring events (found through their partial index)
+    - With one: COUNT(*) over the (event_date, id) index range
+    - Plus the occurrences of recurring events in the window (up to the
+      recurrence horizon if it's open-ended)
+    - include_archived adds a COUNT(*) over the archive's index range
+    """
+    window_end = recurrence.horizon(end, start)
+    series = get_series(db, start, window_end)
+    if start is None and end is None:
+        total = db.execute(select(_table_count("events"))).scalar_one() - db.execute(
+            select(func.count()).select_from(models.Event).where(IS_SERIES)
+        ).scalar_one()
+    else:
+        total = db.execute(
+            select(func.count()).select_from(models.Event).where(
+                *event_filters(start, end), IS_ONE_OFF)
+        ).scalar_one()
+    if include_archived:
+        total += db.execute(
+            select(func.count()).select_from(models.ArchivedEvent).where(
+                *event_filters(start, end, models.ArchivedEvent))
+        ).scalar_one()
+    exceptions = get_exceptions(db, series, start, window_end)
+    for db_series in series:
+        total += sum(1 for _ in expand_series(
+            db_series, exceptions.get(db_series.id, []), start, window_end))
+    return total
+
+
+# Recurring events are stored once, with a rule; everything else is a
+# one-off event
+IS_SERIES = models.Event.recurrence_rule.isnot(None)
+IS_ONE_OFF = models.Event.recurrence_rule.is_(None)
+
+
+def get_series(db: Session, start: Optional[datetime], end: datetime) -> List[models.Event]:
+    """
+    Get the recurring events that may have occurrences in a date window
+    (started before its end, and not over before its start)
+    """
+    query = db.query(models.Event).filter(IS_SERIES, models.Event.event_date < end)
+    if start is not None:
+        query = query.filter(or_(models.Event.recurrence_until.is_(None),
+                                 models.Event.recurrence_until >= start))
+    return query.all()
+
+
+def get_exceptions(
+    db: Session,
+    series: List[models.Event],
+    start: Optional[datetime],
+    end: datetime
+) -> Dict[int, List[models.EventException]]:
+    """
+    Get the changed or cancelled occurrences of some recurring events that
+    matter for a date window (from inside it, or moved into it), by event ID
+    """
+    if not series:
+        return {}
+
+    def in_window(column):
+        return and_(column < end, *([column >= start] if start is not None else []))
+
+    exceptions: Dict[int, List[models.EventException]] = {}
+    for exception in db.query(models.EventException).filter(
+            models.EventException.event_id.in_([db_series.id for db_series in series]),
+            or_(in_window(models.EventException.occurrence_date),
+                in_window(models.EventException.event_date))):
+        exceptions.setdefault(exception.event_id, []).append(exception)
+    return exceptions
+
+
+def occurrence_values(
+    series: models.Event,
+    occurrence_date: datetime,
+    exception: Optional[models.EventException] = None
+) -> dict:
+    """
+    Field values of one occurrence of a recurring event, with the
+    exception's changes applied
+    """
+    values = {
+        "id": series.id,
+        "title": series.title,
+        "description": series.description,
+        "event_date": occurrence_date,
+        "location": series.location,
+        "recurrence_rule": series.recurrence_rule,
+        "timezone": series.timezone,
+        "created_at": series.created_at,
+        "updated_at": series.updated_at,
+        "occurrence_date": occurrence_date,
+    }
+    if exception is not None:
+        for name in ("title", "description", "event_date", "location"):
+            if getattr(exception, name) is not None:
+                values[name] = getattr(exception, name)
+    return values
+
+
+def expand_series(
+    series: models.Event,
+    exceptions: List[models.EventException],
+    start: Optional[datetime],
+    end: datetime
+) -> Iterator[dict]:
+    """
+    Occurrences of a recurring event with start <= event_date < end,
+    in date order, as occurrence_values dicts
+    - Generated lazily, so reading the first few is cheap
+    - Cancelled occurrences are left out, changed ones use their new values
+      (and new position, if they were moved)
+    """
+    changed = {exception.occurrence_date: exception for exception in exceptions}
+    rule = recurrence.parse_rule(series.recurrence_rule)
+
+    def unchanged():
+        for date in recurrence.occurrences_between(
+                series.event_date, rule, start, end, recurrence.zone(series.timezone)):
+            if date not in changed:
+                yield occurrence_values(series, date)
+
+    # Changed occurrences go where their (possibly new) date puts them
+    edited = [occurrence_values(series, exception.occurrence_date, exception)
+              for exception in exceptions if not exception.cancelled]
+    edited = sorted(
+        (values for values in edited
+         if (start is None or values["event_date"] >= start) and values["event_date"] < end),
+        key=lambda values: values["event_date"])
+    return heapq.merge(unchanged(), edited, key=lambda values: values["event_date"])
+
+
+# Row types for occurrences returned with columns, by column names
+_occurrence_rows: Dict[Tuple[str, ...], type] = {}
+
+
+def _occurrence_result(values: dict, columns: Optional[list]):
+    """
+    Turn occurrence values into the same kind of result as the one-off
+    events: an (unsaved) Event object, or a row with the given columns
+    """
+    if columns is None:
+        db_event = models.Event(**{name: value for name, value in values.items()
+                                   if name != "occurrence_date"})
+        db_event.occurrence_date = values["occurrence_date"]
+        return db_event
+    names = tuple(column.key for column in columns)
+    row_type = _occurrence_rows.get(names)
+    if row_type is None:
+        row_type = _occurrence_rows[names] = namedtuple("OccurrenceRow", names)
+    return row_type(*(values[name] for name in names))
+
+
+def _event_key(item) -> Tuple[datetime, int]:
+    """Sort key of an event or occurrence: (event_date, id)"""
+    if isinstance(item, dict):
+        return item["event_date"], item["id"]
+    return item.event_date, item.id
+
+
 def get_events(
     db: Session,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    descending: bool = False,
+    columns: Optional[list] = None,
+    include_archived: bool = False
 ) -> List[models.Event]:
     """
-    Get a list of events
+    Get a list of events, optionally within a date window
+    Events are ordered by date, then ID. Pass after as (event_date, id)
+    (keyset pagination) to start right after a known event.
+    Pass columns to get plain rows with just those columns instead of
+    Event objects.
+    Recurring events are expanded into their occurrences in the window
+    (up to the recurrence horizon if it's open-ended), merged in order
+    with the one-off events.
+    With include_archived, archived events are merged in the same way
+    (they are all one-off events).
+    """
+    def one_off_query(model):
+        query = filter_events(db, start=start, end=end, descending=descending, model=model)
+        if columns is not None:
+            query = query.with_entities(*archive_columns(model, columns))
+        if after is not None:
+            # Row-value comparison so the (event_date, id) index is used
+            key = tuple_(model.event_date, model.id)
+            query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+        return query
+
+    query = one_off_query(models.Event).filter(IS_ONE_OFF)
+    archived = one_off_query(models.ArchivedEvent) if include_archived else None
+
+    window_end = recurrence.horizon(end, start)
+    series = get_series(db, start, window_end)
+    if not series and archived is None:
+        # Nothing to expand: page through the one-off events in SQL
+        if after is not None:
+            return query.limit(limit).all()
+        return query.offset(skip).limit(limit).all()
+
+    # Merge the one-off events and archived events (enough of each to
+    # fill the page) with each series' occurrences, and take the page
+    # from the merged stream
+    if after is not None:
+        skip = 0
+        if descending:
+            window_end = min(window_end, after[0] + timedelta(microseconds=1))
+    window_start = after[0] if after is not None and not descending else start
+    exceptions = get_exceptions(db, series, window_start, window_end)
+    streams = [query.limit(skip + limit).all()]
+    if archived is not None:
+        streams.append(archived.limit(skip + limit).all())
+    for db_series in series:
+        occurrences = expand_series(
+            db_series, exceptions.get(db_series.id, []), window_start, window_end)
+        # Descending lists need the latest first, so the window is expanded
+        # in full (it's bounded by the horizon) and reversed
+        streams.append(reversed(list(occurrences)) if descending else occurrences)
+    merged = heapq.merge(*streams, key=_event_key, reverse=descending)
+    if after is not None:
+        merged = (item for item in merged
+                  if (_event_key(item) < after if descending else _event_key(item) > after))
+    return [item if not isinstance(item, dict) else _occurrence_result(item, columns)
+            for item in islice(merged, skip, skip + limit)]
+
+
+def get_upcoming_events(
+    db: Session,
+    limit: int = 5,
+    now: Optional[datetime] = None
+) -> List[models.Event]:
+    """
+    Get the next events starting from now, soonest first
+    """
+    return get_events(db, limit=limit, start=now or datetime.utcnow())
+
+
+def get_occurrence_series(
+    db: Session,
+    event_id: int,
+    occurrence_date: datetime
+) -> Optional[models.Event]:
+    """
+    Get the recurring event an occurrence belongs to
+    - None if there's no such recurring event, or the rule doesn't give
+      it an occurrence on that date
+    """
+    series = get_event_by_id(db, event_id)
+    if series is None or series.recurrence_rule is None:
+        return None
+    if not recurrence.is_occurrence(
+            series.event_date, recurrence.parse_rule(series.recurrence_rule), occurrence_date,
+            recurrence.zone(series.timezone)):
+        return None
+    return series
+
+
+def save_occurrence(
+    db: Session,
+    series: models.Event,
+    occurrence_date: datetime,
+    changes: Optional[schemas.EventOccurrenceUpdate] = None
+) -> dict:
+    """
+    Change one occurrence of a recurring event, or cancel it (no changes)
+    - Stores the change as an exception row; the series itself stays one row
+    - Touches the series' updated_at, so cached lists and ETags change too
+    Returns the occurrence's new values.
+    """
+    exception = db.query(models.EventException).filter(
+        models.EventException.event_id == series.id,
+        models.EventException.occurrence_date == occurrence_date
+    ).first()
+    if exception is None:
+        exception = models.EventException(event_id=series.id, occurrence_date=occurrence_date)
+        db.add(exception)
+
+    exception.cancelled = changes is None
+    if changes is not None:
+        for name, value in changes.model_dump(exclude_unset=True).items():
+            setattr(exception, name, value)
+    series.updated_at = datetime.utcnow()
+    db.commit()
+    return occurrence_values(series, occurrence_date, exception)
+
+
+# Rows changed this recently are left for the next sync: a write that is
+# still being committed may carry an earlier updated_at than rows already
+# visible, and would otherwise be skipped by clients that synced meanwhile
+SYNC_SETTLE_TIME = timedelta(seconds=2)
+
+
+class SyncPosition(NamedTuple):
+    """
+    Where a client's last sync stopped: the (updated_at, id) of the last
+    user and event it got, and the last tombstone ID
+    """
+    user_updated_at: Optional[datetime] = None
+    user_id: Optional[int] = None
+    event_updated_at: Optional[datetime] = None
+    event_id: Optional[int] = None
+    tombstone_id: int = 0
+
+
+def _changed_rows(db: Session, model, after: Optional[Tuple[datetime, int]],
+                  settled: datetime, limit: int) -> list:
+    """
+    Rows of a table changed after a (updated_at, id) position, in that
+    order, walking the (updated_at, id) index (limit + 1 rows, to tell if
+    there are more)
+    """
+    query = db.query(model).filter(model.updated_at <= settled)
+    if after is not None:
+        query = query.filter(tuple_(model.updated_at, model.id) > tuple_(*after))
+    return query.order_by(model.updated_at, model.id).limit(limit + 1).all()
+
+
+def get_changes(
+    db: Session,
+    position: Optional[SyncPosition] = None,
+    limit: int = 500,
+    now: Optional[datetime] = None
+) -> Tuple[dict, SyncPosition]:
+    """
+    Get the users, events and deletions since a sync position
+    - Without a position, every user and event (a first sync); deletions
+      from before it don't matter to a client that has nothing yet
+    - Up to limit rows of each kind; has_more says whether to call again
+    - Recurring events come as stored (one row with the rule), with all
+      their changed / cancelled occurrences
+    Returns the changes and the position to continue from.
+    """
+    settled = (now or datetime.utcnow()) - SYNC_SETTLE_TIME
+    if position is None:
+        last_tombstone = db.scalar(select(func.max(models.Tombstone.id)))
+        position = SyncPosition(tombstone_id=last_tombstone or 0)
+
+    user_after = (position.user_updated_at, position.user_id) \
+        if position.user_updated_at is not None else None
+    event_after = (position.event_updated_at, position.event_id) \
+        if position.event_updated_at is not None else None
+    users = _changed_rows(db, models.User, user_after, settled, limit)
+    events = _changed_rows(db, models.Event, event_after, settled, limit)
+    # Tombstones go by ID; stop at the first one that hasn't settled so
+    # none is skipped
+    tombstones = []
+    for tombstone in db.query(models.Tombstone).filter(
+            models.Tombstone.id > position.tombstone_id
+    ).order_by(models.Tombstone.id).limit(limit + 1):
+        if tombstone.deleted_at > settled:
+            break
+        tombstones.append(tombstone)
+
+    has_more = any(len(rows) > limit for rows in (users, events, tombstones))
+    users, events, tombstones = users[:limit], events[:limit], tombstones[:limit]
+
+    series_ids = [event.id for event in events if event.recurrence_rule is not None]
+    exceptions: Dict[int, List[models.EventException]] = {}
+    if series_ids:
+        for exception in db.query(models.EventException).filter(
+                models.EventException.event_id.in_(series_ids)
+        ).order_by(models.EventException.event_id, models.EventException.occurrence_date):
+            exceptions.setdefault(exception.event_id, []).append(exception)
+    sync_events = []
+    for event in events:
+        sync_event = schemas.SyncEvent.model_validate(event)
+        sync_event.exceptions = [schemas.OccurrenceChange.model_validate(exception)
+                                 for exception in exceptions.get(event.id, [])]
+        sync_events.append(sync_event)
+
+    changes = {
+        "users": users,
+        "events": sync_events,
+        "deleted": [{"entity": tombstone.entity, "id": tombstone.entity_id,
+                     "deleted_at": tombstone.deleted_at} for tombstone in tombstones],
+        "has_more": has_more,
+    }
+    return changes, SyncPosition(
+        *((users[-1].updated_at, users[-1].id) if users else user_after or (None, None)),
+        *((events[-1].updated_at, events[-1].id) if events else event_after or (None, None)),
+        tombstones[-1].id if tombstones else position.tombstone_id,
+    )
+
+
+# Key of an attendance record: (event_id, occurrence_date, user_id)
+AttendanceKey = Tuple[int, datetime, int]
+
+
+def load_attendance(
+    db: Session,
+    event_id: int,
+    occurrence_date: Optional[datetime] = None
+) -> Optional[Tuple[datetime, Dict[int, models.AttendanceStatus]]]:
+    """
+    Get the RSVPs and check-ins of an event occurrence, by user ID
+    - occurrence_date can be left out for one-off events
+    - Returns (occurrence date, statuses), or None if there's no such
+      event or occurrence
+    """
+    db_event = get_event_by_id(db, event_id)
+    if db_event is None:
+        return None
+    if db_event.recurrence_rule is None:
+        if occurrence_date not in (None, db_event.event_date):
+            return None
+        occurrence_date = db_event.event_date
+    elif occurrence_date is None or not recurrence.is_occurrence(
+            db_event.event_date, recurrence.parse_rule(db_event.recurrence_rule),
+            occurrence_date, recurrence.zone(db_event.timezone)):
+        return None
+
+    rows = db.execute(
+        select(models.Attendance.user_id, models.Attendance.status).where(
+            models.Attendance.event_id == event_id,
+            models.Attendance.occurrence_date == occurrence_date)
+    ).all()
+    return occurrence_date, {user_id: status for user_id, status in rows}
+
+
+def write_attendance(
+    db: Session,
+    changes: Dict[AttendanceKey, Optional[models.AttendanceStatus]],
+    only_from: Optional[Dict[AttendanceKey, Tuple[Optional[models.AttendanceStatus], ...]]] = None
+) -> int:
+    """
+    Save a batch of RSVP / check-in changes in one transaction
+    - A status of None removes the record
+    - only_from skips a change unless the stored status is one of those
+      given for its key (e.g. an RSVP doesn't undo a check-in)
+    - Stored statuses are read first (one query per occurrence), so the
+      counters stay right even if another worker wrote some of the records
+    - Inserts, updates and deletes each run as one executemany, and the
+      counters get one statement per occurrence and status
+    Returns how many records changed.
+    """
+    by_occurrence: Dict[Tuple[int, datetime], List[int]] = {}
+    for event_id, occurrence_date, user_id in changes:
+        by_occurrence.setdefault((event_id, occurrence_date), []).append(user_id)
+
+    stored: Dict[AttendanceKey, Tuple[int, models.AttendanceStatus]] = {}
+    for (event_id, occurrence_date), user_ids in by_occurrence.items():
+        for start in range(0, len(user_ids), IMPORT_BATCH_SIZE):
+            for row in db.execute(
+                    select(models.Attendance.id, models.Attendance.user_id,
+                           models.Attendance.status).where(
+                        models.Attendance.event_id == event_id,
+                        models.Attendance.occurrence_date == occurrence_date,
+                        models.Attendance.user_id.in_(user_ids[start:start + IMPORT_BATCH_SIZE]))):
+                stored[(event_id, occurrence_date, row.user_id)] = (row.id, row.status)
+
+    now = datetime.utcnow()
+    inserts, updates, deletes = [], [], []
+    deltas: Dict[Tuple[int, datetime, models.AttendanceStatus], int] = {}
+    for key, status in changes.items():
+        row_id, old_status = stored.get(key, (None, None))
+        if old_status == status:
+            continue
+        if only_from and key in only_from and old_status not in only_from[key]:
+            continue
+        event_id, occurrence_date, user_id = key
+        if old_status is not None:
+            deltas[(event_id, occurrence_date, old_status)] = \
+                deltas.get((event_id, occurrence_date, old_status), 0) - 1
+        if status is not None:
+            deltas[(event_id, occurrence_date, status)] = \
+                deltas.get((event_id, occurrence_date, status), 0) + 1
+        if row_id is None:
+            inserts.append({"event_id": event_id, "occurrence_date": occurrence_date,
+                            "user_id": user_id, "status": status})
+        elif status is None:
+            deletes.append(row_id)
+        else:
+            updates.append({"id": row_id, "status": status, "updated_at": now})
+
+    if inserts:
+        db.execute(insert(models.Attendance), inserts)
+    if updates:
+        db.execute(update(models.Attendance), updates)
+    if deletes:
+        db.execute(delete(models.Attendance).where(models.Attendance.id.in_(deletes)))
+
+    count_key = tuple_(models.AttendanceCount.event_id,
+                       models.AttendanceCount.occurrence_date,
+                       models.AttendanceCount.status)
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    existing = set(db.execute(
+        select(models.AttendanceCount.event_id, models.AttendanceCount.occurrence_date,
+               models.AttendanceCount.status).where(count_key.in_(list(deltas)))
+    ).all()) if deltas else set()
+    for (event_id, occurrence_date, status), delta in deltas.items():
+        if (event_id, occurrence_date, status) in existing:
+            db.execute(
+                update(models.AttendanceCount)
+                .where(models.AttendanceCount.event_id == event_id,
+                       models.AttendanceCount.occurrence_date == occurrence_date,
+                       models.AttendanceCount.status == status)
+                .values(n=models.AttendanceCount.n + delta))
+        else:
+            db.execute(insert(models.AttendanceCount).values(
+                event_id=event_id, occurrence_date=occurrence_date,
+                status=status, n=delta))
+    db.commit()
+    return len(inserts) + len(updates) + len(deletes)
+
+
+def delete_attendance(db: Session, condition):
+    """
+    Delete the attendance records matching a condition and take them off
+    attendance_counts (committed with the caller's transaction)
+    - Needed when deleting users: SQLite doesn't enforce the foreign
+      keys, and where the cascade does run it leaves the counters alone
+    """
+    removed = db.execute(
+        select(models.Attendance.event_id, models.Attendance.occurrence_date,
+               models.Attendance.status, func.count())
+        .where(condition)
+        .group_by(models.Attendance.event_id, models.Attendance.occurrence_date,
+                  models.Attendance.status)
+    ).all()
+    if not removed:
+        return
+    # One executemany over the counters (a Core statement, since the ORM
+    # would take a list of parameters as updates by primary key)
+    counts = models.AttendanceCount.__table__
+    db.execute(
+        update(counts)
+        .where(counts.c.event_id == bindparam("b_event_id"),
+               counts.c.occurrence_date == bindparam("b_occurrence_date"),
+               counts.c.status == bindparam("b_status"))
+        .values(n=counts.c.n - bindparam("b_n")),
+        [{"b_event_id": event_id, "b_occurrence_date": occurrence_date,
+          "b_status": status, "b_n": n}
+         for event_id, occurrence_date, status, n in removed])
+    db.execute(delete(models.Attendance).where(condition)
+               .execution_options(synchronize_session=False))
+
+
+def get_attendance_counts(
+    db: Session,
+    event_id: int,
+    occurrence_date: datetime
+) -> Dict[models.AttendanceStatus, int]:
+    """
+    Get the stored RSVP and check-in totals of an event occurrence
+    (from attendance_counts, one primary key range lookup)
+    """
+    counts = {status: 0 for status in models.AttendanceStatus}
+    counts.update(db.execute(
+        select(models.AttendanceCount.status, models.AttendanceCount.n).where(
+            models.AttendanceCount.event_id == event_id,
+            models.AttendanceCount.occurrence_date == occurrence_date)
+    ).all())
+    return counts
+
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    run_at: Optional[datetime] = None,
+    max_attempts: int = 5,
+    unique_key: Optional[str] = None
+) -> Optional[int]:
+    """
+    Add a background job (see jobs.py for the kinds)
+    - run_at delays it, e.g. for scheduled work
+    - With a unique_key, nothing is added while a job with that key is
+      queued or running (the unique index decides, so it's race free)
+    Returns the job's ID, or None if it wasn't added.
+    """
+    try:
+        job_id = db.scalar(insert(models.Job).values(
+            kind=kind, payload=payload or {}, run_at=run_at or datetime.utcnow(),
+            max_attempts=max_attempts, unique_key=unique_key
+        ).returning(models.Job.id))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        if unique_key is None:
+            raise
+        return None
+    return job_id
+
+
+def enqueue_jobs(db: Session, kind: str, payloads: List[dict]):
+    """
+    Add many jobs of one kind in a single INSERT (e.g. one per batch of
+    recipients); committed with the caller's transaction
+    """
+    if payloads:
+        db.execute(insert(models.Job), [
+            {"kind": kind, "payload": payload} for payload in payloads
+        ])
+
+
+def claim_job(db: Session, now: Optional[datetime] = None) -> Optional[models.Job]:
+    """
+    Take the queued job that is due first and mark it running
+    - One UPDATE ... RETURNING, so two workers never get the same job
+      (on PostgreSQL, SKIP LOCKED lets them pick different rows at once)
+    - Returns None if no job is due
+    """
+    now = now or datetime.utcnow()
+    next_job = (
+        select(models.Job.id)
+        .where(models.Job.status == models.JobStatus.QUEUED, models.Job.run_at <= now)
+        .order_by(models.Job.run_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    job = db.scalars(
+        update(models.Job)
+        .where(models.Job.id == next_job, models.Job.status == models.JobStatus.QUEUED)
+        .values(status=models.JobStatus.RUNNING, started_at=now, heartbeat_at=now,
+                attempts=models.Job.attempts + 1)
+        .returning(models.Job)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.commit()
+    return job
+
+
+def _owned_job(job_id: int, attempt: int) -> list:
+    """
+    Conditions matching a job only while it is still running the given
+    attempt (claiming increments attempts, so a requeued and claimed
+    again job no longer matches)
+    """
+    return [models.Job.id == job_id, models.Job.attempts == attempt,
+            models.Job.status == models.JobStatus.RUNNING]
+
+
+def heartbeat_job(db: Session, job_id: int, attempt: int,
+                  now: Optional[datetime] = None) -> bool:
+    """
+    Mark a running job as still alive
+    Returns False if the attempt is no longer running (it was requeued).
+    """
+    result = db.execute(
+        update(models.Job)
+        .where(*_owned_job(job_id, attempt))
+        .values(heartbeat_at=now or datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount > 0
+
+
+def finish_job(db: Session, job_id: int, attempt: int, error: Optional[str] = None,
+               retry_at: Optional[datetime] = None) -> bool:
+    """
+    Record the outcome of a job's attempt
+    - No error: done
+    - error with retry_at: queued again for that time
+    - error without retry_at: failed for good
+    - Nothing is recorded if the attempt is no longer running (it was
+      requeued, and may be running again elsewhere); returns False then
+    """
+    if error is None:
+        values = {"status": models.JobStatus.DONE, "finished_at": datetime.utcnow()}
+    elif retry_at is not None:
+        values = {"status": models.JobStatus.QUEUED, "run_at": retry_at, "last_error": error}
+    else:
+        values = {"status": models.JobStatus.FAILED, "finished_at": datetime.utcnow(),
+                  "last_error": error}
+    result = db.execute(
+        update(models.Job)
+        .where(*_owned_job(job_id, attempt))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount > 0
+
+
+def requeue_stale_jobs(db: Session, alive_before: datetime) -> int:
+    """
+    Queue again the running jobs without a heartbeat since a time
+    (their worker died, e.g. the server was killed mid-job)
+    Returns how many were requeued.
+    """
+    result = db.execute(
+        update(models.Job)
+        .where(models.Job.status == models.JobStatus.RUNNING,
+               models.Job.heartbeat_at < alive_before)
+        .values(status=models.JobStatus.QUEUED, run_at=datetime.utcnow(),
+                last_error="Worker stopped while running the job")
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def prune_jobs(db: Session, due_before: datetime) -> int:
+    """
+    Delete finished (done or failed) jobs that were due before a time
+    Returns how many were deleted.
+    """
+    result = db.execute(
+        delete(models.Job)
+        .where(models.Job.status.in_([models.JobStatus.DONE, models.JobStatus.FAILED]),
+               models.Job.run_at < due_before)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def count_jobs(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Queue depth: jobs queued (due now or later), due now, and running
+    Each count is a range of the (status, run_at) index.
+    """
+    now = now or datetime.utcnow()
+
+    def count(*conditions):
+        return select(func.count()).select_from(models.Job).where(*conditions).scalar_subquery()
+
+    queued, due, running = db.execute(select(
+        count(models.Job.status == models.JobStatus.QUEUED),
+        count(models.Job.status == models.JobStatus.QUEUED, models.Job.run_at <= now),
+        count(models.Job.status == models.JobStatus.RUNNING),
+    )).one()
+    return {"queued": queued, "due": due, "running": running}
+
+
+def _move_rows(db: Session, model, archive_model, condition, now: datetime):
+    """
+    Copy the rows of a table matching a condition into its archive table
+    (INSERT ... SELECT), then delete them
+    """
+    names = [column.name for column in model.__table__.columns]
+    db.execute(insert(archive_model.__table__).from_select(
+        names + ["archived_at"],
+        select(*model.__table__.columns, literal(now, DateTime)).where(condition)))
+    db.execute(delete(model).where(condition).execution_options(synchronize_session=False))
+
+
+def archive_batch(db: Session, model, archive_model, entity: str,
+                  conditions: list, limit: int) -> List[int]:
+    """
+    Move one batch of rows into the archive, in one transaction
+    - The attendance rows of the archived users / events move to
+      attendance_archive first (nothing else removes them: SQLite
+      doesn't enforce the foreign keys)
+    - The counter tables and search index follow through the delete
+      triggers; tombstones tell /sync clients the rows are gone
+    Returns the IDs of the archived rows (fewer than limit when done).
+    """
+    # Any matching rows will do (every batch removes its own), so there's
+    # no ORDER BY for the database to sort by
+    ids = db.scalars(select(model.id).where(*conditions).limit(limit)).all()
+    if not ids:
+        return []
+    now = datetime.utcnow()
+    attendance_column = (models.Attendance.user_id if model is models.User
+                         else models.Attendance.event_id)
+    _move_rows(db, models.Attendance, models.ArchivedAttendance,
+               attendance_column.in_(ids), now)
+    _move_rows(db, model, archive_model, model.id.in_(ids), now)
+    record_deletions(db, entity, ids)
+    db.commit()
+    return ids
+
+
+def archive_users(db: Session, inactive_before: datetime, limit: int = 500) -> List[int]:
+    """
+    Archive a batch of inactive users not updated since a time
+    """
+    return archive_batch(
+        db, models.User, models.ArchivedUser, "user",
+        [models.User.is_active.is_(False), models.User.updated_at < inactive_before],
+        limit)
+
+
+def archive_events(db: Session, before: datetime, limit: int = 500) -> List[int]:
+    """
+    Archive a batch of one-off events that took place before a time
+    Recurring events stay, along with their changed occurrences.
     """
-    return db.query(models.Event).offset(skip).limit(limit).all()
+    return archive_batch(
+        db, models.Event, models.ArchivedEvent, "event",
+        [IS_ONE_OFF, models.Event.event_date < before],
+        limit)
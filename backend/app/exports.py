@@ -0,0 +1,91 @@
+"""
+Streaming Exports for the Church App
+This file turns database queries into NDJSON or CSV streams.
+Rows are fetched in chunks through a server-side cursor and written out as
+they arrive, so memory use stays flat no matter how big the table is.
+"""
+
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime
+from typing import Callable, Iterator, List
+
+from sqlalchemy.orm import Query, Session
+
+from . import models, schemas
+from .database import SessionLocal
+from .serialization import schema_columns
+
+# Supported export formats and their content types
+CSV = "csv"
+NDJSON = "ndjson"
+MEDIA_TYPES = {CSV: "text/csv", NDJSON: "application/x-ndjson"}
+
+# Rows fetched from the database per round trip
+EXPORT_BATCH_SIZE = 1000
+
+# Only the fields of the public response schemas are exported
+# (never hashed_password)
+USER_EXPORT_COLUMNS = schema_columns(models.User, schemas.User)
+# Exports hold the stored rows, so fields that only expanded occurrences
+# of recurring events have are left out
+EVENT_EXPORT_COLUMNS = [column for column in schema_columns(models.Event, schemas.Event)
+                        if column.key in models.Event.__table__.columns]
+
+
+def _export_value(value):
+    """Convert a column value into something JSON/CSV can hold"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _ndjson_lines(rows, names: List[str]) -> Iterator[str]:
+    """Write each row as one JSON object per line"""
+    for row in rows:
+        yield json.dumps(
+            {name: _export_value(value) for name, value in zip(names, row)}
+        ) + "\n"
+
+
+def _csv_chunks(rows, names: List[str]) -> Iterator[str]:
+    """Write the rows as CSV, a chunk of lines at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_export_value(value) for value in row])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_export(
+    build_query: Callable[[Session], Query],
+    columns: list,
+    fmt: str
+) -> Iterator[str]:
+    """
+    Stream the rows of a query as NDJSON or CSV
+    - build_query gets a session and returns the query to export
+    - Only the given columns are selected, so no ORM objects are built
+    The generator opens and closes its own session, because it keeps
+    running after the endpoint has returned its response.
+    """
+    names = [column.key for column in columns]
+    db = SessionLocal()
+    try:
+        rows = build_query(db).with_entities(*columns).yield_per(
+            EXPORT_BATCH_SIZE)
+        if fmt == CSV:
+            yield from _csv_chunks(rows, names)
+        else:
+            yield from _ndjson_lines(rows, names)
+    finally:
+        db.close()
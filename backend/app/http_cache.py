@@ -0,0 +1,147 @@
+"""
+HTTP Caching for the Church App list endpoints
+This file implements conditional GET (ETag / If-None-Match with 304 replies)
+and an in-process cache of serialized list responses.
+
+Each list response is tied to a version of its table: the time it last
+changed (latest updated_at, or latest deletion from the tombstones) plus
+the row count. Checking that version is one small indexed query, so
+unchanged lists are answered without running the list query or
+serializing anything. Write endpoints also clear the cache for their table
+right away.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+from . import db_utils
+from .database import DbSession, run_db
+from .serialization import render_list
+
+# Maximum number of list responses kept in memory
+MAX_CACHED_RESPONSES = 512
+
+
+class CachedResponse(NamedTuple):
+    """A serialized list response and the table version it was built from"""
+    etag: str
+    body: bytes
+    headers: Dict[str, str]
+
+
+class ResponseCache:
+    """
+    Least-recently-used cache of serialized responses, grouped by table
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_RESPONSES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, table: str, key: str) -> Optional[CachedResponse]:
+        """Get a cached response, or None"""
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is not None:
+                self._entries.move_to_end((table, key))
+            return entry
+
+    def put(self, table: str, key: str, entry: CachedResponse):
+        """Store a response, dropping the least recently used one if full"""
+        with self._lock:
+            self._entries[(table, key)] = entry
+            self._entries.move_to_end((table, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: str):
+        """Forget every cached response for a table"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == table]:
+                del self._entries[key]
+
+
+# Shared cache used by the list endpoints
+response_cache = ResponseCache()
+
+
+def make_etag(table: str, version: str, key: str) -> str:
+    """
+    Build an ETag from the table version and the query parameters
+    """
+    digest = hashlib.sha1(f"{table}|{version}|{key}".encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Check the request's conditional headers
+    If-None-Match wins over If-Modified-Since (RFC 9110). Pass
+    last_modified=None when the response can change without it moving.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or etag[2:] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+async def cached_list_response(
+    request: Request,
+    db: DbSession,
+    model,
+    schema: type,
+    fetch_page: Callable[[], Awaitable[Tuple[list, Dict[str, str]]]],
+    variant: str = ""
+) -> Response:
+    """
+    Answer a list request using the HTTP validators and the response cache
+    - Replies 304 if the client's copy is still current
+    - Serves the cached body if nothing changed since it was built
+    - Otherwise calls fetch_page() for (items, extra headers) and caches it
+    - variant is anything else the response depends on (like the
+      recurrence horizon), and is part of the version
+    """
+    table = model.__tablename__
+    last_modified, count = await run_db(db, db_utils.get_table_version, model)
+    version = f"{last_modified.isoformat() if last_modified else ''}:{count}:{variant}"
+    key = str(sorted(request.query_params.multi_items()))
+    etag = make_etag(table, version, key)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    # A variant (like the recurrence horizon) can change without
+    # Last-Modified moving, so only the ETag validates those responses
+    if is_not_modified(request, etag, None if variant else last_modified):
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(table, key)
+    if cached is None or cached.etag != etag:
+        items, extra_headers = await fetch_page()
+        cached = CachedResponse(etag, render_list(schema, items), extra_headers)
+        response_cache.put(table, key, cached)
+
+    return Response(
+        content=cached.body,
+        media_type="application/json",
+        headers={**cached.headers, **headers}
+    )
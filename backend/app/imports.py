@@ -0,0 +1,113 @@
+"""
+Bulk Import File Parsing for the Church App
+This file reads uploaded CSV and NDJSON member lists one row at a time,
+so large files can be imported without loading them into memory.
+"""
+
+import codecs
+import csv
+import json
+from typing import IO, BinaryIO, Iterator, NamedTuple, Optional
+
+# Supported upload formats
+CSV = "csv"
+NDJSON = "ndjson"
+
+# Bytes read at a time when checking an upload's encoding
+CHUNK_SIZE = 64 * 1024
+
+# How each format can be recognised from the file name or content type
+FORMAT_EXTENSIONS = {".csv": CSV, ".ndjson": NDJSON, ".jsonl": NDJSON}
+FORMAT_CONTENT_TYPES = {
+    "text/csv": CSV,
+    "application/csv": CSV,
+    "application/x-ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+}
+
+
+class ImportRow(NamedTuple):
+    """One row read from an upload, or the reason it couldn't be read"""
+    line: int
+    data: Optional[dict] = None
+    error: Optional[str] = None
+
+
+def detect_format(
+    requested: Optional[str],
+    filename: Optional[str],
+    content_type: Optional[str]
+) -> Optional[str]:
+    """
+    Work out the upload format
+    An explicit format wins, then the file extension, then the content type
+    """
+    if requested:
+        requested = requested.lower()
+        return requested if requested in (CSV, NDJSON) else None
+    if filename:
+        for extension, fmt in FORMAT_EXTENSIONS.items():
+            if filename.lower().endswith(extension):
+                return fmt
+    if content_type:
+        return FORMAT_CONTENT_TYPES.get(content_type.split(";")[0].strip())
+    return None
+
+
+def is_utf8(file: BinaryIO) -> bool:
+    """
+    Check that a whole upload decodes as UTF-8, reading it in chunks
+    The file is rewound afterwards, ready to be parsed.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
+    finally:
+        file.seek(0)
+
+
+def iter_csv_rows(stream: IO[str]) -> Iterator[ImportRow]:
+    """
+    Read rows from a CSV file with a header line
+    Empty cells are treated as missing values
+    """
+    reader = csv.DictReader(stream)
+    for record in reader:
+        data = {
+            key.strip(): (value if value != "" else None)
+            for key, value in record.items()
+            if key is not None
+        }
+        yield ImportRow(line=reader.line_num, data=data)
+
+
+def iter_ndjson_rows(stream: IO[str]) -> Iterator[ImportRow]:
+    """
+    Read rows from a newline-delimited JSON file (one object per line)
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield ImportRow(line=line_number, error="Invalid JSON")
+            continue
+        if not isinstance(data, dict):
+            yield ImportRow(line=line_number, error="Expected a JSON object")
+            continue
+        yield ImportRow(line=line_number, data=data)
+
+
+def iter_rows(stream: IO[str], fmt: str) -> Iterator[ImportRow]:
+    """
+    Read rows from an upload in the given format
+    """
+    if fmt == CSV:
+        return iter_csv_rows(stream)
+    return iter_ndjson_rows(stream)
@@ -0,0 +1,271 @@
+"""
+Background Jobs for the Church App
+This file runs slow work (like sending an event announcement to every
+member) outside of the request that asked for it.
+
+Endpoints only add a row to the jobs table (db_utils.enqueue_job) and
+return. A pool of JOB_WORKERS threads takes due jobs from the table and
+runs the handler registered for their kind. A job that raises is queued
+again with exponential backoff until it runs out of attempts, then marked
+failed with its last error. Because the queue lives in the database, jobs
+survive restarts, and several server processes can share one queue: a job
+is claimed with a single UPDATE, so it only runs once.
+
+While a job runs, its worker bumps the job's heartbeat every
+JOB_HEARTBEAT_INTERVAL seconds. Only jobs without a heartbeat for
+JOB_TIMEOUT seconds are queued again, so long jobs aren't run twice. An
+attempt that was queued again anyway (e.g. its worker stalled) can't
+record its outcome over the next one's.
+
+Handlers are registered with the handler decorator and get a database
+session and the job's payload:
+
+    @jobs.handler("announce_event")
+    def announce_event(db: Session, payload: dict):
+        ...
+
+A kind can also register an after function, called with a session once a
+job has finished for good (done, or failed on its last attempt), e.g. to
+schedule its next run whatever the outcome.
+"""
+
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import db_utils, metrics
+from .database import SessionLocal
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Jobs run at the same time in this process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Longest time (seconds) an idle worker waits before checking for due jobs
+# (jobs added by this process wake a worker right away)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# Delay before the first retry; doubles with every failed attempt
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "10"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "3600"))
+# A running job without a heartbeat for this many seconds is taken to have
+# lost its worker and is queued again
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "600"))
+# Seconds between heartbeats of a running job (well below JOB_TIMEOUT)
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "60"))
+# Days finished jobs are kept before they're deleted
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+# Seconds between checks for stuck and old jobs
+MAINTENANCE_INTERVAL = 60.0
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> function(db, payload)
+Handler = Callable[[Session, dict], None]
+HANDLERS: Dict[str, Handler] = {}
+# Job kind -> function(db) run once a job has finished for good
+AFTER: Dict[str, Callable[[Session], None]] = {}
+
+
+def handler(kind: str, after: Optional[Callable[[Session], None]] = None
+            ) -> Callable[[Handler], Handler]:
+    """
+    Register the function that runs jobs of a kind
+    - after runs once each job has finished for good, done or failed
+    """
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        if after is not None:
+            AFTER[kind] = after
+        return fn
+    return register
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds to wait before the next attempt: exponential backoff with up
+    to 10% jitter, so jobs that failed together don't retry together
+    """
+    delay = min(JOB_RETRY_DELAY * 2 ** (attempts - 1), JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(1.0, 1.1)
+
+
+class JobPool:
+    """
+    Worker threads taking jobs from the jobs table
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        session_factory: sessionmaker = SessionLocal
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._last_maintenance = 0.0
+        self.heartbeat_interval = JOB_HEARTBEAT_INTERVAL
+
+    def start(self):
+        """Start the workers (once)"""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"job-worker-{number}", daemon=True)
+                for number in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        # Let running jobs finish when the process exits
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the workers once their current jobs are done"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if threads:
+            self._stopping.set()
+            self._wake.set()
+            for thread in threads:
+                thread.join()
+
+    def wake(self):
+        """
+        Start the workers if needed and have one check for jobs now
+        (called after adding jobs, so they don't wait for the next poll)
+        """
+        self.start()
+        self._wake.set()
+
+    def run_next(self) -> bool:
+        """
+        Claim and run one due job
+        Returns False if there was none.
+        """
+        db = self.session_factory()
+        try:
+            job = db_utils.claim_job(db)
+        finally:
+            db.close()
+        if job is None:
+            return False
+        self.run_job(job)
+        return True
+
+    def run_job(self, job):
+        """
+        Run a claimed job with its handler and record the outcome
+        """
+        started = time.perf_counter()
+        error = None
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done),
+                                     name=f"job-heartbeat-{job.id}", daemon=True)
+        heartbeat.start()
+        db = self.session_factory()
+        try:
+            run = HANDLERS.get(job.kind)
+            if run is None:
+                raise LookupError(f"No handler for job kind {job.kind!r}")
+            run(db, job.payload)
+        except Exception as exc:
+            db.rollback()
+            error = f"{type(exc).__name__}: {exc}"
+            logger.exception("Job %d (%s) failed on attempt %d", job.id, job.kind, job.attempts)
+        finally:
+            db.close()
+            done.set()
+            heartbeat.join()
+        seconds = time.perf_counter() - started
+
+        retry_at = None
+        if error is None:
+            outcome = "done"
+        elif job.attempts < job.max_attempts and job.kind in HANDLERS:
+            outcome = "retried"
+            retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+        else:
+            outcome = "failed"
+        db = self.session_factory()
+        try:
+            owned = db_utils.finish_job(db, job.id, job.attempts, error, retry_at)
+        finally:
+            db.close()
+        if not owned:
+            logger.warning("Job %d (%s) was queued again while attempt %d ran; "
+                           "its outcome isn't recorded", job.id, job.kind, job.attempts)
+            return
+        if outcome != "retried" and job.kind in AFTER:
+            db = self.session_factory()
+            try:
+                AFTER[job.kind](db)
+            except Exception:
+                logger.exception("After job %d (%s) failed", job.id, job.kind)
+            finally:
+                db.close()
+
+        # Wait is measured from when the job was due, so retry backoff
+        # doesn't count as waiting
+        wait = (job.started_at - job.run_at).total_seconds()
+        metrics.registry.job_finished(job.kind, outcome, wait, seconds)
+
+    def _heartbeat(self, job, done: threading.Event):
+        """Bump a running job's heartbeat until it's done"""
+        while not done.wait(self.heartbeat_interval):
+            db = self.session_factory()
+            try:
+                if not db_utils.heartbeat_job(db, job.id, job.attempts):
+                    return
+            except Exception:
+                logger.exception("Heartbeat of job %d (%s) failed", job.id, job.kind)
+            finally:
+                db.close()
+
+    def maintain(self):
+        """
+        Queue again the jobs whose worker died, and delete old finished ones
+        """
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            requeued = db_utils.requeue_stale_jobs(db, now - timedelta(seconds=JOB_TIMEOUT))
+            if requeued:
+                logger.warning("Requeued %d jobs that stopped running", requeued)
+            db_utils.prune_jobs(db, now - timedelta(days=JOB_RETENTION_DAYS))
+        finally:
+            db.close()
+
+    def _run(self):
+        """Worker: run due jobs until there are none, then wait"""
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() - self._last_maintenance >= MAINTENANCE_INTERVAL:
+                    self._last_maintenance = time.monotonic()
+                    self.maintain()
+                if self.run_next():
+                    continue
+            except Exception:
+                logger.exception("Job worker error")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+
+# Shared pool used by the app
+pool = JobPool()
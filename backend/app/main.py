@@ -4,17 +4,31 @@ This file defines the FastAPI application and all API endpoints.
 It handles HTTP requests and responses, and coordinates with the database.
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, File, Header, HTTPException, Query, Request, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from typing import List, Literal, Optional
+from datetime import date, datetime
+from functools import partial
+import io
 
-from . import models, schemas
-from .database import engine, get_db
+from . import archive, attendance, auth, changes, db_utils, exports, imports, jobs, metrics, models, recurrence, schemas, serialization
+from . import notifications  # noqa: F401 (registers its background job handlers)
+from .cache import count_caches, entity_cache, event_key, user_key
+from .changes import events_changed, users_changed
+from .http_cache import cached_list_response
+from .pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, decode_cursor, encode_cursor, nullable
+from .database import DbSession, SessionLocal, engine, get_db, get_session, run_db
 
 # Create FastAPI application
-app = FastAPI(title="Church App API")
+# With FAST_JSON on, responses are encoded with orjson
+app = FastAPI(
+    title="Church App API",
+    default_response_class=serialization.default_response_class()
+)
 
 # Configure CORS (Cross-Origin Resource Sharing)
 # This allows Flutter app to communicate with the backend
@@ -25,8 +39,117 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser clients read our pagination and caching headers
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, "ETag", "Last-Modified"],
 )
 
+# Measure every request: latency, status codes and SQL queries per route
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.on_event("startup")
+def start_attendance_writer():
+    """Start writing buffered RSVPs / check-ins in the background"""
+    attendance.buffer.start()
+
+
+@app.on_event("startup")
+def start_job_workers():
+    """Start running background jobs (see jobs.py)"""
+    jobs.pool.start()
+
+
+@app.on_event("startup")
+def schedule_archiving():
+    """Queue an archive run unless one is waiting (see archive.py)"""
+    db = SessionLocal()
+    try:
+        archive.schedule(db)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+def stop_attendance_writer():
+    """Write the buffered RSVPs / check-ins that are still waiting"""
+    attendance.buffer.stop()
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    """Let running background jobs finish"""
+    jobs.pool.stop()
+
+
+# Event fields always returned with fields=, as the cursor is built from them
+EVENT_KEY_FIELDS = ("id", "event_date")
+
+
+def email_taken() -> HTTPException:
+    """
+    Error for a create/update that hits the unique email index
+    """
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Email already registered"
+    )
+
+
+async def total_count(db: DbSession, table: str, count, variant: str = "", **filters) -> int:
+    """
+    Number of rows matching a list's filters, from the count cache if possible
+    count is the db_utils function that counts them; variant is anything
+    else the count depends on (see cached_list_response)
+    """
+    cache = count_caches[table]
+    key = str(sorted((name, str(value)) for name, value in filters.items())) + variant
+    total = cache.get(key)
+    if total is None:
+        # A write during the count clears the cache; the token makes sure
+        # the (possibly old) total isn't stored after that
+        token = cache.token(key)
+        total = str(await run_db(db, count, **filters))
+        cache.set(key, total, token)
+    return int(total)
+
+
+async def cached_entity(key: str, schema: type, load,
+                        projection: Optional[type] = None) -> Optional[Response]:
+    """
+    Get an entity as a JSON response, from the entity cache if possible
+    load() is only awaited on a cache miss; returns None if it finds nothing
+    projection (from serialization.fields_schema) trims the cached body
+    down to the requested fields
+    """
+    body = entity_cache.get(key)
+    if body is None:
+        # Taken before loading, so a copy loaded before a write that
+        # invalidates the key isn't stored after it
+        token = entity_cache.token(key)
+        db_object = await load()
+        if db_object is None:
+            return None
+        body = schema.model_validate(db_object).model_dump_json()
+        entity_cache.set(key, body, token)
+    if projection is not None:
+        body = projection.model_validate_json(body).model_dump_json()
+    return Response(content=body, media_type="application/json")
+
+
+async def archived_entity(schema: type, load,
+                          projection: Optional[type] = None) -> Optional[Response]:
+    """
+    Get an archived entity as a JSON response, like cached_entity
+    Not cached: the entity cache keys belong to the live rows.
+    """
+    db_object = await load()
+    if db_object is None:
+        return None
+    body = schema.model_validate(db_object).model_dump_json()
+    if projection is not None:
+        body = projection.model_validate_json(body).model_dump_json()
+    return Response(content=body, media_type="application/json")
+
 
 @app.get("/")
 async def root():
@@ -41,163 +164,776 @@ async def health_check():
     """
     Health check endpoint
     Used to verify that the API is running
+    Also reports the entity cache hit/miss counters
+    """
+    return {
+        "status": "healthy",
+        "entity_cache": entity_cache.stats(),
+        "change_stream": changes.broker.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics(db: DbSession = Depends(get_session)):
+    """
+    Metrics in the Prometheus text format
+    - Request latency histograms, response counts by status, requests in flight
+    - SQL queries and SQL time per request, likely N+1 query patterns
+    - Background job queue depth, wait and run times, outcomes
+    """
+    job_queue = await run_db(db, db_utils.count_jobs)
+    return PlainTextResponse(
+        metrics.registry.render(job_queue),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/changes")
+async def stream_changes(
+    entities: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Live change notices as Server-Sent Events
+    - Each notice has entity ("user" or "event"), id, op ("created",
+      "updated", "deleted", "imported") and updated_at; read the entity
+      itself from its endpoint if needed
+    - entities limits the stream, e.g. entities=event
+    - A "resync" notice means some notices were missed (the client fell
+      behind or reconnected); reload the lists instead
+    """
+    selected = None
+    if entities:
+        selected = {name.strip() for name in entities.split(",") if name.strip()}
+        if not selected <= {"user", "event"}:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="entities must be user, event or both"
+            )
+    return StreamingResponse(
+        changes.stream(changes.broker, selected, last_event_id),
+        media_type="text/event-stream",
+        # Don't let proxies cache or buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/sync", response_model=schemas.SyncResult)
+async def sync(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    db: DbSession = Depends(get_session)
+):
+    """
+    Users and events changed since the last sync, for offline clients
+    - Without since, returns everything (the first sync)
+    - Pass the returned token as since= next time to get only what was
+      created, updated or deleted after it
+    - Up to limit users, events and deletions per call; if has_more is
+      true, sync again with the new token right away
+    - Drop a local copy listed in deleted unless its updated_at is later
+      than deleted_at (IDs of deleted users can be reused)
+    """
+    position = None
+    if since is not None:
+        position = db_utils.SyncPosition(*decode_cursor(
+            since, nullable(datetime.fromisoformat), nullable(int),
+            nullable(datetime.fromisoformat), nullable(int), int))
+    changes, position = await run_db(db, db_utils.get_changes, position, limit)
+    return {**changes, "token": encode_cursor(*position)}
+
+
+# Authentication Endpoints
+@app.post("/auth/login", response_model=schemas.Token)
+async def login(credentials: schemas.LoginRequest, db: DbSession = Depends(get_session)):
+    """
+    Sign in with email and password
+    - Looks up the user by their (indexed) email
+    - Checks the password against its bcrypt hash (off the event loop),
+      upgrading the stored hash if it's outdated
+    - Returns a signed access token plus the user's profile
+    """
+    db_user = await run_db(db, db_utils.get_user_by_email, credentials.email)
+    # An unknown email still costs a hash check, so it can't be told
+    # apart from a wrong password by timing
+    stored_password = db_user.hashed_password if db_user is not None else None
+    if not await run_in_threadpool(
+            auth.verify_password, credentials.password, stored_password):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not db_user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Inactive user"
+        )
+    if auth.needs_rehash(stored_password):
+        hashed_password = await run_in_threadpool(auth.hash_password, credentials.password)
+        await run_db(db, db_utils.set_password_hash, db_user.id, hashed_password)
+
+    return {
+        "access_token": auth.create_access_token(db_user),
+        "token_type": "bearer",
+        "user": db_user,
+    }
+
+
+@app.post("/auth/refresh", response_model=schemas.Token)
+async def refresh_token(
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
+):
     """
-    return {"status": "healthy"}
+    Swap a still valid access token for a new one
+    - Lets the app stay signed in past ACCESS_TOKEN_EXPIRE_MINUTES
+      without asking for the password again
+    - The user is checked like on any request, so deactivated or deleted
+      users can't refresh
+    """
+    db_user = await run_db(db, db_utils.get_user_by_id, current_user.user_id)
+    if db_user is None:
+        raise auth.invalid_token()
+    return {
+        "access_token": auth.create_access_token(db_user),
+        "token_type": "bearer",
+        "user": db_user,
+    }
+
+
+@app.get("/auth/me", response_model=schemas.TokenData)
+async def read_current_user(
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
+):
+    """
+    Get the signed-in user's ID, email and role
+    - As currently stored, even if they changed since the token was issued
+    """
+    return current_user
 
 
 # User Management Endpoints
 @app.post("/users/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: DbSession = Depends(get_session)):
     """
     Create a new user
     - Validates the user data
-    - Checks if email is already registered
     - Creates new user in database
+    - Rejects emails that are already registered
+    """
+    # Hashing is slow on purpose, so it runs off the event loop
+    hashed_password = await run_in_threadpool(auth.hash_password, user.password)
+    # The unique index on email catches duplicates as part of the insert
+    try:
+        db_user = await run_db(db, db_utils.create_user, user, hashed_password)
+    except IntegrityError:
+        raise email_taken()
+    users_changed("created", db_user.id, updated_at=db_user.updated_at)
+    return db_user
+
+
+@app.post("/users/import", response_model=schemas.ImportReport)
+def import_users(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: schemas.TokenData = Depends(auth.require_admin)
+):
     """
-    # Check if user with this email already exists
-    db_user = db.query(models.User).filter(
-        models.User.email == user.email).first()
-    if db_user:
+    Import many users from a CSV or NDJSON upload
+    - Requires an admin access token
+    - CSV files need a header line with the same fields as creating a user
+    - The format is taken from the format parameter ("csv" or "ndjson"),
+      the file extension or the content type
+    - The file is read row by row and inserted in batches
+    - The encoding is checked before anything is inserted, so a file
+      that isn't UTF-8 is rejected as a whole
+    - Returns how many users were imported and why any rows were rejected
+    """
+    # This is a sync endpoint on purpose: validating thousands of rows is
+    # CPU work that belongs in the threadpool, not on the event loop
+    fmt = imports.detect_format(format, file.filename, file.content_type)
+    if fmt is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
+            detail="Unknown file format, use CSV or NDJSON"
         )
 
-    # Create new user
-    # TODO: Add password hashing for security
-    db_user = models.User(
-        email=user.email,
-        first_name=user.first_name,
-        last_name=user.last_name,
-        phone_number=user.phone_number,
-        address=user.address,
-        address2=user.address2,
-        city=user.city,
-        state=user.state,
-        role=user.role,
-        date_of_birth=user.date_of_birth,
-        hashed_password=user.password  # This should be hashed in production
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    # Checked up front: a decoding error halfway through would come after
+    # earlier batches were committed
+    if not imports.is_utf8(file.file):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be UTF-8 encoded"
+        )
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        return db_utils.import_users(db, imports.iter_rows(stream, fmt))
+    finally:
+        stream.detach()
+        # Batches are committed one by one, so some may be stored even if
+        # a later one failed
+        users_changed("imported")
+
+
+@app.post("/users/bulk-update", response_model=schemas.BulkResult)
+async def bulk_update_users(
+    request: schemas.BulkUserUpdate,
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.require_admin)
+):
+    """
+    Update many users at once (e.g. deactivate a graduating class)
+    - Requires an admin access token
+    - Pick users with ids or with a filter (role, is_active, city, state)
+    - changes holds the fields to set, like PUT /users/{user_id}
+      (except email, which must stay unique)
+    - Runs as a single UPDATE statement; returns how many users changed
+    """
+    user_ids = await run_db(
+        db, db_utils.bulk_update_users, request, request.changes)
+    if user_ids:
+        users_changed("updated", *user_ids)
+    return {"affected": len(user_ids)}
+
+
+@app.post("/users/bulk-delete", response_model=schemas.BulkResult)
+async def bulk_delete_users(
+    request: schemas.UserSelection,
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.require_admin)
+):
+    """
+    Delete many users at once (e.g. purge guest accounts)
+    - Requires an admin access token
+    - Pick users with ids or with a filter (role, is_active, city, state)
+    - Runs as a single DELETE statement; returns how many users were removed
+    - Their RSVPs and check-ins are removed with them
+    """
+    user_ids = await run_db(db, db_utils.bulk_delete_users, request)
+    if user_ids:
+        attendance.buffer.forget_users(user_ids)
+        users_changed("deleted", *user_ids)
+    return {"affected": len(user_ids)}
 
 
 @app.get("/users/", response_model=List[schemas.User])
-def read_users(
+async def read_users(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     role: models.UserRole = None,
     is_active: bool = None,
     city: str = None,
     state: str = None,
-    db: Session = Depends(get_db)
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+    db: DbSession = Depends(get_session)
 ):
     """
     Get list of users
     - Supports pagination with skip and limit
+    - Pass cursor (empty for the first page) to use keyset pagination;
+      the cursor for the next page is returned in the X-Next-Cursor header
     - Can filter by role, active status, city, and state
+    - q searches names, city and state (every word must match)
+    - The number of users matching the filters is returned in the
+      X-Total-Count header
+    - fields (e.g. fields=first_name,last_name) returns only those fields
+      (plus id), and only those columns are read from the database
+    - include_archived=true also lists archived members (see archive.py)
+    - Supports conditional requests (If-None-Match / If-Modified-Since)
     - Returns list of users
     """
-    query = db.query(models.User)
+    after = decode_cursor(cursor, int) if cursor is not None else None
+    schema = serialization.fields_schema(schemas.User, fields) or schemas.User
+    # Plain rows instead of User objects when FAST_JSON is on or only
+    # some fields were asked for
+    columns = (serialization.schema_columns(models.User, schema) if fields
+               else serialization.list_columns(models.User, schema))
+    filters = dict(role=role, is_active=is_active, city=city, state=state, q=q,
+                   include_archived=include_archived)
+
+    async def fetch_page():
+        headers = {TOTAL_COUNT_HEADER: str(await total_count(
+            db, "users", db_utils.count_users, **filters))}
+        if cursor is None:
+            users = await run_db(
+                db, db_utils.get_users, skip=skip, limit=limit,
+                columns=columns, **filters)
+            return users, headers
 
-    # Apply filters if provided
-    if role is not None:
-        query = query.filter(models.User.role == role)
-    if is_active is not None:
-        query = query.filter(models.User.is_active == is_active)
-    if city is not None:
-        query = query.filter(models.User.city.ilike(f"%{city}%"))
-    if state is not None:
-        query = query.filter(models.User.state.ilike(f"%{state}%"))
+        users = await run_db(
+            db, db_utils.get_users, limit=limit,
+            after_id=after[0] if after else 0, columns=columns, **filters)
+        if len(users) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(users[-1].id)
+        return users, headers
 
-    # Apply pagination
-    users = query.offset(skip).limit(limit).all()
-    return users
+    return await cached_list_response(
+        request, db, models.User, schema, fetch_page)
+
+
+@app.get("/users/celebrations", response_model=List[schemas.Celebration])
+async def read_celebrations(
+    days: int = Query(7, ge=1, le=366),
+    date_from: Optional[date] = Query(None, alias="from"),
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.require_admin)
+):
+    """
+    Get the birthdays and membership anniversaries coming up
+    - Requires an admin access token
+    - Covers the next days days, starting today (or on the "from" date),
+      including across the end of the year
+    - Only active members are listed, soonest first
+    """
+    return await run_db(
+        db, db_utils.get_celebrations, date_from or datetime.utcnow().date(), days)
+
+
+@app.get("/users/export")
+def export_users(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    role: models.UserRole = None,
+    is_active: bool = None,
+    city: str = None,
+    state: str = None,
+    q: Optional[str] = None,
+    current_user: schemas.TokenData = Depends(auth.require_admin)
+):
+    """
+    Export the member directory as NDJSON or CSV
+    - Requires an admin access token
+    - Accepts the same filters as the user list
+    - Rows are streamed, so any size of directory can be exported
+    """
+    rows = exports.stream_export(
+        partial(db_utils.filter_users, role=role, is_active=is_active,
+                city=city, state=state, q=q),
+        exports.USER_EXPORT_COLUMNS, format)
+    return StreamingResponse(
+        rows,
+        media_type=exports.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
 
 
 @app.get("/users/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(get_db)):
+async def read_user(
+    user_id: int,
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+    db: DbSession = Depends(get_session)
+):
     """
     Get a specific user by ID
+    - Served from the entity cache when possible
+    - fields returns only those fields (plus id), like the user list
+    - include_archived=true also looks in the archive
     """
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if db_user is None:
+    projection = serialization.fields_schema(schemas.User, fields)
+    response = await cached_entity(
+        user_key(user_id), schemas.User,
+        lambda: run_db(db, db_utils.get_user_by_id, user_id), projection)
+    if response is None and include_archived:
+        response = await archived_entity(
+            schemas.User, lambda: run_db(db, db_utils.get_archived_user, user_id), projection)
+    if response is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return db_user
+    return response
 
 
 @app.put("/users/{user_id}", response_model=schemas.User)
-def update_user(
+async def update_user(
     user_id: int,
     user_update: schemas.UserUpdate,
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
 ):
     """
     Update a user's information
+    - Requires an access token for the same user or an admin
     - Only updates provided fields
     - Validates all updates
     """
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    auth.ensure_can_manage_user(current_user, user_id)
+    try:
+        db_user = await run_db(db, db_utils.update_user, user_id, user_update)
+    except IntegrityError:
+        raise email_taken()
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-
-    # Update only provided fields
-    update_data = user_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_user, field, value)
-
-    db.commit()
-    db.refresh(db_user)
+    users_changed("updated", user_id, updated_at=db_user.updated_at)
     return db_user
 
 
 @app.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
+async def delete_user(
+    user_id: int,
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
+):
     """
     Delete a user
-    - Permanently removes the user from the database
+    - Requires an access token for the same user or an admin
+    - Permanently removes the user from the database, with their RSVPs
+      and check-ins
     """
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if db_user is None:
+    auth.ensure_can_manage_user(current_user, user_id)
+    if not await run_db(db, db_utils.delete_user, user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-
-    db.delete(db_user)
-    db.commit()
+    attendance.buffer.forget_users([user_id])
+    users_changed("deleted", user_id)
     return None
 
 
 # Event Management Endpoints
 @app.post("/events/", response_model=schemas.Event)
-def create_event(event: schemas.EventCreate, db: Session = Depends(get_db)):
+async def create_event(
+    event: schemas.EventCreate,
+    notify: bool = False,
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
+):
     """
     Create a new event
+    - Requires an access token
     - Validates the event data
     - Creates new event in database
+    - Set recurrence_rule (e.g. FREQ=WEEKLY;BYDAY=SU) for a repeating
+      event; it's stored once and listed as separate occurrences
+    - notify=true (admins only) announces the event to every active
+      member; the sending happens in background jobs
     """
-    db_event = models.Event(**event.model_dump())
-    db.add(db_event)
-    db.commit()
-    db.refresh(db_event)
+    if notify and current_user.role != models.UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required to notify members"
+        )
+    db_event = await run_db(db, db_utils.create_event, event, notify)
+    events_changed("created", db_event.id, updated_at=db_event.updated_at)
+    if notify:
+        jobs.pool.wake()
     return db_event
 
 
+@app.get("/events/export")
+def export_events(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: schemas.TokenData = Depends(auth.require_admin)
+):
+    """
+    Export the event calendar as NDJSON or CSV
+    - Requires an admin access token
+    - Rows are streamed, so any number of events can be exported
+    """
+    rows = exports.stream_export(
+        db_utils.filter_events, exports.EVENT_EXPORT_COLUMNS, format)
+    return StreamingResponse(
+        rows,
+        media_type=exports.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="events.{format}"'}
+    )
+
+
+@app.get("/events/upcoming", response_model=List[schemas.Event])
+async def read_upcoming_events(
+    limit: int = Query(5, ge=1, le=100),
+    date_from: Optional[schemas.UtcDatetime] = Query(None, alias="from"),
+    db: DbSession = Depends(get_session)
+):
+    """
+    Get the next few events, soonest first
+    - Starts from the current time, or from the "from" parameter
+    - Only the requested number of events is read from the database
+    """
+    return await run_db(
+        db, db_utils.get_upcoming_events, limit=limit, now=date_from)
+
+
 @app.get("/events/", response_model=List[schemas.Event])
-def read_events(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_events(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    date_from: Optional[schemas.UtcDatetime] = Query(None, alias="from"),
+    date_to: Optional[schemas.UtcDatetime] = Query(None, alias="to"),
+    order: Literal["asc", "desc"] = "asc",
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+    db: DbSession = Depends(get_session)
+):
     """
     Get list of events
+    - Events are ordered by date (order=desc for latest first)
+    - from / to limit the list to events in that window (to is exclusive)
     - Supports pagination with skip and limit
+    - Pass cursor (empty for the first page) to use keyset pagination;
+      the cursor for the next page is returned in the X-Next-Cursor header
+    - The number of events in the window is returned in the
+      X-Total-Count header
+    - fields (e.g. fields=title) returns only those fields (plus id and
+      event_date, the sort key), and only those columns are read
+    - include_archived=true also lists archived (long past) events
+    - Supports conditional requests (ETag / If-None-Match)
     - Returns list of events
     """
-    events = db.query(models.Event).offset(skip).limit(limit).all()
-    return events
+    after = (decode_cursor(cursor, datetime.fromisoformat, int)
+             if cursor is not None else None)
+    schema = serialization.fields_schema(
+        schemas.Event, fields, always=EVENT_KEY_FIELDS) or schemas.Event
+    columns = (serialization.schema_columns(models.Event, schema) if fields
+               else serialization.list_columns(models.Event, schema))
+    window = dict(start=date_from, end=date_to, descending=order == "desc",
+                  columns=columns, include_archived=include_archived)
+    # Recurring events are listed up to a horizon that can move with the
+    # date (open-ended or very long windows), so cached responses and
+    # counts depend on it too
+    horizon = recurrence.horizon(date_to, date_from).isoformat()
+
+    async def fetch_page():
+        headers = {TOTAL_COUNT_HEADER: str(await total_count(
+            db, "events", db_utils.count_events, variant=horizon, start=date_from,
+            end=date_to, include_archived=include_archived))}
+        if cursor is None:
+            events = await run_db(
+                db, db_utils.get_events, skip=skip, limit=limit, **window)
+            return events, headers
+
+        events = await run_db(
+            db, db_utils.get_events, limit=limit, after=after, **window)
+        if len(events) == limit:
+            last = events[-1]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(
+                last.event_date.isoformat(), last.id)
+        return events, headers
+
+    return await cached_list_response(
+        request, db, models.Event, schema, fetch_page, variant=horizon)
+
+
+@app.get("/events/{event_id}", response_model=schemas.Event)
+async def read_event(
+    event_id: int,
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+    db: DbSession = Depends(get_session)
+):
+    """
+    Get a specific event by ID
+    - Served from the entity cache when possible
+    - fields returns only those fields (plus id and event_date), like the
+      event list
+    - include_archived=true also looks in the archive
+    """
+    projection = serialization.fields_schema(schemas.Event, fields, always=EVENT_KEY_FIELDS)
+    response = await cached_entity(
+        event_key(event_id), schemas.Event,
+        lambda: run_db(db, db_utils.get_event_by_id, event_id), projection)
+    if response is None and include_archived:
+        response = await archived_entity(
+            schemas.Event, lambda: run_db(db, db_utils.get_archived_event, event_id), projection)
+    if response is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    return response
+
+
+def occurrence_not_found() -> HTTPException:
+    """
+    Error for an occurrence that isn't part of a recurring event
+    """
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Occurrence not found"
+    )
+
+
+@app.put("/events/{event_id}/occurrences/{occurrence_date}", response_model=schemas.Event)
+async def update_occurrence(
+    event_id: int,
+    occurrence_date: datetime,
+    changes: schemas.EventOccurrenceUpdate,
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
+):
+    """
+    Change one occurrence of a recurring event
+    - Requires an access token
+    - occurrence_date is the date the rule gives the occurrence (the
+      occurrence_date field in event lists)
+    - Only the provided fields change, and only for this occurrence
+    """
+    occurrence_date = schemas.naive_utc(occurrence_date)
+    series = await run_db(db, db_utils.get_occurrence_series, event_id, occurrence_date)
+    if series is None:
+        raise occurrence_not_found()
+    occurrence = await run_db(db, db_utils.save_occurrence, series, occurrence_date, changes)
+    events_changed("updated", event_id)
+    return occurrence
+
+
+@app.delete("/events/{event_id}/occurrences/{occurrence_date}",
+            status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_occurrence(
+    event_id: int,
+    occurrence_date: datetime,
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
+):
+    """
+    Cancel one occurrence of a recurring event
+    - Requires an access token
+    - The rest of the series is untouched
+    """
+    occurrence_date = schemas.naive_utc(occurrence_date)
+    series = await run_db(db, db_utils.get_occurrence_series, event_id, occurrence_date)
+    if series is None:
+        raise occurrence_not_found()
+    await run_db(db, db_utils.save_occurrence, series, occurrence_date)
+    events_changed("updated", event_id)
+    return None
+
+
+# Attendance Endpoints
+# RSVPs and check-ins are buffered in memory and written in batches (see
+# attendance.py), so these reply 202 Accepted with the live totals
+async def event_roster(
+    db: DbSession,
+    event_id: int,
+    occurrence_date: Optional[datetime]
+) -> attendance.Roster:
+    """
+    Get the attendance roster of an event occurrence, from memory if possible
+    """
+    roster = attendance.buffer.get_roster(event_id, occurrence_date)
+    if roster is None:
+        roster = await run_db(db, attendance.buffer.load_roster, event_id, occurrence_date)
+    if roster is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event or occurrence not found"
+        )
+    return roster
+
+
+async def attendance_counts(db: DbSession, roster: attendance.Roster) -> schemas.AttendanceCounts:
+    """
+    Live totals of a roster as a response
+    - From memory, or from attendance_counts when several processes share
+      the attendance tables (their rosters only see their own changes)
+    """
+    if attendance.buffer.shared:
+        counts = await run_db(db, db_utils.get_attendance_counts,
+                              roster.event_id, roster.occurrence_date)
+    else:
+        counts = attendance.buffer.counts(roster)
+    return schemas.AttendanceCounts(
+        event_id=roster.event_id,
+        occurrence_date=roster.occurrence_date,
+        rsvp=counts[models.AttendanceStatus.RSVP],
+        checked_in=counts[models.AttendanceStatus.CHECKED_IN],
+    )
+
+
+@app.post("/events/{event_id}/rsvp", response_model=schemas.AttendanceCounts,
+          status_code=status.HTTP_202_ACCEPTED)
+async def rsvp_event(
+    event_id: int,
+    occurrence_date: Optional[schemas.UtcDatetime] = None,
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
+):
+    """
+    RSVP to an event
+    - Requires an access token
+    - occurrence_date picks the occurrence of a recurring event
+    - Doesn't change anything for members who already checked in
+    """
+    roster = await event_roster(db, event_id, occurrence_date)
+    attendance.buffer.set_status(
+        roster, current_user.user_id, models.AttendanceStatus.RSVP, only_from=(None,))
+    return await attendance_counts(db, roster)
+
+
+@app.delete("/events/{event_id}/rsvp", response_model=schemas.AttendanceCounts,
+            status_code=status.HTTP_202_ACCEPTED)
+async def cancel_rsvp(
+    event_id: int,
+    occurrence_date: Optional[schemas.UtcDatetime] = None,
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
+):
+    """
+    Take back an RSVP
+    - Requires an access token
+    - Check-ins stay as they are
+    """
+    roster = await event_roster(db, event_id, occurrence_date)
+    attendance.buffer.set_status(
+        roster, current_user.user_id, None, only_from=(models.AttendanceStatus.RSVP,))
+    return await attendance_counts(db, roster)
+
+
+@app.post("/events/{event_id}/check-in", response_model=schemas.AttendanceCounts,
+          status_code=status.HTTP_202_ACCEPTED)
+async def check_in(
+    event_id: int,
+    occurrence_date: Optional[schemas.UtcDatetime] = None,
+    user_id: Optional[int] = None,
+    db: DbSession = Depends(get_session),
+    current_user: schemas.TokenData = Depends(auth.get_current_user)
+):
+    """
+    Check a member in to an event
+    - Requires an access token
+    - Members check themselves in; admins can pass user_id to check in
+      someone else
+    - Checking in twice is harmless
+    """
+    if user_id is None:
+        user_id = current_user.user_id
+    auth.ensure_can_manage_user(current_user, user_id)
+    roster = await event_roster(db, event_id, occurrence_date)
+    if user_id != current_user.user_id and user_id not in roster.statuses:
+        # Only the first check-in of someone else looks the member up
+        if await run_db(db, db_utils.get_user_by_id, user_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+    attendance.buffer.set_status(roster, user_id, models.AttendanceStatus.CHECKED_IN)
+    return await attendance_counts(db, roster)
+
+
+@app.get("/events/{event_id}/attendance", response_model=schemas.AttendanceCounts)
+async def read_attendance(
+    event_id: int,
+    occurrence_date: Optional[schemas.UtcDatetime] = None,
+    db: DbSession = Depends(get_session)
+):
+    """
+    Get the live RSVP and check-in totals of an event
+    - Answered from memory once the event's roster is loaded, including
+      changes that haven't been written to the database yet
+    - With several server processes (ATTENDANCE_SHARED), read from the
+      stored totals, which include changes once they're written
+    """
+    return await attendance_counts(db, await event_roster(db, event_id, occurrence_date))
@@ -0,0 +1,289 @@
+"""
+Request and SQL Metrics for the Church App
+This file measures every request (latency per route, status codes and
+requests in flight) and every SQL statement run while handling it, along
+with background jobs (time waiting in the queue, run time, outcomes), and
+renders the totals in the Prometheus text format for the /metrics endpoint.
+
+SQL statements are tied to the request that ran them through a context
+variable, which follows the request into the threadpool and into async
+database calls. A request that runs the same statement many times is
+counted as a likely N+1 query pattern and logged.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Add a Server-Timing header (SQL time and query count) to every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+# How many times one statement may run in a request before it's reported
+# as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+# Histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+QUERY_COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+JOB_BUCKETS = [0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0]
+
+# Label for requests that didn't match any route (keeps 404 paths from
+# creating a new series each)
+UNMATCHED_ROUTE = "unmatched"
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus style
+    """
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+class RequestStats:
+    """SQL statements run while handling one request"""
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.query_count += 1
+        self.query_time += seconds
+        self.statements[statement] += 1
+
+    def repeated_statements(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statements run at least threshold times (likely N+1 patterns)"""
+        return [(statement, count) for statement, count in self.statements.items()
+                if count >= threshold]
+
+
+# Stats of the request being handled, if any
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None)
+
+
+class MetricsRegistry:
+    """
+    All collected metrics, keyed by (method, route) labels
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Counter = Counter()
+        self.query_counts: Dict[Tuple[str, str], Histogram] = {}
+        self.query_time: Dict[Tuple[str, str], Histogram] = {}
+        self.n_plus_one: Counter = Counter()
+        # Background jobs, by kind (and outcome)
+        self.job_wait: Dict[Tuple[str], Histogram] = {}
+        self.job_duration: Dict[Tuple[str], Histogram] = {}
+        self.jobs: Counter = Counter()
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method: str, route: str, status: int,
+                         seconds: float, stats: RequestStats):
+        labels = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            self.latency.setdefault(labels, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.responses[(method, route, str(status))] += 1
+            self.query_counts.setdefault(
+                labels, Histogram(QUERY_COUNT_BUCKETS)).observe(stats.query_count)
+            self.query_time.setdefault(
+                labels, Histogram(LATENCY_BUCKETS)).observe(stats.query_time)
+
+        for statement, count in stats.repeated_statements():
+            with self._lock:
+                self.n_plus_one[labels] += 1
+            logger.warning(
+                "Possible N+1 queries in %s %s: statement ran %d times: %s",
+                method, route, count, " ".join(statement.split())[:200])
+
+    def job_finished(self, kind: str, outcome: str, wait: float, seconds: float):
+        """
+        Record one attempt of a background job
+        - outcome is "done", "retried" or "failed"
+        - wait is the time between the job being due and a worker taking it
+        """
+        with self._lock:
+            self.job_wait.setdefault((kind,), Histogram(JOB_BUCKETS)).observe(wait)
+            self.job_duration.setdefault((kind,), Histogram(JOB_BUCKETS)).observe(seconds)
+            self.jobs[(kind, outcome)] += 1
+
+    def render(self, job_queue: Optional[Dict[str, int]] = None) -> str:
+        """
+        Everything in the Prometheus text exposition format
+        job_queue is the current queue depth (from db_utils.count_jobs)
+        """
+        lines: List[str] = []
+        with self._lock:
+            _render_histograms(
+                lines, "http_request_duration_seconds",
+                "Time to handle a request, by route", self.latency)
+            lines.append("# HELP http_responses_total Responses sent, by route and status")
+            lines.append("# TYPE http_responses_total counter")
+            for (method, route, status), count in sorted(self.responses.items()):
+                lines.append(
+                    f"http_responses_total{_labels(method=method, route=route, status=status)} {count}")
+            lines.append("# HELP http_requests_in_flight Requests being handled right now")
+            lines.append("# TYPE http_requests_in_flight gauge")
+            lines.append(f"http_requests_in_flight {self.in_flight}")
+            _render_histograms(
+                lines, "db_queries_per_request",
+                "SQL statements run per request, by route", self.query_counts)
+            _render_histograms(
+                lines, "db_query_duration_seconds",
+                "Total SQL time per request, by route", self.query_time)
+            lines.append("# HELP db_n_plus_one_total Requests that repeated one statement "
+                         f"at least {N_PLUS_ONE_THRESHOLD} times")
+            lines.append("# TYPE db_n_plus_one_total counter")
+            for (method, route), count in sorted(self.n_plus_one.items()):
+                lines.append(
+                    f"db_n_plus_one_total{_labels(method=method, route=route)} {count}")
+            if job_queue is not None:
+                lines.append("# HELP job_queue_depth Background jobs queued (all, or due "
+                             "now) and running")
+                lines.append("# TYPE job_queue_depth gauge")
+                for state, count in job_queue.items():
+                    lines.append(f"job_queue_depth{_labels(state=state)} {count}")
+            _render_histograms(
+                lines, "job_wait_seconds",
+                "Time from a job being due to a worker starting it, by kind",
+                self.job_wait, ("kind",))
+            _render_histograms(
+                lines, "job_duration_seconds", "Time to run a job, by kind",
+                self.job_duration, ("kind",))
+            lines.append("# HELP jobs_total Job attempts, by kind and outcome")
+            lines.append("# TYPE jobs_total counter")
+            for (kind, outcome), count in sorted(self.jobs.items()):
+                lines.append(f"jobs_total{_labels(kind=kind, outcome=outcome)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    """Escape a label value"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    """Format labels as {name="value",...}"""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _render_histograms(lines: List[str], name: str, help_text: str,
+                       histograms: Dict[Tuple[str, ...], Histogram],
+                       label_names: Tuple[str, ...] = ("method", "route")):
+    """Add a family of histograms to the output"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, histogram in sorted(histograms.items()):
+        labels = dict(zip(label_names, key))
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f"{name}_bucket{_labels(**labels, le=str(bound))} {count}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {histogram.total}")
+        lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+
+# Shared registry used by the middleware and the /metrics endpoint
+registry = MetricsRegistry()
+
+
+def instrument_engine(engine: Engine):
+    """
+    Time every SQL statement an engine runs and add it to the current
+    request's stats (works for the sync side of async engines too)
+    """
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        stats = current_request.get()
+        if stats is not None:
+            stats.record(statement, time.perf_counter() - started)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def server_timing(stats: RequestStats, elapsed: float) -> str:
+    """
+    Server-Timing header value: SQL time and query count, and total time
+    """
+    return (f'db;dur={stats.query_time * 1000:.2f};desc="{stats.query_count} queries", '
+            f"app;dur={elapsed * 1000:.2f}")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that measures each HTTP request
+    Written as plain ASGI (not BaseHTTPMiddleware) so streaming responses
+    pass straight through.
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        registry.request_started()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(
+                        stats, time.perf_counter() - started).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope, so the
+            # route template (e.g. /users/{user_id}) is used as the label
+            route = scope.get("route")
+            registry.request_finished(
+                scope["method"], getattr(route, "path", UNMATCHED_ROUTE),
+                status, time.perf_counter() - started, stats)
+            current_request.reset(token)
@@ -4,7 +4,7 @@ This file defines the database structure using SQLAlchemy ORM (Object-Relational
 Each class represents a table in the database, and each attribute represents a column.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Enum, Index, JSON, Table, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -56,6 +56,12 @@ class User(Base):
     date_of_birth = Column(DateTime, nullable=True)
     join_date = Column(DateTime, default=datetime.utcnow)
 
+    # Month and day of the birthday and of the join date as month * 100 +
+    # day (e.g. 1231), kept in step with the dates on every write, so
+    # upcoming birthdays and anniversaries are an index range lookup
+    birthday_md = Column(Integer, nullable=True)
+    anniversary_md = Column(Integer, nullable=True)
+
     # Account status (active/inactive)
     is_active = Column(Boolean, default=True)
 
@@ -64,6 +70,19 @@ class User(Base):
     updated_at = Column(DateTime, default=datetime.utcnow,
                         onupdate=datetime.utcnow)
 
+    # Composite indexes matching the filters used to list users
+    # Each ends in id so results come back already in ID order
+    __table_args__ = (
+        Index("ix_users_role_is_active_id", "role", "is_active", "id"),
+        Index("ix_users_role_id", "role", "id"),
+        Index("ix_users_is_active_id", "is_active", "id"),
+        # Latest change (list validators) and changes in order (/sync)
+        Index("ix_users_updated_at_id", "updated_at", "id"),
+        # Upcoming birthdays / anniversaries of active members
+        Index("ix_users_is_active_birthday_md", "is_active", "birthday_md"),
+        Index("ix_users_is_active_anniversary_md", "is_active", "anniversary_md"),
+    )
+
 
 class Event(Base):
     """
@@ -87,7 +106,250 @@ class Event(Base):
     # Where the event will take place
     location = Column(String)
 
+    # Repeating events store one row with a rule (e.g. FREQ=WEEKLY;BYDAY=SU,
+    # see recurrence.py); event_date is the first occurrence.
+    # NULL for one-off events.
+    recurrence_rule = Column(String, nullable=True)
+    # Start of the last occurrence, or NULL if the series never ends, so
+    # date window queries can skip series that are already over
+    recurrence_until = Column(DateTime, nullable=True)
+    # IANA time zone whose wall clock the rule repeats on (e.g.
+    # America/Chicago); NULL repeats in UTC
+    timezone = Column(String, nullable=True)
+
+    # Timestamps for record keeping
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow,
+                        onupdate=datetime.utcnow)
+
+    # Events are listed in date order
+    # The partial index finds the repeating events that start before the
+    # end of a date window without looking at the one-off events
+    __table_args__ = (
+        Index("ix_events_event_date_id", "event_date", "id"),
+        # Latest change (list validators) and changes in order (/sync)
+        Index("ix_events_updated_at_id", "updated_at", "id"),
+        Index("ix_events_series_event_date", "event_date",
+              sqlite_where=recurrence_rule.isnot(None),
+              postgresql_where=recurrence_rule.isnot(None)),
+    )
+
+
+class EventException(Base):
+    """
+    A change to one occurrence of a repeating event: cancelled, or with
+    some fields replaced (e.g. another time or room). Fields left NULL
+    keep the series' value.
+    """
+    __tablename__ = "event_exceptions"
+
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), nullable=False)
+
+    # The date the rule gives the occurrence (before any change)
+    occurrence_date = Column(DateTime, nullable=False)
+    cancelled = Column(Boolean, nullable=False, default=False)
+
+    # Replacement values for the occurrence
+    title = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    event_date = Column(DateTime, nullable=True)
+    location = Column(String, nullable=True)
+
     # Timestamps for record keeping
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow,
                         onupdate=datetime.utcnow)
+
+    # One exception per occurrence; the second index finds occurrences
+    # moved into a date window from outside of it
+    __table_args__ = (
+        Index("ix_event_exceptions_event_id_occurrence_date",
+              "event_id", "occurrence_date", unique=True),
+        Index("ix_event_exceptions_event_id_event_date", "event_id", "event_date"),
+    )
+
+
+class Tombstone(Base):
+    """
+    A deleted user or event, kept so /sync can tell offline clients to
+    drop their copy. Written by the delete paths in db_utils.
+    """
+    __tablename__ = "tombstones"
+
+    # Increases with every deletion, so /sync pages through them in order
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)  # "user" or "event"
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # Latest deletion per entity, part of the list endpoints' Last-Modified
+    __table_args__ = (
+        Index("ix_tombstones_entity_deleted_at", "entity", "deleted_at"),
+    )
+
+
+class UserCount(Base):
+    """
+    Number of users for each role / active status combination.
+    Kept up to date by database triggers (see the add_count_tables
+    migration), so list totals don't need a COUNT(*) over users.
+    """
+    __tablename__ = "user_counts"
+
+    role = Column(Enum(UserRole), primary_key=True)
+    is_active = Column(Boolean, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+
+
+class TableCount(Base):
+    """
+    Total number of rows in a table ("users", "events").
+    Kept up to date by database triggers, like UserCount.
+    """
+    __tablename__ = "table_counts"
+
+    table_name = Column(String, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+
+
+class AttendanceStatus(str, enum.Enum):
+    """Where a member stands for an event"""
+    RSVP = "rsvp"
+    CHECKED_IN = "checked_in"
+
+
+class Attendance(Base):
+    """
+    A member's RSVP or check-in for an event (one occurrence of it, for
+    recurring events). Written in batches by the attendance buffer.
+    """
+    __tablename__ = "attendance"
+
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Start of the occurrence (the event's date for one-off events)
+    occurrence_date = Column(DateTime, nullable=False)
+    status = Column(Enum(AttendanceStatus), nullable=False)
+
+    # Timestamps for record keeping
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow,
+                        onupdate=datetime.utcnow)
+
+    # One record per member and occurrence, also used to load the roster
+    # of an occurrence
+    __table_args__ = (
+        Index("ix_attendance_event_id_occurrence_date_user_id",
+              "event_id", "occurrence_date", "user_id", unique=True),
+    )
+
+
+class AttendanceCount(Base):
+    """
+    Number of RSVPs / check-ins for each event occurrence.
+    Updated in the same transaction as the attendance rows.
+    """
+    __tablename__ = "attendance_counts"
+
+    event_id = Column(Integer, primary_key=True)
+    occurrence_date = Column(DateTime, primary_key=True)
+    status = Column(Enum(AttendanceStatus), primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+
+
+class JobStatus(str, enum.Enum):
+    """Where a background job stands"""
+    QUEUED = "queued"      # Waiting to run (again, after a failed attempt)
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"      # Out of attempts
+
+
+class Job(Base):
+    """
+    A unit of background work (see jobs.py), e.g. sending an event
+    announcement to a batch of members. Endpoints only add rows here;
+    the worker pool picks them up.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    # Which handler runs the job, and its arguments
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    # Don't run before this time (later for retries, with backoff)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(String, nullable=True)
+    # Jobs with the same key never wait or run at the same time (e.g. the
+    # one scheduled archive run); None for jobs that can
+    unique_key = Column(String, nullable=True)
+
+    # Timestamps for record keeping
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    # Bumped by the worker while the job runs; a running job whose
+    # heartbeat stops has lost its worker
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    # Workers take the queued job that is due first; also serves the
+    # queue depth and finding stuck or finished jobs
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        # One unfinished job per key, enforced by the database, so
+        # processes scheduling the same job at once can't both add it
+        Index("ux_jobs_unique_key_pending", "unique_key", unique=True,
+              sqlite_where=text("status IN ('QUEUED', 'RUNNING')"),
+              postgresql_where=text("status IN ('QUEUED', 'RUNNING')")),
+    )
+
+
+def archive_table(source: Table, name: str, *indexes: Index) -> Table:
+    """
+    Archive copy of a table: the same columns (without foreign keys or
+    the hot table's indexes), plus archived_at and any extra indexes
+    The original id is kept but isn't the key: SQLite may hand a deleted
+    row's id to a new row, which could be archived later as well.
+    """
+    columns = [Column(column.name, column.type, nullable=column.nullable)
+               for column in source.columns]
+    return Table(
+        name, Base.metadata,
+        Column("archive_id", Integer, primary_key=True),
+        *columns,
+        Column("archived_at", DateTime, nullable=False, default=datetime.utcnow),
+        Index(f"ix_{name}_id", "id"),
+        *indexes
+    )
+
+
+class ArchivedUser(Base):
+    """
+    A member moved out of the users table by the archiver (see archive.py)
+    after being inactive for a long time. Read with include_archived.
+    """
+    __table__ = archive_table(User.__table__, "users_archive")
+
+
+class ArchivedEvent(Base):
+    """
+    A one-off event moved out of the events table by the archiver once it
+    is long past. Listed by date, like events, with include_archived.
+    """
+    __table__ = archive_table(
+        Event.__table__, "events_archive",
+        Index("ix_events_archive_event_date_id", "event_date", "id"))
+
+
+class ArchivedAttendance(Base):
+    """
+    RSVPs / check-ins of archived events and members, kept for the record
+    (headcounts stay in attendance_counts)
+    """
+    __table__ = archive_table(Attendance.__table__, "attendance_archive")
@@ -0,0 +1,131 @@
+"""
+Member Notifications for the Church App
+This file sends announcements (like a new event) to members, as background
+jobs so the request that triggers them doesn't wait on the sending.
+
+An announcement is split up by the "announce_event" job into one
+"send_notifications" job per NOTIFY_BATCH_SIZE members. Each batch is sent
+with a single call to the notifier and retried on its own if it fails, so
+one bad batch doesn't resend the whole announcement.
+
+The notifier is pluggable, like the entity cache: the default only logs
+what would be sent; point NOTIFIER_BACKEND at an implementation (e.g.
+"mypackage.mailer:SmtpNotifier") to deliver email or push messages.
+"""
+
+import importlib
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from . import db_utils, jobs
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Which notifier to use: "log" (default), "none", or "module:ClassName"
+NOTIFIER_BACKEND = os.getenv("NOTIFIER_BACKEND", "log")
+# Members per send_notifications job (and per notifier call)
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "100"))
+
+logger = logging.getLogger(__name__)
+
+
+class Notification(NamedTuple):
+    """One message to one member"""
+    user_id: int
+    email: str
+    subject: str
+    body: str
+
+
+class Notifier(ABC):
+    """
+    Interface for notifier backends.
+    send gets a whole batch, so backends can use bulk APIs.
+    """
+
+    @abstractmethod
+    def send(self, notifications: List[Notification]):
+        """Deliver a batch; raise to have the whole batch retried later"""
+
+
+class NullNotifier(Notifier):
+    """Notifier that drops every message"""
+
+    def send(self, notifications: List[Notification]):
+        pass
+
+
+class LogNotifier(Notifier):
+    """Notifier that only logs what it would send (for development)"""
+
+    def send(self, notifications: List[Notification]):
+        for notification in notifications:
+            logger.info("Notify %s: %s", notification.email, notification.subject)
+
+
+def load_notifier(name: str = NOTIFIER_BACKEND) -> Notifier:
+    """
+    Create the notifier named by NOTIFIER_BACKEND
+    Custom notifiers are given as "module:ClassName" and built with no
+    arguments, so they should read their own settings (e.g. a server URL).
+    """
+    if name == "log":
+        return LogNotifier()
+    if name == "none":
+        return NullNotifier()
+    module_name, _, class_name = name.partition(":")
+    notifier_class = getattr(importlib.import_module(module_name), class_name)
+    return notifier_class()
+
+
+# Shared notifier used by the jobs below
+notifier = load_notifier()
+
+
+@jobs.handler("announce_event")
+def announce_event(db: Session, payload: dict):
+    """
+    Split an event announcement into one send job per batch of active
+    members (all batch jobs are added in one transaction)
+    """
+    payloads = []
+    after_id = 0
+    while True:
+        user_ids = db_utils.get_active_user_ids(db, after_id, NOTIFY_BATCH_SIZE)
+        if not user_ids:
+            break
+        payloads.append({"event_id": payload["event_id"], "user_ids": user_ids})
+        after_id = user_ids[-1]
+    db_utils.enqueue_jobs(db, "send_notifications", payloads)
+    db.commit()
+    jobs.pool.wake()
+
+
+def event_announcement(event, recipient) -> Notification:
+    """The message announcing an event to one member"""
+    when = event.event_date.strftime("%A %B %d, %Y at %I:%M %p")
+    where = f" at {event.location}" if event.location else ""
+    body = f"Hi {recipient.first_name},\n\n{event.title} is on {when}{where}."
+    if event.description:
+        body += f"\n\n{event.description}"
+    return Notification(recipient.id, recipient.email, f"New event: {event.title}", body)
+
+
+@jobs.handler("send_notifications")
+def send_notifications(db: Session, payload: dict):
+    """
+    Send an event announcement to one batch of members
+    Members who were deactivated or deleted since are skipped, and so is
+    the whole batch if the event was deleted.
+    """
+    event = db_utils.get_event_by_id(db, payload["event_id"])
+    if event is None:
+        return
+    notifier.send([event_announcement(event, recipient)
+                   for recipient in db_utils.get_recipients(db, payload["user_ids"])])
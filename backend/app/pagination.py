@@ -0,0 +1,54 @@
+"""
+Cursor Pagination Helpers for the Church App
+This file encodes and decodes the opaque cursors used for keyset pagination.
+A cursor holds the sort key of the last row on a page, so the next page can
+start right after it instead of skipping over all the previous rows.
+"""
+
+import base64
+import json
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Response header carrying the number of rows matching the list's filters
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def encode_cursor(*keys: Any) -> str:
+    """
+    Encode the sort key of a row into an opaque, URL-safe cursor
+    """
+    raw = json.dumps(list(keys), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def nullable(convert: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """
+    Wrap a cursor key converter so it lets None (JSON null) through
+    """
+    return lambda value: None if value is None else convert(value)
+
+
+def decode_cursor(cursor: str, *types: Callable[[Any], Any]) -> Optional[Tuple]:
+    """
+    Decode a cursor back into its sort key values
+    - Each key is converted with the matching entry in types
+    - An empty cursor means "first page" and returns None
+    - Raises a 400 error if the cursor is malformed
+    """
+    if cursor == "":
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        keys = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(keys, list) or len(keys) != len(types):
+            raise ValueError("Wrong number of cursor keys")
+        return tuple(convert(key) for convert, key in zip(types, keys))
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
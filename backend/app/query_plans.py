@@ -0,0 +1,171 @@
+"""
+Query Plan Check for the Church App
+This file runs the queries behind each list/lookup endpoint and checks their
+SQLite EXPLAIN QUERY PLAN output, failing if any of them has regressed to a
+full table scan or an unindexed sort.
+
+Run it against a migrated database (alembic upgrade head) from the backend
+folder:
+
+    python -m app.query_plans
+"""
+
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Callable, List, NamedTuple, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import db_utils, models
+from .database import SessionLocal, engine
+
+# Tables whose full scans count as a regression
+HOT_TABLES = ("users", "events")
+
+
+class Probe(NamedTuple):
+    """A query to check, and whether an in-order scan is acceptable"""
+    name: str
+    run: Callable[[Session], object]
+    # Unfiltered first pages walk the table/index in order and stop at
+    # LIMIT, so a scan is fine there as long as no sort is needed
+    bounded: bool = False
+
+
+# One probe per query shape used by the endpoints
+PROBES = [
+    Probe("get_user_by_id", lambda db: db_utils.get_user_by_id(db, 1)),
+    Probe("get_user_by_email",
+          lambda db: db_utils.get_user_by_email(db, "someone@example.com")),
+    Probe("get_token_user", lambda db: db_utils.get_token_user(db, 1)),
+    Probe("get_table_version users",
+          lambda db: db_utils.get_table_version(db, models.User)),
+    Probe("get_table_version events",
+          lambda db: db_utils.get_table_version(db, models.Event)),
+    Probe("get_users", lambda db: db_utils.get_users(db), bounded=True),
+    Probe("get_users keyset",
+          lambda db: db_utils.get_users(db, after_id=100)),
+    Probe("get_users role",
+          lambda db: db_utils.get_users(db, role=models.UserRole.MEMBER)),
+    Probe("get_users is_active",
+          lambda db: db_utils.get_users(db, is_active=True)),
+    Probe("get_users role+is_active",
+          lambda db: db_utils.get_users(
+              db, role=models.UserRole.MEMBER, is_active=True)),
+    Probe("get_users role+is_active keyset",
+          lambda db: db_utils.get_users(
+              db, role=models.UserRole.MEMBER, is_active=True, after_id=100)),
+    Probe("get_users city", lambda db: db_utils.get_users(db, city="York")),
+    Probe("get_users q", lambda db: db_utils.get_users(db, q="john")),
+    Probe("get_celebrations",
+          lambda db: db_utils.get_celebrations(db, date(2024, 6, 10), 7)),
+    Probe("get_celebrations year end",
+          lambda db: db_utils.get_celebrations(db, date(2024, 12, 28), 7)),
+    Probe("get_celebrations March 1st",
+          lambda db: db_utils.get_celebrations(db, date(2027, 3, 1), 7)),
+    Probe("get_changes", lambda db: db_utils.get_changes(db), bounded=True),
+    Probe("get_changes since",
+          lambda db: db_utils.get_changes(db, db_utils.SyncPosition(
+              datetime(2024, 1, 1), 1, datetime(2024, 1, 1), 1, 10))),
+    Probe("get_events", lambda db: db_utils.get_events(db), bounded=True),
+    Probe("get_events keyset",
+          lambda db: db_utils.get_events(db, after=(datetime(2024, 1, 1), 1))),
+    Probe("get_events window",
+          lambda db: db_utils.get_events(
+              db, start=datetime(2024, 1, 1), end=datetime(2024, 2, 1))),
+    Probe("get_events window desc keyset",
+          lambda db: db_utils.get_events(
+              db, start=datetime(2024, 1, 1), end=datetime(2024, 2, 1),
+              descending=True, after=(datetime(2024, 1, 15), 1))),
+    Probe("get_upcoming_events",
+          lambda db: db_utils.get_upcoming_events(db)),
+    # The archive tables are allowed to be scanned (they're cold), but
+    # reading them in list order must not need a sort
+    Probe("get_users include_archived",
+          lambda db: db_utils.get_users(db, include_archived=True), bounded=True),
+    Probe("get_users include_archived keyset",
+          lambda db: db_utils.get_users(db, after_id=100, include_archived=True)),
+    Probe("get_archived_user", lambda db: db_utils.get_archived_user(db, 1)),
+    Probe("get_events include_archived window",
+          lambda db: db_utils.get_events(
+              db, start=datetime(2024, 1, 1), end=datetime(2024, 2, 1),
+              include_archived=True)),
+    Probe("get_archived_event", lambda db: db_utils.get_archived_event(db, 1)),
+    # Cutoffs nothing is older than, so only the batch lookups run
+    Probe("archive_users", lambda db: db_utils.archive_users(db, datetime(1900, 1, 1))),
+    Probe("archive_events", lambda db: db_utils.archive_events(db, datetime(1900, 1, 1))),
+]
+
+
+@contextmanager
+def capture_statements(bind: Engine):
+    """
+    Record every SQL statement (with its parameters) run on an engine
+    """
+    captured: List[Tuple[str, object]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+
+def plan_problems(plan: List[str], bounded: bool) -> List[str]:
+    """
+    Find full scans and unindexed sorts in an EXPLAIN QUERY PLAN output
+    """
+    problems = []
+    for detail in plan:
+        for table in HOT_TABLES:
+            if (detail == f"SCAN {table}" or detail.startswith(f"SCAN {table} ")) and not bounded:
+                problems.append(f"full scan: {detail}")
+        if "USE TEMP B-TREE" in detail:
+            problems.append(f"unindexed sort: {detail}")
+    return problems
+
+
+def check_query_plans(bind: Engine = engine, verbose: bool = True) -> List[str]:
+    """
+    Run every probe and return a list of failures (empty if all good)
+    """
+    if bind.dialect.name != "sqlite":
+        raise RuntimeError("The query plan check only supports SQLite")
+
+    failures = []
+    db = SessionLocal(bind=bind)
+    try:
+        for probe in PROBES:
+            with capture_statements(bind) as captured:
+                probe.run(db)
+            for statement, parameters in captured:
+                if statement.startswith("PRAGMA"):
+                    continue  # Schema lookups, e.g. for the search index
+                rows = db.connection().exec_driver_sql(
+                    "EXPLAIN QUERY PLAN " + statement, parameters).all()
+                plan = [row[-1] for row in rows]
+                problems = plan_problems(plan, probe.bounded)
+                if verbose:
+                    print(f"{'FAIL' if problems else 'ok  '} {probe.name}")
+                    for detail in plan:
+                        print(f"       {detail}")
+                failures.extend(f"{probe.name}: {p}" for p in problems)
+    finally:
+        db.close()
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check_query_plans()
+    if failures:
+        print("\nQuery plan regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll endpoint queries use indexes")
@@ -0,0 +1,354 @@
+"""
+Recurrence Rules for the Church App
+This file parses the recurrence rules of repeating events and expands them
+into occurrence dates.
+
+Rules use a subset of the iCalendar RRULE syntax (RFC 5545), e.g.
+
+    FREQ=WEEKLY;BYDAY=SU                  every Sunday
+    FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH    every other Tuesday and Thursday
+    FREQ=MONTHLY;BYDAY=1SA                first Saturday of every month
+    FREQ=MONTHLY;BYDAY=-1FR;COUNT=12      last Friday of the month, 12 times
+    FREQ=YEARLY;UNTIL=20301231            every year on the same day
+
+Supported parts: FREQ (DAILY, WEEKLY, MONTHLY, YEARLY), INTERVAL, BYDAY
+(plain weekdays, or with an ordinal for MONTHLY), COUNT and UNTIL.
+The event's own date is the first occurrence and sets the time of day.
+
+Dates are stored in UTC, but a series repeats on the wall clock of its
+time zone (an IANA name such as America/Chicago): a 10:00 service stays
+at 10:00 across daylight saving changes, and BYDAY and UNTIL use the local
+day. Rules are expanded in local time and every occurrence is converted
+back to UTC. Series without a time zone repeat in UTC.
+
+Occurrences are generated lazily, in order, so callers only pay for the
+ones they read, and reading a window starts right at the window instead of
+at the first occurrence (except for COUNT rules, which are kept short).
+Endless rules are expanded up to RECURRENCE_HORIZON_DAYS past the start of
+the date window being read (or past today) unless the query gives the
+window an end. No window expands rules further than
+RECURRENCE_MAX_WINDOW_DAYS.
+"""
+
+import calendar
+import os
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Iterator, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# How far past their start (or today, if later) open-ended date windows
+# list and count the occurrences of recurring events that never end
+RECURRENCE_HORIZON_DAYS = int(os.getenv("RECURRENCE_HORIZON_DAYS", "365"))
+# Longest window (in days past its start, or today) that rules are
+# expanded over; later occurrences are left out of longer windows
+RECURRENCE_MAX_WINDOW_DAYS = int(os.getenv("RECURRENCE_MAX_WINDOW_DAYS", "3660"))
+
+# Limits on how long a rule may run (COUNT, and UNTIL after the first
+# occurrence)
+MAX_COUNT = 5000
+MAX_SPAN_YEARS = 100
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+# Periods in a row without a single occurrence before a rule is treated as
+# exhausted (e.g. the 31st of the month every other February)
+MAX_EMPTY_PERIODS = 1000
+
+
+class Rule(NamedTuple):
+    """A parsed recurrence rule"""
+    freq: str
+    interval: int = 1
+    # (ordinal, weekday) pairs; ordinal 0 means every such weekday,
+    # 1 the first one in the month, -1 the last one, ...
+    by_day: Tuple[Tuple[int, int], ...] = ()
+    count: Optional[int] = None
+    until: Optional[datetime] = None
+
+
+@lru_cache(maxsize=None)
+def zone(name: Optional[str]) -> Optional[tzinfo]:
+    """
+    The time zone of an IANA name, or None (UTC) for None
+    Raises ValueError for an unknown name.
+    """
+    if name is None:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {name}")
+
+
+def to_local(date: datetime, tz: Optional[tzinfo]) -> datetime:
+    """A stored (naive UTC) date as wall-clock time in a time zone"""
+    if tz is None:
+        return date
+    return date.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+
+def to_utc(date: datetime, tz: Optional[tzinfo]) -> datetime:
+    """
+    A wall-clock time in a time zone as a stored (naive UTC) date
+    Times that happen twice when the clocks go back take the first one;
+    times skipped when they go forward use the offset from before.
+    """
+    if tz is None:
+        return date
+    return date.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_until(value: str) -> datetime:
+    """
+    Parse an UNTIL value: YYYYMMDD (the whole day) or YYYYMMDDTHHMMSS[Z]
+    """
+    if len(value) == 8:
+        return datetime.strptime(value, "%Y%m%d").replace(hour=23, minute=59, second=59)
+    return datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+
+
+def parse_day(value: str, freq: str) -> Tuple[int, int]:
+    """
+    Parse a BYDAY entry such as SU, 1SA or -1FR into (ordinal, weekday)
+    """
+    code = value[-2:]
+    if code not in WEEKDAYS:
+        raise ValueError(f"Unknown weekday: {value}")
+    ordinal = int(value[:-2]) if value[:-2] else 0
+    if ordinal and freq != "MONTHLY":
+        raise ValueError("Numbered weekdays (like 1SU) are only supported with FREQ=MONTHLY")
+    if not -5 <= ordinal <= 5:
+        raise ValueError(f"Weekday ordinal out of range: {value}")
+    return ordinal, WEEKDAYS.index(code)
+
+
+def parse_rule(text: str) -> Rule:
+    """
+    Parse a recurrence rule string
+    - Raises ValueError with a readable message if it's invalid or uses
+      a part that isn't supported
+    """
+    parts = {}
+    for part in text.strip().upper().removeprefix("RRULE:").split(";"):
+        name, sep, value = part.partition("=")
+        if not sep or not value:
+            raise ValueError(f"Invalid rule part: {part!r}")
+        if name in parts:
+            raise ValueError(f"{name} given more than once")
+        parts[name] = value
+
+    freq = parts.pop("FREQ", None)
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+    try:
+        interval = int(parts.pop("INTERVAL", "1"))
+        count = int(parts["COUNT"]) if "COUNT" in parts else None
+        until = parse_until(parts["UNTIL"]) if "UNTIL" in parts else None
+    except ValueError:
+        raise ValueError("INTERVAL and COUNT must be numbers, UNTIL a date like 20301231")
+    parts.pop("COUNT", None)
+    parts.pop("UNTIL", None)
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError("INTERVAL and COUNT must be at least 1")
+    if count is not None and count > MAX_COUNT:
+        raise ValueError(f"COUNT can be at most {MAX_COUNT}")
+    if count is not None and until is not None:
+        raise ValueError("Use either COUNT or UNTIL, not both")
+
+    by_day = tuple(parse_day(day, freq) for day in parts.pop("BYDAY", "").split(",") if day)
+    if by_day and freq == "YEARLY":
+        raise ValueError("BYDAY is not supported with FREQ=YEARLY")
+    if parts:
+        raise ValueError(f"Unsupported rule parts: {', '.join(sorted(parts))}")
+    return Rule(freq, interval, tuple(sorted(set(by_day))), count, until)
+
+
+def _month_days(year: int, month: int, start: datetime, rule: Rule) -> list:
+    """Dates of a MONTHLY rule in one month, in order"""
+    days_in_month = calendar.monthrange(year, month)[1]
+    if not rule.by_day:
+        # Same day of the month as the first occurrence (skipped in
+        # months that don't have it)
+        return [start.day] if start.day <= days_in_month else []
+
+    days = set()
+    for ordinal, weekday in rule.by_day:
+        matching = [day for day in range(1, days_in_month + 1)
+                    if calendar.weekday(year, month, day) == weekday]
+        if ordinal == 0:
+            days.update(matching)
+        elif abs(ordinal) <= len(matching):
+            days.add(matching[ordinal - 1 if ordinal > 0 else ordinal])
+    return sorted(days)
+
+
+def _period_dates(start: datetime, rule: Rule, period: int) -> list:
+    """
+    Candidate dates for one period (day, week, month or year) of a rule
+    period counts from 0 (the period of the first occurrence)
+    """
+    step = period * rule.interval
+    if rule.freq == "DAILY":
+        day = start + timedelta(days=step)
+        weekdays = {weekday for _, weekday in rule.by_day}
+        return [day] if not weekdays or day.weekday() in weekdays else []
+
+    if rule.freq == "WEEKLY":
+        week_start = start - timedelta(days=start.weekday()) + timedelta(weeks=step)
+        weekdays = sorted({weekday for _, weekday in rule.by_day}) or [start.weekday()]
+        return [week_start + timedelta(days=weekday) for weekday in weekdays]
+
+    if rule.freq == "MONTHLY":
+        year, month = divmod(start.month - 1 + step, 12)
+        year, month = start.year + year, month + 1
+        return [start.replace(year=year, month=month, day=day)
+                for day in _month_days(year, month, start, rule)]
+
+    # YEARLY: same month and day (February 29th only in leap years)
+    year = start.year + step
+    if start.month == 2 and start.day == 29 and not calendar.isleap(year):
+        return []
+    return [start.replace(year=year)]
+
+
+def _period_of(start: datetime, rule: Rule, date: datetime) -> int:
+    """
+    The period (see _period_dates) a date falls in, worked out from the
+    calendar instead of by stepping through the periods (0 before start)
+    """
+    if date <= start:
+        return 0
+    if rule.freq == "DAILY":
+        units = (date - start).days
+    elif rule.freq == "WEEKLY":
+        units = (date.date() - timedelta(days=date.weekday())
+                 - (start.date() - timedelta(days=start.weekday()))).days // 7
+    elif rule.freq == "MONTHLY":
+        units = (date.year - start.year) * 12 + date.month - start.month
+    else:
+        units = date.year - start.year
+    return units // rule.interval
+
+
+def occurrences(start: datetime, rule: Rule, after: Optional[datetime] = None,
+                tz: Optional[tzinfo] = None) -> Iterator[datetime]:
+    """
+    Generate the occurrences of a rule in order, starting at start
+    - Endless for rules without COUNT or UNTIL, so read what's needed
+      (e.g. with itertools.takewhile)
+    - after skips straight to the period of that date, so occurrences
+      before it may or may not be generated (COUNT rules always start at
+      the beginning, to count the earlier occurrences)
+    - tz is the series' time zone: the rule runs on its wall clock, and
+      start, after and the occurrences are in UTC
+    - Stops at the end of the calendar (year 9999)
+    """
+    local_after = to_local(after, tz) if after is not None else None
+    for date in _local_occurrences(to_local(start, tz), rule, local_after):
+        yield to_utc(date, tz)
+
+
+def _local_occurrences(start: datetime, rule: Rule,
+                       after: Optional[datetime] = None) -> Iterator[datetime]:
+    """occurrences, in wall-clock time"""
+    produced = 0
+    empty_periods = 0
+    period = 0
+    if after is not None and rule.count is None:
+        period = _period_of(start, rule, after)
+    while empty_periods < MAX_EMPTY_PERIODS:
+        try:
+            dates = [date for date in _period_dates(start, rule, period) if date >= start]
+        except (OverflowError, ValueError):
+            return
+        empty_periods = 0 if dates else empty_periods + 1
+        for date in dates:
+            if rule.until is not None and date > rule.until:
+                return
+            yield date
+            produced += 1
+            if rule.count is not None and produced >= rule.count:
+                return
+        period += 1
+
+
+def horizon(end: Optional[datetime] = None, start: Optional[datetime] = None) -> datetime:
+    """
+    End of a date window for expanding rules
+    - An open-ended window ends RECURRENCE_HORIZON_DAYS after its start,
+      or after today if it starts earlier (or has no start)
+    - Today is taken at midnight, so the end only moves once a day
+    - Any window is cut to RECURRENCE_MAX_WINDOW_DAYS after that point
+    """
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    first = max(start or today, today)
+    if end is None:
+        return first + timedelta(days=RECURRENCE_HORIZON_DAYS)
+    return min(end, first + timedelta(days=RECURRENCE_MAX_WINDOW_DAYS))
+
+
+def occurrences_between(
+    start: datetime,
+    rule: Rule,
+    window_start: Optional[datetime],
+    window_end: datetime,
+    tz: Optional[tzinfo] = None
+) -> Iterator[datetime]:
+    """
+    Occurrences with window_start <= date < window_end, in order
+    """
+    for date in occurrences(start, rule, window_start, tz):
+        if date >= window_end:
+            return
+        if window_start is None or date >= window_start:
+            yield date
+
+
+def last_occurrence(start: datetime, rule: Rule,
+                    tz: Optional[tzinfo] = None) -> Optional[datetime]:
+    """
+    Date of the last occurrence, or None if the rule never ends
+    """
+    if rule.count is not None:
+        last = None
+        for last in occurrences(start, rule, tz=tz):
+            pass
+        return last
+    if rule.until is None:
+        return None
+    # Work back from UNTIL's period to the last one with an occurrence
+    start = to_local(start, tz)
+    period = _period_of(start, rule, rule.until)
+    for period in range(period, max(period - MAX_EMPTY_PERIODS, -1), -1):
+        dates = [date for date in _period_dates(start, rule, period)
+                 if start <= date <= rule.until]
+        if dates:
+            return to_utc(dates[-1], tz)
+    return None
+
+
+def check_span(start: datetime, rule: Rule):
+    """
+    Raise ValueError if a rule's UNTIL is more than MAX_SPAN_YEARS after
+    the first occurrence
+    """
+    if rule.until is not None and rule.until.year - start.year > MAX_SPAN_YEARS:
+        raise ValueError(f"UNTIL can be at most {MAX_SPAN_YEARS} years after event_date")
+
+
+def is_occurrence(start: datetime, rule: Rule, date: datetime,
+                  tz: Optional[tzinfo] = None) -> bool:
+    """
+    Check whether a date is one of a rule's occurrences
+    """
+    for occurrence in occurrences(start, rule, date, tz):
+        if occurrence >= date:
+            return occurrence == date
+    return False
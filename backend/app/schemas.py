@@ -4,10 +4,25 @@ This file defines Pydantic models for request/response validation.
 These schemas ensure that data is in the correct format before it reaches the database.
 """
 
-from pydantic import BaseModel, EmailStr, Field, validator
-from datetime import datetime
-from typing import Optional
+from pydantic import AfterValidator, BaseModel, EmailStr, Field, model_validator, validator
+from datetime import date, datetime, timezone
+from typing import Annotated, List, Literal, Optional
 from .models import UserRole
+from .recurrence import check_span, is_occurrence, parse_rule, zone
+
+
+def naive_utc(value: datetime) -> datetime:
+    """
+    Convert a date with a time zone (like "...Z", as the mobile app sends
+    them) to UTC without one, the way dates are stored and compared
+    """
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# A datetime field or parameter passed through naive_utc
+UtcDatetime = Annotated[datetime, AfterValidator(naive_utc)]
 
 
 class UserBase(BaseModel):
@@ -101,17 +116,62 @@ class EventBase(BaseModel):
     description: Optional[str] = Field(
         None, max_length=500)      # Optional event description
     # When the event will occur
-    event_date: datetime
+    event_date: UtcDatetime
     location: Optional[str] = Field(
         None, max_length=200)         # Optional event location
+    # Repeat rule for recurring events, e.g. "FREQ=WEEKLY;BYDAY=SU"
+    # (see recurrence.py for what's supported)
+    recurrence_rule: Optional[str] = Field(None, max_length=200)
+    # IANA time zone the rule repeats in, e.g. "America/Chicago", so the
+    # time of day survives daylight saving changes (None: UTC)
+    timezone: Optional[str] = Field(None, max_length=64)
+
+    @validator('recurrence_rule')
+    def rule_must_be_valid(cls, v):
+        """Validate the rule and store it in upper case"""
+        if v is None:
+            return v
+        parse_rule(v)
+        return v.strip().upper()
+
+    @validator('timezone')
+    def timezone_must_exist(cls, v):
+        """Only accept time zones the tz database knows"""
+        if v is not None:
+            zone(v)
+        return v
 
 
 class EventCreate(EventBase):
     """
     Schema for creating a new event.
-    Currently identical to EventBase, but can be extended if needed.
+    For a recurring event, event_date is the first occurrence.
     """
-    pass
+
+    @model_validator(mode="after")
+    def check_first_occurrence(self):
+        """
+        The rule has to produce event_date, or it would be skipped, and
+        can't run for more than a lifetime
+        """
+        if self.recurrence_rule is None:
+            return self
+        rule = parse_rule(self.recurrence_rule)
+        check_span(self.event_date, rule)
+        if not is_occurrence(self.event_date, rule, self.event_date, zone(self.timezone)):
+            raise ValueError("event_date must be an occurrence of recurrence_rule")
+        return self
+
+
+class EventOccurrenceUpdate(BaseModel):
+    """
+    Schema for changing one occurrence of a recurring event.
+    Only the fields that are provided replace the series' values.
+    """
+    title: Optional[str] = Field(None, min_length=1, max_length=100)
+    description: Optional[str] = Field(None, max_length=500)
+    event_date: Optional[UtcDatetime] = None  # Move the occurrence
+    location: Optional[str] = Field(None, max_length=200)
 
 
 class Event(EventBase):
@@ -122,7 +182,174 @@ class Event(EventBase):
     id: int             # Event's unique identifier
     created_at: datetime  # When the event was created
     updated_at: datetime  # When the event was last updated
+    # For occurrences of a recurring event: the date the rule gives this
+    # occurrence (used to change or cancel it)
+    occurrence_date: Optional[datetime] = None
 
     class Config:
         # Allows conversion from database model to Pydantic model
         from_attributes = True
+
+
+class LoginRequest(BaseModel):
+    """
+    Schema for signing in with email and password.
+    """
+    email: EmailStr
+    password: str
+
+
+class Token(BaseModel):
+    """
+    Schema for a successful sign-in.
+    Returns the access token together with the signed-in user.
+    """
+    access_token: str
+    token_type: str = "bearer"
+    user: User
+
+
+class TokenData(BaseModel):
+    """
+    Claims carried inside an access token.
+    """
+    user_id: int
+    email: EmailStr
+    role: Optional[UserRole] = None
+
+
+class ImportRowError(BaseModel):
+    """
+    A row that could not be imported.
+    """
+    line: int                     # Line number in the uploaded file
+    email: Optional[str] = None   # Email on that row, if it could be read
+    error: str                    # Why the row was rejected
+
+
+class ImportReport(BaseModel):
+    """
+    Result of a bulk user import.
+    """
+    imported: int = 0   # Number of users created
+    failed: int = 0     # Number of rows rejected
+    errors: List[ImportRowError] = []
+
+
+class UserFilter(BaseModel):
+    """
+    Filters selecting users, the same ones GET /users/ accepts.
+    """
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+
+
+class UserSelection(BaseModel):
+    """
+    Which users a bulk operation applies to: a list of IDs or a filter.
+    Exactly one of the two must be given, and a filter must set at least
+    one field, so a request can't touch every user by accident.
+    """
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=10000)
+    filter: Optional[UserFilter] = None
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        """Require either ids or a non-empty filter, not both"""
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Give either ids or filter")
+        if self.filter is not None and not self.filter.model_dump(exclude_none=True):
+            raise ValueError("filter must set at least one field")
+        return self
+
+
+class BulkUserUpdate(UserSelection):
+    """
+    Schema for updating many users at once.
+    """
+    changes: UserUpdate
+
+    @validator("changes")
+    def changes_must_be_valid(cls, v):
+        """Emails are unique, so they can't be set on many users at once"""
+        fields = v.model_dump(exclude_unset=True)
+        if not fields:
+            raise ValueError("No changes given")
+        if "email" in fields:
+            raise ValueError("email can't be changed in bulk")
+        return v
+
+
+class BulkResult(BaseModel):
+    """
+    Result of a bulk update or delete.
+    """
+    affected: int   # Number of users changed or removed
+
+
+class AttendanceCounts(BaseModel):
+    """
+    Live RSVP and check-in totals of an event occurrence.
+    """
+    event_id: int
+    occurrence_date: datetime   # Start of the occurrence
+    rsvp: int                   # Members who RSVP'd and haven't checked in
+    checked_in: int             # Members who checked in
+
+
+class Celebration(BaseModel):
+    """
+    An upcoming birthday or membership anniversary.
+    """
+    user_id: int
+    first_name: str
+    last_name: str
+    kind: Literal["birthday", "anniversary"]
+    date: date          # The day it falls on
+    years: int          # Age turned, or years since joining
+
+
+class OccurrenceChange(BaseModel):
+    """
+    A changed or cancelled occurrence of a recurring event.
+    Fields left null keep the series' value.
+    """
+    occurrence_date: datetime   # The date the rule gives the occurrence
+    cancelled: bool
+    title: Optional[str] = None
+    description: Optional[str] = None
+    event_date: Optional[datetime] = None
+    location: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SyncEvent(Event):
+    """
+    An event as stored, for offline clients: a recurring event is one
+    row with its rule, plus the changes to single occurrences.
+    """
+    exceptions: List[OccurrenceChange] = []
+
+
+class Deletion(BaseModel):
+    """
+    A user or event that was deleted.
+    """
+    entity: Literal["user", "event"]
+    id: int
+    deleted_at: datetime
+
+
+class SyncResult(BaseModel):
+    """
+    Everything that changed since a sync token.
+    """
+    users: List[User] = []        # Created or updated users
+    events: List[SyncEvent] = []  # Created or updated events
+    deleted: List[Deletion] = []
+    token: str                    # Pass as since= on the next sync
+    has_more: bool = False        # Sync again right away for the rest
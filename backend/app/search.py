@@ -0,0 +1,97 @@
+"""
+Member Directory Search for the Church App
+This file builds the filters used to search users by name, city and state.
+On SQLite the filters go through the users_fts FTS5 trigram index, so
+substring searches use an index instead of scanning every user.
+On other databases (or before the search migration has run) they fall back
+to ILIKE filters, which Postgres serves from trigram indexes. So do
+searches of the users archive, which has no search index.
+"""
+
+from typing import Dict, List, Optional
+
+from sqlalchemy import column, inspect, literal_column, or_, select, table
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Name of the FTS5 table created by the search index migration
+SEARCH_TABLE = "users_fts"
+
+# The trigram tokenizer can only match terms of at least 3 characters
+MIN_TERM_LENGTH = 3
+
+# Columns covered by a free-text (q=) search
+SEARCH_COLUMNS = ("first_name", "last_name", "city", "state")
+
+# Remembers whether each database has the search table
+_search_table_exists: Dict[str, bool] = {}
+
+
+def search_index_available(db: Session) -> bool:
+    """
+    Check if the FTS5 search table can be used for this database
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != "sqlite":
+        return False
+    key = str(bind.engine.url)
+    if key not in _search_table_exists:
+        _search_table_exists[key] = inspect(bind).has_table(SEARCH_TABLE)
+    return _search_table_exists[key]
+
+
+def _fts_phrase(term: str) -> str:
+    """Quote a search term as an FTS5 phrase"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _ilike(model, name: str, term: str):
+    """Substring filter on a users (or users archive) column"""
+    return getattr(model, name).ilike(f"%{term}%")
+
+
+def user_search_filters(
+    db: Session,
+    q: Optional[str] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    model=models.User
+) -> List:
+    """
+    Build the filters for a directory search
+    - q: every word must appear in the first name, last name, city or state
+    - city / state: substring match on that column
+    - model: models.ArchivedUser to search the archive instead
+    Returns a list of filters to pass to query.filter()
+    """
+    # Each entry is (columns to search, term)
+    terms = []
+    if q is not None:
+        terms.extend((SEARCH_COLUMNS, word) for word in q.split())
+    if city is not None:
+        terms.append((("city",), city))
+    if state is not None:
+        terms.append((("state",), state))
+
+    use_index = bool(terms) and model is models.User and search_index_available(db)
+    filters = []
+    match_parts = []
+    for columns, term in terms:
+        if use_index and len(term) >= MIN_TERM_LENGTH:
+            if columns == SEARCH_COLUMNS:
+                match_parts.append(_fts_phrase(term))
+            else:
+                match_parts.append(
+                    "{" + " ".join(columns) + "} : " + _fts_phrase(term))
+        else:
+            # Short terms can't use the trigram index
+            filters.append(or_(*(_ilike(model, name, term) for name in columns)))
+
+    if match_parts:
+        fts = table(SEARCH_TABLE, column("rowid"))
+        matching_ids = select(fts.c.rowid).where(
+            literal_column(SEARCH_TABLE).op("MATCH")(" AND ".join(match_parts))
+        )
+        filters.append(models.User.id.in_(matching_ids))
+    return filters
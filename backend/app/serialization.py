@@ -0,0 +1,116 @@
+"""
+JSON Serialization for the Church App
+This file turns list query results into JSON response bodies.
+
+Two paths are available:
+- ORM objects are validated through the response schema and dumped by
+  Pydantic (the default, and the safe choice for any object)
+- With FAST_JSON turned on, list endpoints select only the schema's columns
+  as plain rows, which are dumped straight to JSON by orjson. The rows come
+  from our own database, so validating them again is skipped.
+
+Clients can also ask for a subset of the fields (the fields= parameter).
+Those lists select just the requested columns as plain rows and use a
+smaller response schema built from the full one.
+"""
+
+import os
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter, create_model
+from sqlalchemy import null
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the default path doesn't need it
+    orjson = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Opt in to the orjson / plain row fast path (needs orjson installed)
+FAST_JSON = os.getenv("FAST_JSON", "false").lower() in ("1", "true", "yes") \
+    and orjson is not None
+
+# JSON serializers for list responses, one per response schema
+_list_adapters: Dict[type, TypeAdapter] = {}
+# Response schemas for fields= requests, keyed by schema and field set
+_field_schemas: Dict[Tuple[type, FrozenSet[str]], type] = {}
+
+
+def default_response_class() -> type:
+    """
+    Response class for the app: ORJSONResponse in fast mode
+    """
+    return ORJSONResponse if FAST_JSON else JSONResponse
+
+
+def schema_columns(model, schema: type) -> list:
+    """
+    The model columns behind each field of a response schema
+    Fields that aren't stored (like an event's occurrence_date) are
+    selected as NULL, so rows always have every field
+    """
+    return [getattr(model, name) if hasattr(model, name) else null().label(name)
+            for name in schema.model_fields]
+
+
+def list_columns(model, schema: type) -> Optional[list]:
+    """
+    Columns list endpoints should select as plain rows,
+    or None to load ORM objects (when FAST_JSON is off)
+    """
+    return schema_columns(model, schema) if FAST_JSON else None
+
+
+def fields_schema(schema: type, fields: Optional[str],
+                  always: Sequence[str] = ("id",)) -> Optional[type]:
+    """
+    Response schema with only the requested fields of a schema
+    - fields is a comma-separated list of field names (the fields= parameter)
+    - Fields in always (like the ID and the pagination sort key) are
+      included too, so items can still be identified and paged through
+    - Returns None when no fields were requested
+    - Raises a 400 error for unknown fields
+    """
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(schema.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. "
+                   f"Available: {', '.join(schema.model_fields)}"
+        )
+
+    key = (schema, frozenset(requested.union(always)))
+    projected = _field_schemas.get(key)
+    if projected is None:
+        # Keep the full schema's field order, types and validation rules
+        projected = _field_schemas[key] = create_model(
+            f"{schema.__name__}Fields",
+            __config__=schema.model_config,
+            **{name: (info.annotation, info)
+               for name, info in schema.model_fields.items() if name in key[1]}
+        )
+    return projected
+
+
+def render_list(schema: type, items: list) -> bytes:
+    """
+    Serialize a list of database results with a response schema
+    - Plain rows (from list_columns, or named tuples with the same
+      fields) are dumped directly with orjson
+    - ORM objects are validated and dumped by Pydantic
+    """
+    if orjson is not None and items and hasattr(items[0], "_asdict"):
+        return orjson.dumps([row._asdict() for row in items])
+
+    adapter = _list_adapters.get(schema)
+    if adapter is None:
+        adapter = _list_adapters[schema] = TypeAdapter(List[schema])
+    return adapter.dump_json(adapter.validate_python(items, from_attributes=True))
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the Church App backend
+Each module can be run from the backend folder, e.g.
+python -m benchmarks.sqlite_concurrency
+They work on temporary copies of the database, never on church_app.db itself.
+"""
@@ -0,0 +1,118 @@
+"""
+Shared helpers for the benchmarks
+This file sets up throwaway database copies and summarizes timings.
+"""
+
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from alembic import command
+from alembic.config import Config
+import sqlalchemy
+from sqlalchemy import create_engine
+
+from app import auth
+from app.database import get_connect_args
+
+# The benchmarks time database work: hash passwords at bcrypt's lowest cost
+# so hashing doesn't drown it out (and large datasets generate quickly)
+auth.pwd_context.update(bcrypt__rounds=4)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Database the benchmarks copy by default
+DEFAULT_DATABASE = os.path.join(BACKEND_DIR, "church_app.db")
+
+
+@contextmanager
+def temp_database(source: str = DEFAULT_DATABASE) -> Iterator[str]:
+    """
+    Copy a SQLite database into a temporary folder and yield its URL
+    The folder (including any -wal / -shm files) is removed afterwards.
+    """
+    folder = tempfile.mkdtemp(prefix="church_bench_")
+    path = os.path.join(folder, "bench.db")
+    try:
+        if source and os.path.exists(source):
+            shutil.copyfile(source, path)
+        yield f"sqlite:///{path}"
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def migrate(url: str):
+    """
+    Upgrade a database to the latest migration
+    """
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option(
+        "script_location", os.path.join(BACKEND_DIR, "migrations"))
+    engine = create_engine(url, connect_args=get_connect_args(url))
+    try:
+        with engine.begin() as connection:
+            config.attributes["connection"] = connection
+            command.upgrade(config, "head")
+    finally:
+        engine.dispose()
+
+
+def member_name(number: int) -> str:
+    """
+    A unique name for a generated member (names may only contain letters)
+    """
+    return "".join("abcdefghij"[int(digit)] for digit in str(number)).title()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of numbers (0 for an empty list)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """
+    Median and 99th percentile of a list of timings, in milliseconds
+    """
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+    }
+
+
+def write_report(path: str, report: dict):
+    """
+    Save a benchmark report as JSON
+    """
+    with open(path, "w") as output:
+        json.dump(report, output, indent=2, default=str)
+
+
+def report_metadata(settings: dict) -> dict:
+    """
+    Describe the run, so saved reports can be compared between commits
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "settings": settings,
+    }
@@ -0,0 +1,58 @@
+"""
+Benchmark Report Comparison
+This file compares two JSON reports saved by benchmarks.micro or
+benchmarks.load (e.g. from two commits) and shows how each number changed.
+
+Usage (from the backend folder):
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+
+import argparse
+import json
+
+# Metrics that get better when they go down; the rest get better going up
+LOWER_IS_BETTER = {"p50_ms", "p99_ms"}
+METRICS = ["p50_ms", "p99_ms", "ops_per_second", "requests_per_second"]
+
+
+def change(old: float, new: float) -> float:
+    """Percent change from old to new"""
+    return (new - old) / old * 100 if old else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="flag changes worse than this many percent")
+    args = parser.parse_args()
+
+    with open(args.before) as before_file, open(args.after) as after_file:
+        before = json.load(before_file)
+        after = json.load(after_file)
+    print(f"before: {before.get('commit')}  after: {after.get('commit')}")
+
+    regressions = 0
+    for name in sorted(set(before["results"]) | set(after["results"])):
+        old = before["results"].get(name)
+        new = after["results"].get(name)
+        if old is None or new is None:
+            print(f"{name}: only in {'after' if old is None else 'before'}")
+            continue
+        parts = []
+        for metric in METRICS:
+            if metric not in old or metric not in new:
+                continue
+            percent = change(old[metric], new[metric])
+            worse = -percent if metric not in LOWER_IS_BETTER else percent
+            flag = " !" if worse > args.threshold else ""
+            regressions += bool(flag)
+            parts.append(f"{metric} {old[metric]} -> {new[metric]} ({percent:+.1f}%){flag}")
+        print(f"{name}: " + ", ".join(parts))
+
+    print(f"{regressions} change(s) worse than {args.threshold}%")
+
+
+if __name__ == "__main__":
+    main()
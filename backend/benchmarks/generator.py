@@ -0,0 +1,253 @@
+"""
+Synthetic Congregation Generator
+This file builds realistic, repeatable datasets for the benchmarks:
+members with addresses, roles and birthdays, plus years of services,
+studies and special events. Everything goes through db_utils, and the same
+seed always produces the same data.
+
+Usage (from the backend folder):
+    python -m benchmarks.generator --users 10000 --years 5 --output bench.db
+"""
+
+import argparse
+import os
+import random
+import shutil
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import db_utils, models, schemas
+from app.database import create_db_engine
+from app.imports import ImportRow
+
+from .common import DEFAULT_DATABASE, migrate
+
+# Password given to every generated member
+MEMBER_PASSWORD = "benchmark-password"
+# Email of the generated admin, used by the load harness to sign in
+ADMIN_EMAIL = "admin@example.org"
+
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael",
+    "Linda", "David", "Elizabeth", "William", "Barbara", "Richard", "Susan",
+    "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Daniel",
+    "Grace", "Matthew", "Ruth", "Samuel", "Esther", "Paul", "Naomi", "Peter",
+    "Hannah", "Andrew", "Rebecca", "Timothy", "Lydia", "Stephen", "Miriam",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+    "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez",
+    "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark",
+    "Ramirez", "Lewis", "Robinson", "Walker", "Young", "Allen", "King",
+]
+STREETS = [
+    "Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake",
+    "Hill", "Church", "Park", "Sunset", "Highland", "Meadow", "River",
+]
+STREET_TYPES = ["Street", "Avenue", "Road", "Lane", "Drive", "Court"]
+CITIES = [
+    ("Springfield", "IL"), ("Riverside", "CA"), ("Fairview", "TX"),
+    ("Madison", "WI"), ("Georgetown", "KY"), ("Franklin", "TN"),
+    ("Clinton", "MS"), ("Greenville", "SC"), ("Salem", "OR"),
+    ("Bristol", "CT"), ("Dover", "DE"), ("Auburn", "AL"),
+]
+LOCATIONS = ["Main Hall", "Chapel", "Fellowship Hall", "Youth Room", "Park"]
+SPECIAL_EVENTS = [
+    "Community Outreach", "Youth Retreat", "Choir Concert", "Baptism Service",
+    "Marriage Workshop", "Food Drive", "Missions Night", "Prayer Breakfast",
+]
+
+
+def generate_members(count: int, seed: int = 42) -> Iterator[ImportRow]:
+    """
+    Generate member rows in the bulk import format
+    The first member is the admin, about 1 in 100 others are admins and
+    1 in 12 are guests.
+    """
+    rng = random.Random(seed)
+    this_year = date.today().year
+    for number in range(1, count + 1):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        city, state = rng.choice(CITIES)
+        roll = rng.random()
+        if number == 1 or roll < 0.01:
+            role = "admin"
+        elif roll < 0.09:
+            role = "guest"
+        else:
+            role = "member"
+        data = {
+            "email": ADMIN_EMAIL if number == 1
+            else f"{first}.{last}.{number}@example.org".lower(),
+            "password": MEMBER_PASSWORD,
+            "first_name": first,
+            "last_name": last,
+            "phone_number": f"+1{rng.randint(2000000000, 9999999999)}",
+            "address": f"{rng.randint(1, 9999)} {rng.choice(STREETS)} {rng.choice(STREET_TYPES)}",
+            "address2": f"Apt {rng.randint(1, 40)}{rng.choice('ABCD')}"
+            if rng.random() < 0.25 else None,
+            "city": city,
+            "state": state,
+            "role": role,
+            "date_of_birth": datetime(
+                this_year - rng.randint(1, 95), rng.randint(1, 12),
+                rng.randint(1, 28)).isoformat(),
+        }
+        yield ImportRow(line=number, data=data)
+
+
+def repeating_event(day: date, rng: random.Random) -> Optional[schemas.EventCreate]:
+    """
+    The weekly or monthly event on a day, if there is one
+    """
+    if day.weekday() == 6:
+        return schemas.EventCreate(
+            title="Sunday Service",
+            description="Weekly worship service and sermon",
+            event_date=datetime(day.year, day.month, day.day, 10),
+            location="Main Hall")
+    if day.weekday() == 2:
+        return schemas.EventCreate(
+            title="Bible Study",
+            description="Midweek Bible study and prayer",
+            event_date=datetime(day.year, day.month, day.day, 19),
+            location=rng.choice(LOCATIONS[:3]))
+    if day.weekday() == 5 and day.day <= 7:
+        return schemas.EventCreate(
+            title="Community Potluck",
+            description="Bring a dish to share",
+            event_date=datetime(day.year, day.month, day.day, 12),
+            location="Fellowship Hall")
+    return None
+
+
+def recurring_events(start: date, end: date, rng: random.Random) -> Iterator[schemas.EventCreate]:
+    """
+    The weekly and monthly events as recurring events from start to end
+    """
+    until = (end - timedelta(days=1)).strftime("%Y%m%d")
+    day = start
+    found = set()
+    # The first day each of them happens on gives its first occurrence
+    while len(found) < 3:
+        event = repeating_event(day, rng)
+        if event is not None and event.title not in found:
+            found.add(event.title)
+            rule = {"Sunday Service": "FREQ=WEEKLY;BYDAY=SU",
+                    "Bible Study": "FREQ=WEEKLY;BYDAY=WE",
+                    "Community Potluck": "FREQ=MONTHLY;BYDAY=1SA"}[event.title]
+            yield event.model_copy(update={"recurrence_rule": f"{rule};UNTIL={until}"})
+        day += timedelta(days=1)
+
+
+def generate_events(years: int, seed: int = 42, today: Optional[date] = None,
+                    recurring: bool = False) -> Iterator[schemas.EventCreate]:
+    """
+    Generate a church calendar covering the past years plus the next one
+    - Sunday service every week, Wednesday Bible study every week
+    - A potluck on the first Saturday of each month
+    - A handful of special events each year
+    With recurring, the weekly and monthly events are three recurring
+    events instead of one event per occurrence.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    start = today - timedelta(days=365 * years)
+    end = today + timedelta(days=365)
+
+    if recurring:
+        yield from recurring_events(start, end, rng)
+
+    day = start
+    while day < end:
+        event = None if recurring else repeating_event(day, rng)
+        if event is not None:
+            yield event
+        if rng.random() < 8 / 365:
+            yield schemas.EventCreate(
+                title=rng.choice(SPECIAL_EVENTS),
+                description="Special event",
+                event_date=datetime(day.year, day.month, day.day,
+                                    rng.randint(9, 19)),
+                location=rng.choice(LOCATIONS))
+        day += timedelta(days=1)
+
+
+def add_members(db: Session, count: int, seed: int = 42) -> int:
+    """
+    Import generated members, then mark about 1 in 10 as inactive
+    Returns how many were created.
+    """
+    report = db_utils.import_users(db, generate_members(count, seed))
+    db.execute(
+        update(models.User)
+        .where(models.User.email.like("%@example.org"))
+        .where(models.User.id % 10 == 7)
+        .values(is_active=False))
+    db.commit()
+    return report.imported
+
+
+def add_events(db: Session, years: int, seed: int = 42, recurring: bool = False) -> int:
+    """
+    Create the generated calendar one event at a time
+    Returns how many were created.
+    """
+    count = 0
+    for event in generate_events(years, seed, recurring=recurring):
+        db_utils.create_event(db, event)
+        count += 1
+    return count
+
+
+def build_dataset(url: str, users: int, years: int, seed: int = 42,
+                  recurring: bool = False) -> Dict[str, int]:
+    """
+    Migrate a database and fill it with a generated congregation
+    """
+    migrate(url)
+    engine = create_db_engine(url)
+    db = sessionmaker(autocommit=False, autoflush=False,
+                      expire_on_commit=False, bind=engine)()
+    try:
+        return {
+            "users": add_members(db, users, seed),
+            "events": add_events(db, years, seed, recurring),
+        }
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=10000,
+                        help="members to generate (10k to 1M is typical)")
+    parser.add_argument("--years", type=int, default=5,
+                        help="years of past events (plus one year ahead)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--recurring", action="store_true",
+                        help="store weekly/monthly events as recurring events")
+    parser.add_argument("--source", default=DEFAULT_DATABASE,
+                        help="database to start from (default: church_app.db)")
+    parser.add_argument("--output", required=True,
+                        help="path of the SQLite database to create")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        parser.error(f"{args.output} already exists")
+    shutil.copyfile(args.source, args.output)
+    counts = build_dataset(
+        f"sqlite:///{os.path.abspath(args.output)}", args.users, args.years, args.seed,
+        args.recurring)
+    print(f"Created {counts['users']} members and {counts['events']} events "
+          f"in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+JSON Serialization Benchmark
+This file compares the two ways list pages can be serialized:
+- "pydantic": ORM objects validated through the response schema and
+  dumped by Pydantic (the default)
+- "fast": plain rows with only the schema's columns, dumped by orjson
+  (what list endpoints do with FAST_JSON=1)
+Each page is loaded and serialized the way the endpoints do it, and the
+report shows latency and peak memory per page.
+
+Usage (from the backend folder):
+    python -m benchmarks.json_serialization --pages 200 --page-size 100
+"""
+
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from sqlalchemy.orm import sessionmaker
+
+from app import db_utils, models, schemas
+from app.database import create_db_engine
+from app.serialization import render_list, schema_columns
+
+from .common import (DEFAULT_DATABASE, latency_summary, migrate, temp_database,
+                     write_report)
+from .generator import add_events, add_members
+
+
+def measure(Session, pages: int, load_page: Callable, schema: type) -> Dict:
+    """
+    Load and serialize pages, first timed, then again under tracemalloc
+    """
+    timings: List[float] = []
+    for page in range(pages):
+        db = Session()
+        try:
+            started = time.perf_counter()
+            render_list(schema, load_page(db, page))
+            timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+
+    # Memory is measured in a separate pass, tracing slows everything down
+    peaks: List[int] = []
+    for page in range(pages):
+        db = Session()
+        try:
+            tracemalloc.start()
+            body = render_list(schema, load_page(db, page))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        finally:
+            db.close()
+
+    return {
+        **latency_summary(timings),
+        "peak_kib_per_page": round(sum(peaks) / pages / 1024, 1),
+        "body_bytes": len(body),
+    }
+
+
+def run(source: str, members: int, years: int, pages: int, page_size: int) -> List[Dict]:
+    """
+    Measure both paths for users and events on a seeded database copy
+    """
+    with temp_database(source) as url:
+        migrate(url)
+        engine = create_db_engine(url)
+        Session = sessionmaker(
+            autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+        db = Session()
+        add_members(db, members)
+        events = add_events(db, years)
+        db.close()
+
+        user_pages = max(1, members // page_size)
+        event_pages = max(1, events // page_size)
+        user_columns = schema_columns(models.User, schemas.User)
+        event_columns = schema_columns(models.Event, schemas.Event)
+
+        def users(columns):
+            return lambda db, page: db_utils.get_users(
+                db, skip=(page % user_pages) * page_size, limit=page_size,
+                columns=columns)
+
+        def events_page(columns):
+            return lambda db, page: db_utils.get_events(
+                db, skip=(page % event_pages) * page_size, limit=page_size,
+                columns=columns)
+
+        cases = [
+            ("users", "pydantic", users(None), schemas.User),
+            ("users", "fast", users(user_columns), schemas.User),
+            ("events", "pydantic", events_page(None), schemas.Event),
+            ("events", "fast", events_page(event_columns), schemas.Event),
+        ]
+        results = [
+            {"list": name, "path": path, **measure(Session, pages, load_page, schema)}
+            for name, path, load_page, schema in cases
+        ]
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--db", default=DEFAULT_DATABASE,
+                        help="SQLite database to copy (default: church_app.db)")
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--years", type=int, default=10,
+                        help="years of generated events")
+    parser.add_argument("--pages", type=int, default=200,
+                        help="pages loaded per case")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--output", help="also save the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.db, args.members, args.years, args.pages, args.page_size)
+    print(f"{'list':<8}{'path':<10}{'p50 ms':>9}{'p99 ms':>9}{'peak KiB':>10}")
+    for result in results:
+        print(f"{result['list']:<8}{result['path']:<10}"
+              f"{result['p50_ms']:>9}{result['p99_ms']:>9}"
+              f"{result['peak_kib_per_page']:>10}")
+    if args.output:
+        write_report(args.output, {"settings": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
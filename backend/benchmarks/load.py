@@ -0,0 +1,246 @@
+"""
+HTTP Load Harness
+This file runs the FastAPI app in-process (through httpx's ASGI transport,
+so no server or network is involved) against a generated congregation and
+reports p50/p99 latency and requests per second for every endpoint.
+Results are saved as JSON (compare two runs with python -m benchmarks.compare).
+
+Usage (from the backend folder):
+    python -m benchmarks.load --users 10000 --requests 500 --concurrency 16
+    python -m benchmarks.load --env DATABASE_MODE=async FAST_JSON=1
+
+The app reads its settings (DATABASE_URL, DATABASE_MODE, FAST_JSON, ...)
+when it's imported, so nothing from app is imported at the top of this file.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+
+class Scenario(NamedTuple):
+    """One endpoint to load, and how to build each request"""
+    name: str
+    # Gets the request number and returns (method, url, json body)
+    request: Callable[[int], tuple]
+    # Fraction of --requests to send (heavy endpoints send fewer)
+    share: float = 1.0
+
+
+class Fixture:
+    """Data the scenarios pick their arguments from"""
+
+    def __init__(self, seed: int):
+        from app import auth, models
+        from app.database import SessionLocal
+        from app.pagination import encode_cursor
+
+        from .generator import ADMIN_EMAIL, MEMBER_PASSWORD
+
+        self.rng = random.Random(seed)
+        self.encode_cursor = encode_cursor
+        db = SessionLocal()
+        try:
+            admin = db.query(models.User).filter(
+                models.User.email == ADMIN_EMAIL).one()
+            self.admin_email = ADMIN_EMAIL
+            self.password = MEMBER_PASSWORD
+            self.headers = {
+                "Authorization": f"Bearer {auth.create_access_token(admin)}"}
+            self.user_ids = [row.id for row in db.query(models.User.id)]
+            self.event_ids = [row.id for row in db.query(models.Event.id)]
+            self.event_keys = [
+                (row.event_date.isoformat(), row.id)
+                for row in db.query(models.Event.event_date, models.Event.id)]
+            # Every check-in goes to one event, like a Sunday rush
+            self.check_in_event_id = self.rng.choice([
+                row.id for row in db.query(models.Event.id).filter(
+                    models.Event.recurrence_rule.is_(None))])
+        finally:
+            db.close()
+        self.created_user_ids: List[int] = []
+
+
+def scenarios(fx: Fixture) -> List[Scenario]:
+    """
+    Every endpoint, reads first, then writes, then deletes
+    """
+    rng = fx.rng
+    today = datetime.utcnow().replace(microsecond=0)
+
+    def window(_):
+        start = today - timedelta(days=rng.randint(0, 365 * 3))
+        end = start + timedelta(days=30)
+        return ("GET", f"/events/?from={start.isoformat()}&to={end.isoformat()}", None)
+
+    def new_user(number):
+        letters = "".join("abcdefghij"[int(digit)] for digit in str(number))
+        return ("POST", "/users/", {
+            "email": f"load{number}.{rng.randint(0, 10**9)}@example.com",
+            "password": "password", "first_name": "Load",
+            "last_name": letters.title()})
+
+    def delete_user(_):
+        user_id = (fx.created_user_ids.pop() if fx.created_user_ids
+                   else rng.choice(fx.user_ids))
+        return ("DELETE", f"/users/{user_id}", None)
+
+    return [
+        Scenario("GET /", lambda _: ("GET", "/", None)),
+        Scenario("GET /health", lambda _: ("GET", "/health", None)),
+        Scenario("POST /auth/login", lambda _: ("POST", "/auth/login", {
+            "email": fx.admin_email, "password": fx.password})),
+        Scenario("GET /auth/me", lambda _: ("GET", "/auth/me", None)),
+        Scenario("GET /users/", lambda _: ("GET", "/users/", None)),
+        Scenario("GET /users/ (offset)", lambda _: (
+            "GET", f"/users/?skip={rng.randint(0, len(fx.user_ids))}&limit=100", None)),
+        Scenario("GET /users/ (cursor)", lambda _: (
+            "GET", f"/users/?cursor={fx.encode_cursor(rng.choice(fx.user_ids))}", None)),
+        Scenario("GET /users/ (filters)", lambda _: (
+            "GET", "/users/?role=member&is_active=true&city="
+            + rng.choice(["Springfield", "Salem", "Dover"]), None)),
+        Scenario("GET /users/ (search)", lambda _: (
+            "GET", "/users/?q=" + rng.choice(["john", "mary smith", "riverside"]), None)),
+        Scenario("GET /users/{id}", lambda _: (
+            "GET", f"/users/{rng.choice(fx.user_ids)}", None)),
+        Scenario("GET /users/export", lambda _: (
+            "GET", "/users/export?format=" + rng.choice(["ndjson", "csv"]), None),
+            share=0.02),
+        Scenario("GET /events/", lambda _: ("GET", "/events/", None)),
+        Scenario("GET /events/ (cursor)", lambda _: (
+            "GET", f"/events/?cursor={fx.encode_cursor(*rng.choice(fx.event_keys))}", None)),
+        Scenario("GET /events/ (window)", window),
+        Scenario("GET /events/upcoming", lambda _: ("GET", "/events/upcoming", None)),
+        Scenario("GET /events/{id}", lambda _: (
+            "GET", f"/events/{rng.choice(fx.event_ids)}", None)),
+        Scenario("GET /events/export", lambda _: ("GET", "/events/export", None),
+                 share=0.1),
+        Scenario("POST /users/", new_user),
+        Scenario("PUT /users/{id}", lambda _: (
+            "PUT", f"/users/{rng.choice(fx.user_ids)}",
+            {"city": rng.choice(["Springfield", "Salem", "Dover"])})),
+        Scenario("POST /events/", lambda number: ("POST", "/events/", {
+            "title": "Load Test Event", "description": "Generated by the load harness",
+            "event_date": (today + timedelta(days=rng.randint(1, 365))).isoformat(),
+            "location": "Chapel"})),
+        Scenario("POST /events/{id}/check-in", lambda _: (
+            "POST", f"/events/{fx.check_in_event_id}/check-in"
+            f"?user_id={rng.choice(fx.user_ids)}", None)),
+        Scenario("GET /events/{id}/attendance", lambda _: (
+            "GET", f"/events/{fx.check_in_event_id}/attendance", None)),
+        Scenario("DELETE /users/{id}", delete_user),
+    ]
+
+
+async def run_scenario(client: httpx.AsyncClient, fx: Fixture, scenario: Scenario,
+                       requests: int, concurrency: int) -> Dict:
+    """
+    Send a scenario's requests from several concurrent workers
+    """
+    from .common import latency_summary
+
+    timings: List[float] = []
+    statuses: Counter = Counter()
+    numbers = iter(range(requests))
+
+    async def worker():
+        for number in numbers:
+            method, url, body = scenario.request(number)
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body, headers=fx.headers)
+            timings.append(time.perf_counter() - started)
+            statuses[str(response.status_code)] += 1
+            if scenario.name == "POST /users/" and response.status_code == 201:
+                fx.created_user_ids.append(response.json()["id"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "requests_per_second": round(requests / elapsed, 1),
+        **latency_summary(timings),
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+async def run_load(requests: int, concurrency: int, seed: int,
+                   only: List[str]) -> Dict[str, Dict]:
+    """
+    Run every scenario against the app, one after another
+    """
+    from app import attendance
+    from app.main import app
+
+    fx = Fixture(seed)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in scenarios(fx):
+            if only and not any(scenario.name.startswith(prefix) for prefix in only):
+                continue
+            count = max(1, int(requests * scenario.share))
+            results[scenario.name] = await run_scenario(
+                client, fx, scenario, count, min(concurrency, count))
+    # The transport doesn't run the app's shutdown handlers, so write the
+    # buffered check-ins while the temporary database still exists
+    attendance.buffer.stop()
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--source", default=None,
+                        help="SQLite database to copy (default: church_app.db)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=500,
+                        help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--env", nargs="*", default=[], metavar="NAME=VALUE",
+                        help="app settings for this run, e.g. FAST_JSON=1")
+    parser.add_argument("--only", nargs="*", default=[],
+                        help="only run endpoints starting with these names, e.g. 'GET /users'")
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args(argv)
+
+    # Point the app at a fresh database before anything imports it
+    folder = tempfile.mkdtemp(prefix="church_load_")
+    path = os.path.join(folder, "load.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    for setting in args.env:
+        name, _, value = setting.partition("=")
+        os.environ[name] = value
+
+    try:
+        from .common import DEFAULT_DATABASE, report_metadata, write_report
+        from .generator import build_dataset
+
+        shutil.copyfile(args.source or DEFAULT_DATABASE, path)
+        counts = build_dataset(os.environ["DATABASE_URL"], args.users, args.years, args.seed)
+        results = asyncio.run(run_load(
+            args.requests, args.concurrency, args.seed, args.only))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"{'endpoint':<28}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}  statuses")
+    for name, result in results.items():
+        print(f"{name:<28}{result['requests_per_second']:>9}"
+              f"{result['p50_ms']:>9}{result['p99_ms']:>9}  {result['statuses']}")
+    if args.output:
+        write_report(args.output, {
+            **report_metadata(vars(args)), "dataset": counts, "results": results})
+
+
+if __name__ == "__main__":
+    main()
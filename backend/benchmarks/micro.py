@@ -0,0 +1,207 @@
+"""
+db_utils Micro-Benchmarks
+This file times every function in db_utils on a generated congregation,
+one session per call like the endpoints use, and saves the results as JSON
+(compare two runs with python -m benchmarks.compare).
+
+Usage (from the backend folder):
+    python -m benchmarks.micro --users 10000 --years 5 --output micro.json
+"""
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy.orm import sessionmaker
+
+from app import db_utils, models, schemas
+from app.database import create_db_engine
+from app.imports import ImportRow
+
+from .common import (DEFAULT_DATABASE, latency_summary, member_name,
+                     report_metadata, temp_database, write_report)
+from .generator import build_dataset
+
+
+class Context:
+    """Data the benchmark cases pick their arguments from"""
+
+    def __init__(self, db, seed: int):
+        self.rng = random.Random(seed)
+        users = db.query(models.User.id, models.User.email).all()
+        self.user_ids = [user.id for user in users]
+        self.emails = [user.email for user in users]
+        events = db.query(models.Event.id, models.Event.event_date).all()
+        self.event_ids = [event.id for event in events]
+        self.event_keys = [(event.event_date, event.id) for event in events]
+        self.first_event = min(event.event_date for event in events)
+        self.created_user_ids: List[int] = []
+        self.counter = 0
+
+    def next_number(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    def new_user(self) -> schemas.UserCreate:
+        number = self.next_number()
+        return schemas.UserCreate(
+            email=f"micro{number}@example.com", password="password",
+            first_name="Micro", last_name=member_name(number))
+
+    def import_rows(self, count: int):
+        for _ in range(count):
+            number = self.next_number()
+            yield ImportRow(line=number, data={
+                "email": f"micro{number}@example.com", "password": "password",
+                "first_name": "Micro", "last_name": member_name(number)})
+
+    def sync_position(self) -> db_utils.SyncPosition:
+        synced_at = datetime.utcnow() - timedelta(minutes=1)
+        return db_utils.SyncPosition(synced_at, 0, synced_at, 0, 0)
+
+    def window(self):
+        start = self.first_event + timedelta(days=self.rng.randint(0, 365))
+        return start, start + timedelta(days=30)
+
+
+def cases(ctx: Context) -> Dict[str, Callable]:
+    """
+    One callable per benchmark case, each taking a session
+    """
+    rng = ctx.rng
+    return {
+        "get_user_by_email": lambda db: db_utils.get_user_by_email(
+            db, rng.choice(ctx.emails)),
+        "get_user_by_id": lambda db: db_utils.get_user_by_id(
+            db, rng.choice(ctx.user_ids)),
+        "get_users.offset": lambda db: db_utils.get_users(
+            db, skip=rng.randint(0, max(0, len(ctx.user_ids) - 100)), limit=100),
+        "get_users.keyset": lambda db: db_utils.get_users(
+            db, limit=100, after_id=rng.choice(ctx.user_ids)),
+        "get_users.role_active": lambda db: db_utils.get_users(
+            db, limit=100, role=models.UserRole.MEMBER, is_active=True,
+            after_id=rng.choice(ctx.user_ids)),
+        "get_users.city": lambda db: db_utils.get_users(
+            db, limit=100, city="Springfield"),
+        "get_users.search": lambda db: db_utils.get_users(
+            db, limit=100, q=rng.choice(["john smith", "mar", "riverside"])),
+        "get_users.include_archived": lambda db: db_utils.get_users(
+            db, limit=100, after_id=rng.choice(ctx.user_ids), include_archived=True),
+        "get_table_version.users": lambda db: db_utils.get_table_version(
+            db, models.User),
+        "get_table_version.events": lambda db: db_utils.get_table_version(
+            db, models.Event),
+        "count_users.counters": lambda db: db_utils.count_users(
+            db, role=models.UserRole.MEMBER, is_active=True),
+        "count_users.city": lambda db: db_utils.count_users(
+            db, city=rng.choice(["Springfield", "Salem", "Dover"])),
+        "get_celebrations": lambda db: db_utils.get_celebrations(
+            db, date.today() + timedelta(days=rng.randint(0, 364)), 7),
+        # A client that synced a minute ago: cost follows what changed since
+        "get_changes.recent": lambda db: db_utils.get_changes(
+            db, ctx.sync_position()),
+        "create_user": lambda db: ctx.created_user_ids.append(
+            db_utils.create_user(db, ctx.new_user()).id),
+        "import_users.100": lambda db: db_utils.import_users(
+            db, ctx.import_rows(100)),
+        "update_user": lambda db: db_utils.update_user(
+            db, rng.choice(ctx.user_ids), schemas.UserUpdate(
+                city=rng.choice(["Springfield", "Salem", "Dover"]))),
+        "delete_user": lambda db: db_utils.delete_user(
+            db, ctx.created_user_ids.pop()) if ctx.created_user_ids else None,
+        "create_event": lambda db: db_utils.create_event(db, schemas.EventCreate(
+            title="Micro Event", description="Benchmark",
+            event_date=datetime.utcnow() + timedelta(days=rng.randint(1, 365)),
+            location="Chapel")),
+        "get_event_by_id": lambda db: db_utils.get_event_by_id(
+            db, rng.choice(ctx.event_ids)),
+        "get_events.offset": lambda db: db_utils.get_events(
+            db, skip=rng.randint(0, max(0, len(ctx.event_ids) - 100)), limit=100),
+        "get_events.keyset": lambda db: db_utils.get_events(
+            db, limit=100, after=rng.choice(ctx.event_keys)),
+        "get_events.window": lambda db: db_utils.get_events(
+            db, limit=100, **dict(zip(("start", "end"), ctx.window()))),
+        "get_events.include_archived": lambda db: db_utils.get_events(
+            db, limit=100, include_archived=True, **dict(zip(("start", "end"), ctx.window()))),
+        "get_upcoming_events": lambda db: db_utils.get_upcoming_events(db),
+        "count_events.window": lambda db: db_utils.count_events(
+            db, **dict(zip(("start", "end"), ctx.window()))),
+    }
+
+
+def run_case(Session, call: Callable, iterations: int) -> Dict:
+    """
+    Call a case repeatedly, each time in a new session
+    """
+    timings: List[float] = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        db = Session()
+        try:
+            begin = time.perf_counter()
+            call(db)
+            timings.append(time.perf_counter() - begin)
+        finally:
+            db.close()
+    elapsed = time.perf_counter() - started
+    return {
+        "calls": iterations,
+        "ops_per_second": round(iterations / elapsed, 1),
+        **latency_summary(timings),
+    }
+
+
+def run(source: str, users: int, years: int, iterations: int, seed: int,
+        only: List[str]) -> Dict[str, Dict]:
+    """
+    Build a dataset on a database copy and time every case
+    """
+    with temp_database(source) as url:
+        build_dataset(url, users, years, seed)
+        engine = create_db_engine(url)
+        Session = sessionmaker(
+            autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+        db = Session()
+        ctx = Context(db, seed)
+        db.close()
+
+        results = {}
+        for name, call in cases(ctx).items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            # Bulk imports are much heavier than single calls
+            count = max(1, iterations // 20) if name.startswith("import_") else iterations
+            results[name] = run_case(Session, call, count)
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--db", default=DEFAULT_DATABASE,
+                        help="SQLite database to copy (default: church_app.db)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=200,
+                        help="calls per case")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="*", default=[],
+                        help="only run cases starting with these names")
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.db, args.users, args.years, args.iterations,
+                  args.seed, args.only)
+    print(f"{'function':<28}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<28}{result['ops_per_second']:>10}"
+              f"{result['p50_ms']:>10}{result['p99_ms']:>10}")
+    if args.output:
+        write_report(args.output, {
+            **report_metadata(vars(args)), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+SQLite Concurrency Benchmark
+This file runs mixed concurrent reads and writes against a copy of
+church_app.db, once per SQLite profile, and reports throughput and latency.
+
+Usage (from the backend folder):
+    python -m benchmarks.sqlite_concurrency
+    python -m benchmarks.sqlite_concurrency --readers 16 --writers 4 --duration 10
+"""
+
+import argparse
+import random
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import db_utils, models, schemas
+from app.database import create_db_engine
+
+from .common import (DEFAULT_DATABASE, latency_summary, migrate, temp_database,
+                     write_report)
+from .generator import add_members
+
+PROFILES = ["default", "production"]
+
+
+def _reader(Session, user_ids: List[int], deadline: float, timings: list, errors: list):
+    """Run list and detail queries like the app screens do"""
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        db = Session()
+        try:
+            choice = rng.random()
+            if choice < 0.4:
+                db_utils.get_user_by_id(db, rng.choice(user_ids))
+            elif choice < 0.8:
+                db_utils.get_users(
+                    db, limit=20, after_id=rng.choice(user_ids), is_active=True)
+            else:
+                db_utils.get_events(db, limit=20)
+            timings.append(time.perf_counter() - started)
+        except OperationalError as error:
+            errors.append(str(error.orig))
+        finally:
+            db.close()
+
+
+def _writer(Session, user_ids: List[int], deadline: float, timings: list, errors: list):
+    """Update member profiles, one commit per update"""
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        db = Session()
+        try:
+            db_utils.update_user(db, rng.choice(user_ids), schemas.UserUpdate(
+                phone_number=f"+1555{rng.randint(0, 9999999):07d}"))
+            timings.append(time.perf_counter() - started)
+        except OperationalError as error:
+            db.rollback()
+            errors.append(str(error.orig))
+        finally:
+            db.close()
+
+
+def run_profile(source: str, profile: str, members: int, readers: int,
+                writers: int, duration: float) -> Dict:
+    """
+    Benchmark one profile on a fresh copy of the database
+    """
+    with temp_database(source) as url:
+        migrate(url)
+        engine = create_db_engine(url, profile)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = Session()
+        add_members(db, members)
+        user_ids = [user_id for (user_id,) in db.query(models.User.id)]
+        db.close()
+
+        read_timings: list = []
+        write_timings: list = []
+        errors: list = []
+        deadline = time.perf_counter() + duration
+        threads = [
+            threading.Thread(target=_reader, args=(
+                Session, user_ids, deadline, read_timings, errors))
+            for _ in range(readers)
+        ] + [
+            threading.Thread(target=_writer, args=(
+                Session, user_ids, deadline, write_timings, errors))
+            for _ in range(writers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        engine.dispose()
+
+    return {
+        "profile": profile,
+        "reads_per_second": round(len(read_timings) / elapsed, 1),
+        "writes_per_second": round(len(write_timings) / elapsed, 1),
+        "reads": {"count": len(read_timings), **latency_summary(read_timings)},
+        "writes": {"count": len(write_timings), **latency_summary(write_timings)},
+        "errors": len(errors),
+        "sample_error": errors[0] if errors else None,
+    }
+
+
+def print_results(results: List[Dict]):
+    """Print the results as a small table"""
+    print(f"{'profile':<12}{'reads/s':>10}{'writes/s':>10}"
+          f"{'read p50':>10}{'read p99':>10}{'write p50':>11}{'write p99':>11}{'errors':>8}")
+    for result in results:
+        print(f"{result['profile']:<12}"
+              f"{result['reads_per_second']:>10}{result['writes_per_second']:>10}"
+              f"{result['reads']['p50_ms']:>10}{result['reads']['p99_ms']:>10}"
+              f"{result['writes']['p50_ms']:>11}{result['writes']['p99_ms']:>11}"
+              f"{result['errors']:>8}")
+    print("(latencies in milliseconds)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--db", default=DEFAULT_DATABASE,
+                        help="SQLite database to copy (default: church_app.db)")
+    parser.add_argument("--members", type=int, default=5000,
+                        help="generated members added to the copy")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="seconds to run each profile")
+    parser.add_argument("--profiles", nargs="+", default=PROFILES,
+                        choices=PROFILES)
+    parser.add_argument("--output", help="also save the results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        run_profile(args.db, profile, args.members, args.readers,
+                    args.writers, args.duration)
+        for profile in args.profiles
+    ]
+    print_results(results)
+    if args.output:
+        write_report(args.output, {"settings": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
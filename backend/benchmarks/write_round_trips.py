@@ -0,0 +1,148 @@
+"""
+Write Round-Trip Benchmark
+This file compares the old write paths (look up, write, then refresh)
+with the INSERT/UPDATE ... RETURNING ones in db_utils, counting the SQL
+statements each write sends and timing them on a copy of church_app.db.
+
+Usage (from the backend folder):
+    python -m benchmarks.write_round_trips --writes 500
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy.orm import sessionmaker
+
+from app import db_utils, models, schemas
+from app.database import create_db_engine
+from app.query_plans import capture_statements
+
+from .common import (DEFAULT_DATABASE, latency_summary, member_name,
+                     migrate, temp_database, write_report)
+
+
+def legacy_create_user(db, user: schemas.UserCreate):
+    """The old create path: duplicate check, insert, then refresh"""
+    if db_utils.get_user_by_email(db, user.email):
+        return None
+    db_user = models.User(**db_utils.user_values(user))
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
+def legacy_update_user(db, user_id: int, user_update: schemas.UserUpdate):
+    """The old update path: load, change attributes, commit, then refresh"""
+    db_user = db_utils.get_user_by_id(db, user_id)
+    if db_user is None:
+        return None
+    for field, value in user_update.model_dump(exclude_unset=True).items():
+        setattr(db_user, field, value)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
+def legacy_create_event(db, event: schemas.EventCreate):
+    """The old event create path: insert, then refresh"""
+    db_event = models.Event(**event.model_dump())
+    db.add(db_event)
+    db.commit()
+    db.refresh(db_event)
+    return db_event
+
+
+def measure(engine, Session, writes: int, write: Callable) -> Dict:
+    """
+    Run a write function repeatedly, each in a new session,
+    and report statements per write and latency
+    """
+    timings: List[float] = []
+    with capture_statements(engine) as statements:
+        for number in range(writes):
+            db = Session()
+            try:
+                started = time.perf_counter()
+                write(db, number)
+                timings.append(time.perf_counter() - started)
+            finally:
+                db.close()
+    return {
+        "statements_per_write": round(len(statements) / writes, 2),
+        **latency_summary(timings),
+    }
+
+
+def new_user(prefix: str, number: int) -> schemas.UserCreate:
+    return schemas.UserCreate(
+        email=f"{prefix}{number}@example.com", password="password",
+        first_name="Bench", last_name=member_name(number))
+
+
+def new_event(number: int) -> schemas.EventCreate:
+    return schemas.EventCreate(
+        title=f"Event {number}", description="Benchmark event",
+        event_date=datetime(2030, 1, 1) + timedelta(days=number),
+        location="Main Hall")
+
+
+def run(source: str, writes: int) -> List[Dict]:
+    """
+    Measure every write path, old and new, on a fresh database copy
+    """
+    with temp_database(source) as url:
+        migrate(url)
+        engine = create_db_engine(url)
+        Session = sessionmaker(
+            autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+        def update(function):
+            def write(db, number):
+                function(db, (number % writes) + 1, schemas.UserUpdate(
+                    city=f"City {number}"))
+            return write
+
+        cases = [
+            ("create_user", "legacy",
+             lambda db, n: legacy_create_user(db, new_user("legacy", n))),
+            ("create_user", "returning",
+             lambda db, n: db_utils.create_user(db, new_user("returning", n))),
+            ("update_user", "legacy", update(legacy_update_user)),
+            ("update_user", "returning", update(db_utils.update_user)),
+            ("create_event", "legacy",
+             lambda db, n: legacy_create_event(db, new_event(n))),
+            ("create_event", "returning",
+             lambda db, n: db_utils.create_event(db, new_event(n))),
+        ]
+        results = [
+            {"write": name, "path": path, **measure(engine, Session, writes, write)}
+            for name, path, write in cases
+        ]
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--db", default=DEFAULT_DATABASE,
+                        help="SQLite database to copy (default: church_app.db)")
+    parser.add_argument("--writes", type=int, default=500,
+                        help="writes per case")
+    parser.add_argument("--output", help="also save the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.db, args.writes)
+    print(f"{'write':<14}{'path':<11}{'statements':>11}{'p50 ms':>9}{'p99 ms':>9}")
+    for result in results:
+        print(f"{result['write']:<14}{result['path']:<11}"
+              f"{result['statements_per_write']:>11}"
+              f"{result['p50_ms']:>9}{result['p99_ms']:>9}")
+    if args.output:
+        write_report(args.output, {"settings": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
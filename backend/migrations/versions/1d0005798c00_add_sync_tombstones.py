@@ -0,0 +1,49 @@
+"""Add sync tombstones
+
+Revision ID: 1d0005798c00
+Revises: 2c0bdc9a1098
+Create Date: 2026-10-18 07:52:25.637659
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d0005798c00'
+down_revision: Union[str, None] = '2c0bdc9a1098'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # /sync relies on every row having updated_at
+    for table in ('users', 'events'):
+        op.execute(f"UPDATE {table} SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+                   "WHERE updated_at IS NULL")
+
+    # (updated_at, id) replaces the updated_at indexes: it still serves
+    # max(updated_at), and /sync pages through changes in that order
+    op.create_index('ix_users_updated_at_id', 'users', ['updated_at', 'id'])
+    op.create_index('ix_events_updated_at_id', 'events', ['updated_at', 'id'])
+    op.drop_index('ix_users_updated_at', table_name='users')
+    op.drop_index('ix_events_updated_at', table_name='events')
+
+
+def downgrade() -> None:
+    op.create_index('ix_events_updated_at', 'events', ['updated_at'])
+    op.create_index('ix_users_updated_at', 'users', ['updated_at'])
+    op.drop_index('ix_events_updated_at_id', table_name='events')
+    op.drop_index('ix_users_updated_at_id', table_name='users')
+    op.drop_table('tombstones')
@@ -0,0 +1,48 @@
+"""Add celebration month days
+
+Revision ID: 2c0bdc9a1098
+Revises: 7d004b355c7a
+Create Date: 2026-10-18 07:40:08.892736
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c0bdc9a1098'
+down_revision: Union[str, None] = '7d004b355c7a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# month * 100 + day of a datetime column, for the backfill
+MONTH_DAY_SQL = {
+    "sqlite": "CAST(strftime('%m%d', {column}) AS INTEGER)",
+    "postgresql": "CAST(EXTRACT(MONTH FROM {column}) * 100 + EXTRACT(DAY FROM {column}) AS INTEGER)",
+}
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('birthday_md', sa.Integer(), nullable=True))
+    op.add_column('users', sa.Column('anniversary_md', sa.Integer(), nullable=True))
+
+    # Fill them in for the existing members
+    month_day = MONTH_DAY_SQL[op.get_bind().dialect.name]
+    op.execute(
+        f"UPDATE users SET birthday_md = {month_day.format(column='date_of_birth')}, "
+        f"anniversary_md = {month_day.format(column='join_date')}"
+    )
+
+    # Upcoming birthdays / anniversaries of active members
+    op.create_index('ix_users_is_active_birthday_md', 'users', ['is_active', 'birthday_md'])
+    op.create_index('ix_users_is_active_anniversary_md', 'users', ['is_active', 'anniversary_md'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_is_active_anniversary_md', table_name='users')
+    op.drop_index('ix_users_is_active_birthday_md', table_name='users')
+    op.drop_column('users', 'anniversary_md')
+    op.drop_column('users', 'birthday_md')
@@ -0,0 +1,57 @@
+"""Add recurring events
+
+Revision ID: 3908f76dee33
+Revises: 4186f78d4b63
+Create Date: 2026-10-18 07:32:38.723616
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3908f76dee33'
+down_revision: Union[str, None] = '4186f78d4b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Repeating events are one row with a rule, expanded when listed
+    op.add_column('events', sa.Column('recurrence_rule', sa.String(), nullable=True))
+    op.add_column('events', sa.Column('recurrence_until', sa.DateTime(), nullable=True))
+    op.create_index('ix_events_series_event_date', 'events', ['event_date'],
+                    sqlite_where=sa.text('recurrence_rule IS NOT NULL'),
+                    postgresql_where=sa.text('recurrence_rule IS NOT NULL'))
+
+    # Cancelled or changed occurrences of a repeating event
+    op.create_table(
+        'event_exceptions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('occurrence_date', sa.DateTime(), nullable=False),
+        sa.Column('cancelled', sa.Boolean(), nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('event_date', sa.DateTime(), nullable=True),
+        sa.Column('location', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['event_id'], ['events.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_event_exceptions_event_id_occurrence_date', 'event_exceptions',
+                    ['event_id', 'occurrence_date'], unique=True)
+    op.create_index('ix_event_exceptions_event_id_event_date', 'event_exceptions',
+                    ['event_id', 'event_date'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_event_exceptions_event_id_event_date', table_name='event_exceptions')
+    op.drop_index('ix_event_exceptions_event_id_occurrence_date', table_name='event_exceptions')
+    op.drop_table('event_exceptions')
+    op.drop_index('ix_events_series_event_date', table_name='events')
+    op.drop_column('events', 'recurrence_until')
+    op.drop_column('events', 'recurrence_rule')
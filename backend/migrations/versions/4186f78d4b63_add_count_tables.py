@@ -0,0 +1,169 @@
+"""Add count tables
+
+Revision ID: 4186f78d4b63
+Revises: c428010ff26d
+Create Date: 2026-10-18 07:26:55.430576
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4186f78d4b63'
+down_revision: Union[str, None] = 'c428010ff26d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Matches the users.role column (enum names are stored)
+ROLE_TYPE = sa.Enum("ADMIN", "MEMBER", "GUEST", name="userrole").with_variant(
+    postgresql.ENUM("ADMIN", "MEMBER", "GUEST", name="userrole", create_type=False),
+    "postgresql")
+
+# Adds one to the counter row for a user's role / active status
+# (the WHERE is needed for SQLite to parse INSERT ... SELECT ... ON CONFLICT)
+SQLITE_ADD_USER = (
+    "INSERT INTO user_counts(role, is_active, n) "
+    "SELECT new.role, new.is_active, 1 "
+    "WHERE new.role IS NOT NULL AND new.is_active IS NOT NULL "
+    "ON CONFLICT(role, is_active) DO UPDATE SET n = n + 1;"
+)
+SQLITE_REMOVE_USER = (
+    "UPDATE user_counts SET n = n - 1 "
+    "WHERE role = old.role AND is_active = old.is_active;"
+)
+
+POSTGRES_FUNCTIONS = """
+CREATE FUNCTION users_count_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE table_counts SET n = n + 1 WHERE table_name = 'users';
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE table_counts SET n = n - 1 WHERE table_name = 'users';
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE user_counts SET n = n - 1
+        WHERE role = OLD.role AND is_active = OLD.is_active;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE')
+            AND NEW.role IS NOT NULL AND NEW.is_active IS NOT NULL THEN
+        INSERT INTO user_counts(role, is_active, n)
+        VALUES (NEW.role, NEW.is_active, 1)
+        ON CONFLICT (role, is_active) DO UPDATE SET n = user_counts.n + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION events_count_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE table_counts SET n = n + 1 WHERE table_name = 'events';
+    ELSE
+        UPDATE table_counts SET n = n - 1 WHERE table_name = 'events';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    op.create_table(
+        "user_counts",
+        sa.Column("role", ROLE_TYPE, nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("n", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("role", "is_active"),
+    )
+    op.create_table(
+        "table_counts",
+        sa.Column("table_name", sa.String(), nullable=False),
+        sa.Column("n", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("table_name"),
+    )
+
+    # Start the counters from the rows that already exist
+    op.execute(
+        "INSERT INTO user_counts(role, is_active, n) "
+        "SELECT role, is_active, count(*) FROM users "
+        "WHERE role IS NOT NULL AND is_active IS NOT NULL "
+        "GROUP BY role, is_active"
+    )
+    op.execute(
+        "INSERT INTO table_counts(table_name, n) "
+        "SELECT 'users', count(*) FROM users "
+        "UNION ALL SELECT 'events', count(*) FROM events"
+    )
+
+    # Keep the counters in step with every insert, delete and
+    # role / active status change
+    if dialect == "sqlite":
+        op.execute(
+            "CREATE TRIGGER users_count_ai AFTER INSERT ON users BEGIN "
+            "UPDATE table_counts SET n = n + 1 WHERE table_name = 'users'; "
+            f"{SQLITE_ADD_USER} "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER users_count_ad AFTER DELETE ON users BEGIN "
+            "UPDATE table_counts SET n = n - 1 WHERE table_name = 'users'; "
+            f"{SQLITE_REMOVE_USER} "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER users_count_au AFTER UPDATE OF role, is_active ON users "
+            "WHEN old.role IS NOT new.role OR old.is_active IS NOT new.is_active BEGIN "
+            f"{SQLITE_REMOVE_USER} {SQLITE_ADD_USER} "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER events_count_ai AFTER INSERT ON events BEGIN "
+            "UPDATE table_counts SET n = n + 1 WHERE table_name = 'events'; "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER events_count_ad AFTER DELETE ON events BEGIN "
+            "UPDATE table_counts SET n = n - 1 WHERE table_name = 'events'; "
+            "END"
+        )
+    elif dialect == "postgresql":
+        op.execute(POSTGRES_FUNCTIONS)
+        op.execute(
+            "CREATE TRIGGER users_count_insert_delete AFTER INSERT OR DELETE ON users "
+            "FOR EACH ROW EXECUTE FUNCTION users_count_trigger()"
+        )
+        op.execute(
+            "CREATE TRIGGER users_count_update AFTER UPDATE OF role, is_active ON users "
+            "FOR EACH ROW WHEN (OLD.role IS DISTINCT FROM NEW.role "
+            "OR OLD.is_active IS DISTINCT FROM NEW.is_active) "
+            "EXECUTE FUNCTION users_count_trigger()"
+        )
+        op.execute(
+            "CREATE TRIGGER events_count AFTER INSERT OR DELETE ON events "
+            "FOR EACH ROW EXECUTE FUNCTION events_count_trigger()"
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        for trigger in ("users_count_ai", "users_count_ad", "users_count_au",
+                        "events_count_ai", "events_count_ad"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    elif dialect == "postgresql":
+        op.execute("DROP TRIGGER IF EXISTS events_count ON events")
+        op.execute("DROP TRIGGER IF EXISTS users_count_update ON users")
+        op.execute("DROP TRIGGER IF EXISTS users_count_insert_delete ON users")
+        op.execute("DROP FUNCTION IF EXISTS events_count_trigger()")
+        op.execute("DROP FUNCTION IF EXISTS users_count_trigger()")
+
+    op.drop_table("table_counts")
+    op.drop_table("user_counts")
@@ -0,0 +1,62 @@
+"""Add attendance
+
+Revision ID: 7d004b355c7a
+Revises: 3908f76dee33
+Create Date: 2026-10-18 07:36:44.403436
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d004b355c7a'
+down_revision: Union[str, None] = '3908f76dee33'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Matches the AttendanceStatus enum (enum names are stored); the type is
+# created with the first table and reused by the second on PostgreSQL
+STATUS_TYPE = sa.Enum("RSVP", "CHECKED_IN", name="attendancestatus")
+EXISTING_STATUS_TYPE = STATUS_TYPE.with_variant(
+    postgresql.ENUM("RSVP", "CHECKED_IN", name="attendancestatus", create_type=False),
+    "postgresql")
+
+
+def upgrade() -> None:
+    op.create_table(
+        'attendance',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('occurrence_date', sa.DateTime(), nullable=False),
+        sa.Column('status', STATUS_TYPE, nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['event_id'], ['events.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_attendance_event_id_occurrence_date_user_id', 'attendance',
+                    ['event_id', 'occurrence_date', 'user_id'], unique=True)
+
+    op.create_table(
+        'attendance_counts',
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('occurrence_date', sa.DateTime(), nullable=False),
+        sa.Column('status', EXISTING_STATUS_TYPE, nullable=False),
+        sa.Column('n', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('event_id', 'occurrence_date', 'status')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('attendance_counts')
+    op.drop_index('ix_attendance_event_id_occurrence_date_user_id', table_name='attendance')
+    op.drop_table('attendance')
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TYPE IF EXISTS attendancestatus")
@@ -0,0 +1,79 @@
+"""Add user search index
+
+Revision ID: 8627f11c0d34
+Revises: e672b0c486c3
+Create Date: 2026-10-18 06:56:58.618874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8627f11c0d34'
+down_revision: Union[str, None] = 'e672b0c486c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Columns covered by the directory search index
+SEARCH_COLUMNS = ("first_name", "last_name", "city", "state")
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+
+    if dialect == "sqlite":
+        # External-content FTS5 table over users, using the trigram
+        # tokenizer so substring (LIKE '%x%' style) searches hit the index
+        op.execute(
+            f"CREATE VIRTUAL TABLE users_fts USING fts5({columns}, "
+            "content='users', content_rowid='id', tokenize='trigram')"
+        )
+        # Keep the index in sync with the users table
+        op.execute(
+            "CREATE TRIGGER users_fts_ai AFTER INSERT ON users BEGIN "
+            f"INSERT INTO users_fts(rowid, {columns}) VALUES (new.id, {new_values}); "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER users_fts_ad AFTER DELETE ON users BEGIN "
+            f"INSERT INTO users_fts(users_fts, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values}); "
+            "END"
+        )
+        op.execute(
+            f"CREATE TRIGGER users_fts_au AFTER UPDATE OF {columns} ON users BEGIN "
+            f"INSERT INTO users_fts(users_fts, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO users_fts(rowid, {columns}) VALUES (new.id, {new_values}); "
+            "END"
+        )
+        # Index the users that already exist
+        op.execute("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        # Trigram GIN indexes let ILIKE '%x%' filters use an index
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in SEARCH_COLUMNS:
+            op.execute(
+                f"CREATE INDEX ix_users_{column}_trgm ON users "
+                f"USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS users_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS users_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS users_fts_ai")
+        op.execute("DROP TABLE IF EXISTS users_fts")
+    elif dialect == "postgresql":
+        for column in SEARCH_COLUMNS:
+            op.execute(f"DROP INDEX IF EXISTS ix_users_{column}_trgm")
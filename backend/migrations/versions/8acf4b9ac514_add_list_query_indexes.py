@@ -0,0 +1,36 @@
+"""Add list query indexes
+
+Revision ID: 8acf4b9ac514
+Revises: 8627f11c0d34
+Create Date: 2026-10-18 06:57:56.515649
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8acf4b9ac514'
+down_revision: Union[str, None] = '8627f11c0d34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # read_users filter combinations, each ending in id so the
+    # ORDER BY id (and keyset pagination) is served by the index too
+    op.create_index('ix_users_role_is_active_id', 'users',
+                    ['role', 'is_active', 'id'])
+    op.create_index('ix_users_role_id', 'users', ['role', 'id'])
+    op.create_index('ix_users_is_active_id', 'users', ['is_active', 'id'])
+    # Events are listed in date order
+    op.create_index('ix_events_event_date_id', 'events', ['event_date', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_event_date_id', table_name='events')
+    op.drop_index('ix_users_is_active_id', table_name='users')
+    op.drop_index('ix_users_role_id', table_name='users')
+    op.drop_index('ix_users_role_is_active_id', table_name='users')
@@ -0,0 +1,101 @@
+"""Add archive tables
+
+Revision ID: 8e523a8ab56f
+Revises: 51538543b2c5
+Create Date: 2026-10-18 07:58:56.532061
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e523a8ab56f'
+down_revision: Union[str, None] = '51538543b2c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Enum types the hot tables already created (enum names are stored)
+ROLE_TYPE = sa.Enum("ADMIN", "MEMBER", "GUEST", name="userrole").with_variant(
+    postgresql.ENUM("ADMIN", "MEMBER", "GUEST", name="userrole", create_type=False),
+    "postgresql")
+STATUS_TYPE = sa.Enum("RSVP", "CHECKED_IN", name="attendancestatus").with_variant(
+    postgresql.ENUM("RSVP", "CHECKED_IN", name="attendancestatus", create_type=False),
+    "postgresql")
+
+
+def upgrade() -> None:
+    # Same columns as the hot tables, keyed by archive_id (see
+    # models.archive_table)
+    op.create_table(
+        'users_archive',
+        sa.Column('archive_id', sa.Integer(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('hashed_password', sa.String(), nullable=True),
+        sa.Column('first_name', sa.String(), nullable=True),
+        sa.Column('last_name', sa.String(), nullable=True),
+        sa.Column('phone_number', sa.String(), nullable=True),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('address2', sa.String(), nullable=True),
+        sa.Column('city', sa.String(), nullable=True),
+        sa.Column('state', sa.String(), nullable=True),
+        sa.Column('role', ROLE_TYPE, nullable=True),
+        sa.Column('date_of_birth', sa.DateTime(), nullable=True),
+        sa.Column('join_date', sa.DateTime(), nullable=True),
+        sa.Column('birthday_md', sa.Integer(), nullable=True),
+        sa.Column('anniversary_md', sa.Integer(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('archive_id')
+    )
+    op.create_index('ix_users_archive_id', 'users_archive', ['id'])
+
+    op.create_table(
+        'events_archive',
+        sa.Column('archive_id', sa.Integer(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('event_date', sa.DateTime(), nullable=True),
+        sa.Column('location', sa.String(), nullable=True),
+        sa.Column('recurrence_rule', sa.String(), nullable=True),
+        sa.Column('recurrence_until', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('archive_id')
+    )
+    op.create_index('ix_events_archive_id', 'events_archive', ['id'])
+    op.create_index('ix_events_archive_event_date_id', 'events_archive', ['event_date', 'id'])
+
+    op.create_table(
+        'attendance_archive',
+        sa.Column('archive_id', sa.Integer(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('occurrence_date', sa.DateTime(), nullable=False),
+        sa.Column('status', STATUS_TYPE, nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('archive_id')
+    )
+    op.create_index('ix_attendance_archive_id', 'attendance_archive', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_attendance_archive_id', table_name='attendance_archive')
+    op.drop_table('attendance_archive')
+    op.drop_index('ix_events_archive_event_date_id', table_name='events_archive')
+    op.drop_index('ix_events_archive_id', table_name='events_archive')
+    op.drop_table('events_archive')
+    op.drop_index('ix_users_archive_id', table_name='users_archive')
+    op.drop_table('users_archive')
@@ -0,0 +1,32 @@
+"""Add job unique keys
+
+Revision ID: b7e1f04c92d3
+Revises: 8e523a8ab56f
+Create Date: 2026-10-18 09:12:40.218733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e1f04c92d3'
+down_revision: Union[str, None] = '8e523a8ab56f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Jobs that haven't finished yet
+PENDING = sa.text("status IN ('QUEUED', 'RUNNING')")
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('unique_key', sa.String(), nullable=True))
+    op.create_index('ux_jobs_unique_key_pending', 'jobs', ['unique_key'], unique=True,
+                    sqlite_where=PENDING, postgresql_where=PENDING)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_jobs_unique_key_pending', table_name='jobs')
+    op.drop_column('jobs', 'unique_key')
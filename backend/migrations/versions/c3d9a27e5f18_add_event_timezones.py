@@ -0,0 +1,29 @@
+"""Add event time zones
+
+Revision ID: c3d9a27e5f18
+Revises: b7e1f04c92d3
+Create Date: 2026-10-18 10:04:51.730219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d9a27e5f18'
+down_revision: Union[str, None] = 'b7e1f04c92d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing series keep repeating in UTC (NULL)
+    op.add_column('events', sa.Column('timezone', sa.String(), nullable=True))
+    op.add_column('events_archive', sa.Column('timezone', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('events_archive', 'timezone')
+    op.drop_column('events', 'timezone')
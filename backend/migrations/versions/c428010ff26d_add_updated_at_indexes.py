@@ -0,0 +1,29 @@
+"""Add updated_at indexes
+
+Revision ID: c428010ff26d
+Revises: 8acf4b9ac514
+Create Date: 2026-10-18 07:01:37.925985
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c428010ff26d'
+down_revision: Union[str, None] = '8acf4b9ac514'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Lets max(updated_at) (the list response validator) use an index
+    op.create_index(op.f('ix_users_updated_at'), 'users', ['updated_at'])
+    op.create_index(op.f('ix_events_updated_at'), 'events', ['updated_at'])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_events_updated_at'), table_name='events')
+    op.drop_index(op.f('ix_users_updated_at'), table_name='users')
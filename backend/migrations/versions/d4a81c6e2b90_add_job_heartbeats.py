@@ -0,0 +1,28 @@
+"""Add job heartbeats
+
+Revision ID: d4a81c6e2b90
+Revises: c3d9a27e5f18
+Create Date: 2026-10-18 11:26:03.418552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a81c6e2b90'
+down_revision: Union[str, None] = 'c3d9a27e5f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+    # Jobs running during the upgrade count from when they started
+    op.execute("UPDATE jobs SET heartbeat_at = started_at WHERE status = 'RUNNING'")
+
+
+def downgrade() -> None:
+    op.drop_column('jobs', 'heartbeat_at')
@@ -0,0 +1,26 @@
+"""Add tombstone deleted_at index
+
+Revision ID: e1b6f3a09d27
+Revises: d4a81c6e2b90
+Create Date: 2026-10-18 11:58:40.207311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b6f3a09d27'
+down_revision: Union[str, None] = 'd4a81c6e2b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The list endpoints' Last-Modified reads the latest deletion per entity
+    op.create_index('ix_tombstones_entity_deleted_at', 'tombstones', ['entity', 'deleted_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tombstones_entity_deleted_at', table_name='tombstones')
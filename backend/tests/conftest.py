@@ -0,0 +1,32 @@
+"""
+Shared fixtures for the backend tests
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import get_connect_args
+from benchmarks.common import migrate, temp_database
+
+
+@pytest.fixture
+def session_factory():
+    """
+    Sessions on a copy of the bundled database, migrated to the latest
+    revision (the migrations start from its schema, not an empty file)
+    """
+    with temp_database() as url:
+        migrate(url)
+        engine = create_engine(url, connect_args=get_connect_args(url))
+        yield sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                           bind=engine)
+        engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    """A session on a fresh database copy"""
+    session = session_factory()
+    yield session
+    session.close()
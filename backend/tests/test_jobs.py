@@ -0,0 +1,108 @@
+"""
+Tests for the background job queue: claiming, requeueing and ownership
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db_utils, jobs, models
+
+
+@pytest.fixture
+def handlers():
+    """Register test handlers, removed again afterwards"""
+    registered = []
+
+    def register(kind, fn):
+        jobs.handler(kind)(fn)
+        registered.append(kind)
+
+    yield register
+    for kind in registered:
+        jobs.HANDLERS.pop(kind, None)
+
+
+def test_claims_the_job_due_first(db):
+    now = datetime.utcnow()
+    later = db_utils.enqueue_job(db, "test", run_at=now - timedelta(minutes=1))
+    first = db_utils.enqueue_job(db, "test", run_at=now - timedelta(minutes=2))
+    db_utils.enqueue_job(db, "test", run_at=now + timedelta(minutes=5))
+
+    assert db_utils.claim_job(db, now).id == first
+    assert db_utils.claim_job(db, now).id == later
+    assert db_utils.claim_job(db, now) is None
+
+
+def test_a_job_is_claimed_once(session_factory):
+    db, other = session_factory(), session_factory()
+    job_id = db_utils.enqueue_job(db, "test")
+    claimed = db_utils.claim_job(db)
+    assert claimed.id == job_id
+    assert claimed.status == models.JobStatus.RUNNING and claimed.attempts == 1
+    assert db_utils.claim_job(other) is None
+    db.close()
+    other.close()
+
+
+def test_unique_key_allows_one_pending_job(db):
+    assert db_utils.enqueue_job(db, "test", unique_key="once") is not None
+    assert db_utils.enqueue_job(db, "test", unique_key="once") is None
+    job = db_utils.claim_job(db)
+    assert db_utils.enqueue_job(db, "test", unique_key="once") is None
+    db_utils.finish_job(db, job.id, job.attempts)
+    assert db_utils.enqueue_job(db, "test", unique_key="once") is not None
+
+
+def test_requeues_only_jobs_without_a_recent_heartbeat(db):
+    started = datetime.utcnow() - timedelta(hours=1)
+    db_utils.enqueue_job(db, "test", run_at=started)
+    job = db_utils.claim_job(db, started)
+    cutoff = datetime.utcnow() - timedelta(minutes=10)
+
+    # Started long ago, but its worker is still alive
+    assert db_utils.heartbeat_job(db, job.id, job.attempts)
+    assert db_utils.requeue_stale_jobs(db, cutoff) == 0
+
+    assert db_utils.requeue_stale_jobs(db, datetime.utcnow() + timedelta(seconds=1)) == 1
+    db.expire_all()
+    assert db.get(models.Job, job.id).status == models.JobStatus.QUEUED
+
+
+def test_a_requeued_attempt_cannot_record_its_outcome(session_factory):
+    db, other = session_factory(), session_factory()
+    job_id = db_utils.enqueue_job(db, "test")
+    lost = db_utils.claim_job(db)
+    db_utils.requeue_stale_jobs(db, datetime.utcnow() + timedelta(seconds=1))
+    current = db_utils.claim_job(other)
+    assert current.attempts == lost.attempts + 1
+
+    assert not db_utils.heartbeat_job(db, job_id, lost.attempts)
+    assert not db_utils.finish_job(db, job_id, lost.attempts, "stalled")
+    assert db_utils.finish_job(other, job_id, current.attempts)
+    db.expire_all()
+    assert db.get(models.Job, job_id).status == models.JobStatus.DONE
+    db.close()
+    other.close()
+
+
+def test_failed_job_is_retried_then_failed(session_factory, handlers, monkeypatch):
+    def fail(db, payload):
+        raise RuntimeError("no luck")
+
+    handlers("test_fail", fail)
+    monkeypatch.setattr(jobs, "retry_delay", lambda attempts: 0)
+    pool = jobs.JobPool(workers=0, session_factory=session_factory)
+    db = session_factory()
+    job_id = db_utils.enqueue_job(db, "test_fail", max_attempts=2)
+
+    assert pool.run_next()
+    db.expire_all()
+    job = db.get(models.Job, job_id)
+    assert job.status == models.JobStatus.QUEUED and job.last_error == "RuntimeError: no luck"
+
+    assert pool.run_next()
+    db.expire_all()
+    assert db.get(models.Job, job_id).status == models.JobStatus.FAILED
+    assert not pool.run_next()
+    db.close()
@@ -0,0 +1,70 @@
+"""
+Tests for keyset (cursor) pagination of the user and event lists
+"""
+
+from datetime import datetime
+
+from app import db_utils, schemas
+
+
+def add_user(db, number: int):
+    """Create a member with a unique email"""
+    return db_utils.create_user(db, schemas.UserCreate(
+        email=f"member{number}@example.com", first_name="Test", last_name="Member",
+        password="secret123"), "hash")
+
+
+def add_event(db, title: str, event_date: datetime):
+    """Create a one-off event"""
+    return db_utils.create_event(db, schemas.EventCreate(title=title, event_date=event_date))
+
+
+def test_user_pages_match_the_offset_order(db):
+    for number in range(12):
+        add_user(db, number)
+    expected = [user.id for user in db_utils.get_users(db, limit=1000)]
+
+    seen, after_id = [], None
+    while True:
+        page = db_utils.get_users(db, limit=5, after_id=after_id)
+        seen += [user.id for user in page]
+        if len(page) < 5:
+            break
+        after_id = page[-1].id
+    assert seen == expected
+
+
+def test_user_pages_are_stable_when_rows_are_deleted(db):
+    for number in range(6):
+        add_user(db, number)
+    first_page = db_utils.get_users(db, limit=3)
+    expected_next = db_utils.get_users(db, limit=3, after_id=first_page[-1].id)
+
+    # An offset would now skip a row; the cursor starts after the last one seen
+    db_utils.delete_user(db, first_page[0].id)
+    assert db_utils.get_users(db, limit=3, after_id=first_page[-1].id) == expected_next
+    assert db_utils.get_users(db, skip=3, limit=3)[0].id != expected_next[0].id
+
+
+def test_event_pages_break_date_ties_by_id(db):
+    date = datetime(2031, 5, 4, 10, 0)
+    ids = [add_event(db, f"Event {number}", date).id for number in range(5)]
+    window = dict(start=datetime(2031, 5, 1), end=datetime(2031, 6, 1))
+
+    first_page = db_utils.get_events(db, limit=2, **window)
+    second_page = db_utils.get_events(
+        db, limit=2, after=(first_page[-1].event_date, first_page[-1].id), **window)
+    last_page = db_utils.get_events(
+        db, limit=2, after=(second_page[-1].event_date, second_page[-1].id), **window)
+    assert [event.id for event in first_page + second_page + last_page] == ids
+
+
+def test_event_pages_in_descending_order(db):
+    ids = [add_event(db, f"Event {day}", datetime(2031, 5, day, 10, 0)).id
+           for day in range(1, 6)]
+    window = dict(start=datetime(2031, 5, 1), end=datetime(2031, 6, 1), descending=True)
+
+    first_page = db_utils.get_events(db, limit=3, **window)
+    second_page = db_utils.get_events(
+        db, limit=3, after=(first_page[-1].event_date, first_page[-1].id), **window)
+    assert [event.id for event in first_page + second_page] == ids[::-1]
@@ -0,0 +1,123 @@
+"""
+Tests for recurrence.py: expanding rules in a series' time zone, and the
+event list expanding recurring events into occurrences
+"""
+
+from datetime import datetime
+from itertools import islice
+
+import pytest
+
+from app import db_utils, recurrence, schemas
+
+CHICAGO = recurrence.zone("America/Chicago")
+
+
+def first(start, rule, count, tz=None, after=None):
+    """The first count occurrences of a rule"""
+    return list(islice(recurrence.occurrences(
+        start, recurrence.parse_rule(rule), after, tz), count))
+
+
+def test_weekly_keeps_local_time_across_dst_end():
+    # Sunday 10:00 CDT (UTC-5); clocks go back on Sunday November 1st 2026
+    start = datetime(2026, 10, 25, 15, 0)
+    assert first(start, "FREQ=WEEKLY;BYDAY=SU", 3, CHICAGO) == [
+        datetime(2026, 10, 25, 15, 0),
+        datetime(2026, 11, 1, 16, 0),   # 10:00 CST (UTC-6)
+        datetime(2026, 11, 8, 16, 0),
+    ]
+
+
+def test_weekly_keeps_local_time_across_dst_start():
+    # Sunday 10:00 CST; clocks go forward on Sunday March 8th 2026
+    start = datetime(2026, 3, 1, 16, 0)
+    assert first(start, "FREQ=WEEKLY;BYDAY=SU", 2, CHICAGO) == [
+        datetime(2026, 3, 1, 16, 0),
+        datetime(2026, 3, 8, 15, 0),    # 10:00 CDT
+    ]
+
+
+def test_without_time_zone_repeats_in_utc():
+    start = datetime(2026, 10, 25, 15, 0)
+    assert first(start, "FREQ=WEEKLY;BYDAY=SU", 2) == [
+        datetime(2026, 10, 25, 15, 0),
+        datetime(2026, 11, 1, 15, 0),
+    ]
+
+
+def test_byday_uses_the_local_weekday():
+    # Sunday 19:00 CDT is already Monday in UTC
+    start = datetime(2026, 10, 12, 0, 0)
+    rule = recurrence.parse_rule("FREQ=WEEKLY;BYDAY=SU")
+    assert recurrence.is_occurrence(start, rule, start, CHICAGO)
+    assert not recurrence.is_occurrence(start, rule, start)
+    assert first(start, "FREQ=WEEKLY;BYDAY=SU", 2, CHICAGO) == [
+        datetime(2026, 10, 12, 0, 0),
+        datetime(2026, 10, 19, 0, 0),
+    ]
+
+
+def test_seeking_a_window_after_dst_change():
+    start = datetime(2026, 10, 25, 15, 0)
+    rule = recurrence.parse_rule("FREQ=WEEKLY;BYDAY=SU")
+    window = list(recurrence.occurrences_between(
+        start, rule, datetime(2026, 12, 1), datetime(2026, 12, 14), CHICAGO))
+    assert window == [datetime(2026, 12, 6, 16, 0), datetime(2026, 12, 13, 16, 0)]
+    assert recurrence.is_occurrence(start, rule, datetime(2026, 12, 6, 16, 0), CHICAGO)
+    assert not recurrence.is_occurrence(start, rule, datetime(2026, 12, 6, 15, 0), CHICAGO)
+
+
+def test_last_occurrence_in_time_zone():
+    start = datetime(2026, 10, 25, 15, 0)
+    until = recurrence.parse_rule("FREQ=WEEKLY;UNTIL=20261115")
+    assert recurrence.last_occurrence(start, until, CHICAGO) == datetime(2026, 11, 15, 16, 0)
+    count = recurrence.parse_rule("FREQ=WEEKLY;COUNT=2")
+    assert recurrence.last_occurrence(start, count, CHICAGO) == datetime(2026, 11, 1, 16, 0)
+
+
+def test_unknown_time_zone():
+    with pytest.raises(ValueError):
+        recurrence.zone("Mars/Olympus_Mons")
+
+
+def add_event(db, title, event_date, rule=None, timezone=None):
+    """Create an event, recurring if a rule is given"""
+    return db_utils.create_event(db, schemas.EventCreate(
+        title=title, event_date=event_date, recurrence_rule=rule, timezone=timezone))
+
+
+def test_list_merges_occurrences_with_one_off_events(db):
+    series = add_event(db, "Service", datetime(2031, 3, 2, 16, 0), "FREQ=WEEKLY;BYDAY=SU",
+                       "America/Chicago")
+    picnic = add_event(db, "Picnic", datetime(2031, 3, 12, 17, 0))
+    events = db_utils.get_events(db, start=datetime(2031, 3, 1), end=datetime(2031, 3, 20))
+    assert [(event.id, event.event_date) for event in events] == [
+        (series.id, datetime(2031, 3, 2, 16, 0)),
+        (series.id, datetime(2031, 3, 9, 15, 0)),   # Daylight saving time from here
+        (picnic.id, datetime(2031, 3, 12, 17, 0)),
+        (series.id, datetime(2031, 3, 16, 15, 0)),
+    ]
+
+
+def test_list_applies_cancelled_and_moved_occurrences(db):
+    series = add_event(db, "Service", datetime(2031, 3, 2, 10, 0), "FREQ=WEEKLY")
+    db_utils.save_occurrence(db, series, datetime(2031, 3, 9, 10, 0))
+    db_utils.save_occurrence(db, series, datetime(2031, 3, 16, 10, 0),
+                             schemas.EventOccurrenceUpdate(event_date=datetime(2031, 3, 1, 9, 0),
+                                                           title="Moved"))
+    events = db_utils.get_events(db, start=datetime(2031, 3, 1), end=datetime(2031, 3, 24))
+    assert [(event.title, event.event_date) for event in events] == [
+        ("Moved", datetime(2031, 3, 1, 9, 0)),
+        ("Service", datetime(2031, 3, 2, 10, 0)),
+        ("Service", datetime(2031, 3, 23, 10, 0)),
+    ]
+
+
+def test_list_pages_through_occurrences(db):
+    add_event(db, "Prayer", datetime(2031, 3, 1, 7, 0), "FREQ=DAILY;COUNT=5")
+    window = dict(start=datetime(2031, 3, 1), end=datetime(2031, 4, 1))
+    first_page = db_utils.get_events(db, limit=3, **window)
+    rest = db_utils.get_events(
+        db, limit=3, after=(first_page[-1].event_date, first_page[-1].id), **window)
+    assert [event.event_date.day for event in first_page + rest] == [1, 2, 3, 4, 5]
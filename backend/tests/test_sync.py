@@ -0,0 +1,66 @@
+"""
+Tests for /sync change feeds: deletions reported through tombstones
+"""
+
+from datetime import datetime, timedelta
+
+from app import db_utils, schemas
+
+
+def add_user(db, number: int, city: str = None):
+    """Create a member with a unique email"""
+    return db_utils.create_user(db, schemas.UserCreate(
+        email=f"member{number}@example.com", first_name="Test", last_name="Member",
+        city=city, password="secret123"), "hash")
+
+
+def settled():
+    """A time after every write so far has settled"""
+    return datetime.utcnow() + db_utils.SYNC_SETTLE_TIME + timedelta(seconds=1)
+
+
+def test_first_sync_has_no_deletions(db):
+    db_utils.delete_user(db, add_user(db, 1).id)
+    changes, position = db_utils.get_changes(db, now=settled())
+    assert changes["deleted"] == []
+    assert position.tombstone_id > 0
+
+
+def test_deletions_are_reported_once_settled(db):
+    user = add_user(db, 1)
+    _, position = db_utils.get_changes(db, now=settled())
+
+    db_utils.delete_user(db, user.id)
+    changes, _ = db_utils.get_changes(db, position, now=datetime.utcnow())
+    assert changes["deleted"] == []
+
+    changes, position = db_utils.get_changes(db, position, now=settled())
+    assert [(deleted["entity"], deleted["id"]) for deleted in changes["deleted"]] == [
+        ("user", user.id)]
+    changes, _ = db_utils.get_changes(db, position, now=settled())
+    assert changes["deleted"] == []
+
+
+def test_bulk_deletions_page_through_tombstones(db):
+    ids = [add_user(db, number, city="Tombstone").id for number in range(5)]
+    _, position = db_utils.get_changes(db, now=settled())
+
+    deleted = db_utils.bulk_delete_users(
+        db, schemas.UserSelection(filter=schemas.UserFilter(city="Tombstone")))
+    assert sorted(deleted) == ids
+
+    reported = []
+    while True:
+        changes, position = db_utils.get_changes(db, position, limit=2, now=settled())
+        reported += [deleted["id"] for deleted in changes["deleted"]]
+        if not changes["has_more"]:
+            break
+    assert sorted(reported) == ids
+
+
+def test_deletions_move_the_table_version(db):
+    user = add_user(db, 1)
+    updated_at, _ = db_utils.get_table_version(db, type(user))
+    db_utils.delete_user(db, user.id)
+    deleted_at, _ = db_utils.get_table_version(db, type(user))
+    assert deleted_at > updated_at
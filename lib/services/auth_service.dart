@@ -15,6 +15,10 @@ class AuthService extends ChangeNotifier {
   String? _lastName;
   String? _userEmail;
   String? _token;
+  DateTime? _tokenExpiresAt;
+
+  // Refresh the token when it has less than this left
+  static const Duration refreshMargin = Duration(minutes: 5);
 
   bool get isAuthenticated => _isAuthenticated;
   bool get isGuest => _isGuest;
@@ -22,9 +26,88 @@ class AuthService extends ChangeNotifier {
   String? get firstName => _firstName;
   String? get lastName => _lastName;
   String? get userEmail => _userEmail;
+  String? get token => _token;
   String? get fullName =>
       _firstName != null && _lastName != null ? '$_firstName $_lastName' : null;
 
+  // Headers for endpoints that require a signed-in user
+  Map<String, String> get authHeaders => {
+        'Content-Type': 'application/json',
+        if (_token != null) 'Authorization': 'Bearer $_token',
+      };
+
+  // Same as authHeaders, refreshing the token first if it's about to expire
+  Future<Map<String, String>> freshAuthHeaders() async {
+    if (_token != null &&
+        (_tokenExpiresAt == null ||
+            DateTime.now().add(refreshMargin).isAfter(_tokenExpiresAt!))) {
+      await refreshToken();
+    }
+    return authHeaders;
+  }
+
+  // Read the expiry ("exp" claim) of a JWT, or null if it has none
+  static DateTime? _tokenExpiry(String token) {
+    try {
+      final parts = token.split('.');
+      final claims = jsonDecode(
+          utf8.decode(base64Url.decode(base64Url.normalize(parts[1]))));
+      return DateTime.fromMillisecondsSinceEpoch(claims['exp'] * 1000);
+    } catch (_) {
+      return null;
+    }
+  }
+
+  // Store the token and profile from /auth/login or /auth/refresh
+  Future<void> _saveSession(Map<String, dynamic> data) async {
+    final user = data['user'];
+
+    _isAuthenticated = true;
+    _isGuest = false;
+    _token = data['access_token'];
+    _tokenExpiresAt = _tokenExpiry(_token!);
+    _userId = user['id'].toString();
+    _firstName = user['first_name'];
+    _lastName = user['last_name'];
+    _userEmail = user['email'];
+
+    // Save auth state
+    final prefs = await SharedPreferences.getInstance();
+    await prefs.setBool('isAuthenticated', true);
+    await prefs.setBool('isGuest', false);
+    await prefs.setString('token', _token!);
+    await prefs.setString('userId', _userId!);
+    await prefs.setString('firstName', _firstName!);
+    await prefs.setString('lastName', _lastName!);
+    await prefs.setString('userEmail', _userEmail!);
+
+    notifyListeners();
+  }
+
+  // Swap the current token for a new one before it expires
+  // Returns false if there was no token to refresh or the server refused
+  // it (the user is signed out then, as the token can't be used anymore)
+  Future<bool> refreshToken() async {
+    if (_token == null) return false;
+    try {
+      final response = await http.post(
+        Uri.parse('$baseUrl/auth/refresh'),
+        headers: authHeaders,
+      );
+      if (response.statusCode == 200) {
+        await _saveSession(jsonDecode(response.body));
+        return true;
+      }
+      if (response.statusCode == 401) {
+        await signOut();
+      }
+    } catch (e) {
+      // Offline: keep the current token, it's tried again next time
+      print('Token refresh error: $e'); // Debug log
+    }
+    return false;
+  }
+
   Future<void> signUp({
     required String firstName,
     required String lastName,
@@ -49,24 +132,8 @@ class AuthService extends ChangeNotifier {
       print('Signup response body: ${response.body}'); // Debug log
 
       if (response.statusCode == 201) {
-        final userData = jsonDecode(response.body);
-        _isAuthenticated = true;
-        _isGuest = false;
-        _userId = userData['id'].toString();
-        _firstName = userData['first_name'];
-        _lastName = userData['last_name'];
-        _userEmail = userData['email'];
-
-        // Save auth state
-        final prefs = await SharedPreferences.getInstance();
-        await prefs.setBool('isAuthenticated', true);
-        await prefs.setBool('isGuest', false);
-        await prefs.setString('userId', _userId!);
-        await prefs.setString('firstName', _firstName!);
-        await prefs.setString('lastName', _lastName!);
-        await prefs.setString('userEmail', _userEmail!);
-
-        notifyListeners();
+        // Sign the new account in, so it gets an access token
+        await signIn(email: email, password: password);
       } else {
         final error = jsonDecode(response.body);
         throw error['detail'] ?? 'Failed to sign up: ${response.statusCode}';
@@ -87,46 +154,29 @@ class AuthService extends ChangeNotifier {
     required String password,
   }) async {
     try {
-      // TODO: Implement proper authentication endpoint
-      // For now, we'll use the user lookup endpoint
-      final response = await http.get(
-        Uri.parse('$baseUrl/users/'),
+      final response = await http.post(
+        Uri.parse('$baseUrl/auth/login'),
         headers: {'Content-Type': 'application/json'},
+        body: jsonEncode({
+          'email': email,
+          'password': password,
+        }),
       );
 
       if (response.statusCode == 200) {
-        final users = jsonDecode(response.body) as List;
-        final user = users.firstWhere(
-          (u) => u['email'] == email,
-          orElse: () => throw 'Invalid email or password',
-        );
-
-        // TODO: Implement proper password verification
-        if (user['hashed_password'] != password) {
-          throw 'Invalid email or password';
-        }
-
-        _isAuthenticated = true;
-        _isGuest = false;
-        _userId = user['id'].toString();
-        _firstName = user['first_name'];
-        _lastName = user['last_name'];
-        _userEmail = user['email'];
-
-        // Save auth state
-        final prefs = await SharedPreferences.getInstance();
-        await prefs.setBool('isAuthenticated', true);
-        await prefs.setBool('isGuest', false);
-        await prefs.setString('userId', _userId!);
-        await prefs.setString('firstName', _firstName!);
-        await prefs.setString('lastName', _lastName!);
-        await prefs.setString('userEmail', _userEmail!);
-
-        notifyListeners();
+        await _saveSession(jsonDecode(response.body));
+      } else if (response.statusCode == 401) {
+        throw 'Invalid email or password';
       } else {
-        throw 'Failed to sign in';
+        final error = jsonDecode(response.body);
+        throw error['detail'] ?? 'Failed to sign in';
       }
     } catch (e) {
+      if (e is FormatException) {
+        throw 'Invalid response from server. Please try again.';
+      } else if (e is http.ClientException) {
+        throw 'Unable to connect to the server. Please check your internet connection.';
+      }
       rethrow;
     }
   }
@@ -157,6 +207,7 @@ class AuthService extends ChangeNotifier {
     _lastName = null;
     _userEmail = null;
     _token = null;
+    _tokenExpiresAt = null;
 
     // Clear auth state
     final prefs = await SharedPreferences.getInstance();
@@ -173,7 +224,14 @@ class AuthService extends ChangeNotifier {
     _firstName = prefs.getString('firstName');
     _lastName = prefs.getString('lastName');
     _userEmail = prefs.getString('userEmail');
+    _token = prefs.getString('token');
+    _tokenExpiresAt = _token != null ? _tokenExpiry(_token!) : null;
 
     notifyListeners();
+
+    // A saved token that expires soon is refreshed right away
+    if (_token != null) {
+      await freshAuthHeaders();
+    }
   }
 }